@@ -1,5 +1,6 @@
-import urllib								#  Call Alexa
+import httpclient							#  Call Alexa over one kept-alive connection
 import MySQLdb								#  Used for DB operations
+import database								#  Pooled connections and batched statements
 import re									#  Clean up URLs with Regular Expressions
 import time									#  Track how long things take
 import calendar								#  Get the sample timestamp
@@ -21,16 +22,15 @@ def main():
 			verbose = True
 
 	startTime = time.mktime(time.gmtime())	#  Track how long this process takes
-	link = MySQLdb.connect('localhost', 'censor', 'blockme', 'corpora')
-	cursor = link.cursor(MySQLdb.cursors.DictCursor)
+	link = database.connect('localhost', 'censor', 'blockme', 'corpora')
 
 	uniqueDomains = []						#  List of unique sources to Alexa-rank
 											#  URLs are more specific than we actually need,
 											#  but we must begin by pulling them all.
 	query = 'SELECT url FROM articles WHERE 1;'
+	cursor = database.streamingCursor(link)	#  Every article: read the URLs as they arrive
 	cursor.execute(query)
-	result = cursor.fetchall()
-	for row in result:
+	for row in cursor:
 		if row['url'] is not None:
 			url = row['url'][:]
 			if 'http://' in url:			#  Remove "http://" and "https://"
@@ -45,6 +45,8 @@ def main():
 
 			if url not in uniqueDomains:
 				uniqueDomains.append(url)
+	cursor.close()
+	cursor = link.cursor(MySQLdb.cursors.DictCursor)
 											#  Time stamp of when these ranks were accurate
 	sampleTime = calendar.timegm(time.gmtime())
 
@@ -53,9 +55,12 @@ def main():
 		sys.stdout.write('Updating database: 0%' + "\r")
 		sys.stdout.flush()
 
+	commits = database.CommitBatcher(link, 50)
 	i = 0
 	for url in uniqueDomains:
-		xml = urllib.urlopen('http://data.alexa.com/data?cli=10&dat=s&url=' + url).read()
+		try: xml = httpclient.session().get('http://data.alexa.com/data', params={'cli': 10, 'dat': 's', 'url': url}, \
+		                                    timeout=(10, 30)).content
+		except: xml = ''
 		try: rank = int(re.search(r'<POPULARITY[^>]*TEXT="(\d+)"', xml).groups()[0])
 		except: rank = None
 
@@ -63,7 +68,7 @@ def main():
 			query  = 'INSERT INTO alexa_rank(src, sampled, rank)'
 			query += ' VALUES("' + url + '", ' + str(sampleTime) + ', ' + str(rank) +' );'
 			cursor.execute(query)
-			link.commit()
+			commits.wrote()
 
 		if verbose:
 			sys.stdout.write('Updating database: ' + \
@@ -72,6 +77,8 @@ def main():
 
 		i += 1
 
+	commits.flush()
+
 	if verbose:
 		print("\n")
 
@@ -85,7 +92,7 @@ def main():
 	link.commit()
 
 	cursor.close()
-	link.close()							#  Close link to DB
+	database.release(link)					#  Done with the link to the DB
 	if verbose:
 		print('Done')
 
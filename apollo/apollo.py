@@ -4,6 +4,7 @@
 #  rudimentary processing.
 
 import MySQLdb						#  Used for DB operations
+import database						#  Pooled connections and batched statements
 import time							#  Track how long things take
 import sys							#  Used for re-writable screen output
 from datetime import datetime		#  Used for time stamping our performance metrics
@@ -212,7 +213,7 @@ class Apollo:
 		   self.dbUser is not None and \
 		   self.dbPword is not None and \
 		   self.dbTable is not None:
-			self.link = MySQLdb.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
+			self.link = database.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
 		elif self.verbose:
 			print('Unable to open a DB connection because credentials are missing.')
 
@@ -220,7 +221,7 @@ class Apollo:
 
 	#  Close the connection to the database
 	def closeDB(self):
-		self.link.close()
+		database.release(self.link)			#  Back to the pool for the next user
 		return
 
 	#################################### T i m e r ######################################
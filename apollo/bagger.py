@@ -4,6 +4,9 @@ import sys							#  Used for re-writable screen output
 import re							#  For find-and-replace work
 import math
 import MySQLdb						#  Used for DB operations
+import database						#  Pooled connections and batched statements
+import storedtext					#  How text columns are written and read back
+from bodystore import BodyStore		#  Article text kept out of the 'articles' table
 from datetime import datetime		#  Used for time stamping our retrievals
 import nltk
 from nltk.tokenize import word_tokenize
@@ -47,6 +50,8 @@ class ArticleBagger:
 		#  pub-date:       The date the article was published
 		#  date-retrieved: Timestamp of when this article was scraped by us
 		self.bags = []				#  Bags of words, one corresponding to each record in raws
+		self.bodyStore = None		#  Reads article text kept in the body store (see fetchBodies())
+		self.commitEvery = 500		#  Bags written per commit (see writeBags())
 
 		self.verbose = False		#  Whether to print progress to screen
 
@@ -66,25 +71,7 @@ class ArticleBagger:
 				sys.stdout.write('Updating database: 0%' + "\r")
 				sys.stdout.flush()
 
-			for i in range(0, len(self.raws)):
-									#  Convert Unicode strings to DB-safe representations
-									#  u'montclair'          ==> 'montclair'
-									#  u'\u4f0a\u6717\u4eba' ==> '\u4f0a\u6717\u4eba'
-				safe = [repr(x)[2:-1] for x in self.bags[i]]
-				safe = [re.sub(r'\"', '\\\"', x) for x in safe]
-				safe = [re.sub(r'\u', '\\u', x) for x in safe]
-
-				query  = 'UPDATE articles SET'
-				query += ' bag_of_words = "' + "\t".join(safe) + '",'
-				query += ' processed = TRUE'
-				query += ' WHERE kp = ' + str(self.raws[i]['kp']) + ';'
-				cursor.execute(query)
-				self.link.commit()
-
-				if self.verbose:
-					sys.stdout.write('Updating database: ' + \
-					                 str(int(float(i + 1) / float(len(self.raws)) * 100)) + '%' + "\r")
-					sys.stdout.flush()
+			self.writeBags(cursor)
 
 			if self.verbose:
 				print("\n")
@@ -357,32 +344,28 @@ class ArticleBagger:
 			query += ' ORDER BY pub_date ASC LIMIT ' + str(n) + ';'
 		cursor.execute(query)
 		result = cursor.fetchall()
+		start = len(self.raws)
 		for row in result:
 			self.raws.append( {} )
 			self.raws[-1]['kp'] = int(row['kp'])					#  Int
 			self.raws[-1]['url'] = row['url']						#  ASCII string
+			self.raws[-1]['native'] = bool(row['native_text'])	#  How this row's text is stored
 
-			self.raws[-1]['title'] = row['title']					#  Unicode-escaped
-			if self.raws[-1]['title'] is not None:
-				self.raws[-1]['title'] = self.raws[-1]['title'].decode('unicode-escape')
+			self.raws[-1]['title'] = storedtext.readText(row['title'], row['native_text'])
 
-			self.raws[-1]['text'] = row['content']					#  Unicode-escaped
-			if self.raws[-1]['text'] is not None:
-				self.raws[-1]['text'] = self.raws[-1]['text'].decode('unicode-escape')
+			self.raws[-1]['text'] = storedtext.readText(row['content'], row['native_text'])
+			self.raws[-1]['body-ref'] = row['body_ref']			#  Text is in the body store if content is NULL
 
-			self.raws[-1]['summary'] = row['summary']				#  Unicode-escaped
-			if self.raws[-1]['summary'] is not None:
-				self.raws[-1]['summary'] = self.raws[-1]['summary'].decode('unicode-escape')
+			self.raws[-1]['summary'] = storedtext.readText(row['summary'], row['native_text'])
 
-			self.raws[-1]['keyword'] = row['keyword']				#  Unicode-escaped
-			if self.raws[-1]['keyword'] is not None:
-				self.raws[-1]['keyword'] = self.raws[-1]['keyword'].decode('unicode-escape')
+			self.raws[-1]['keyword'] = storedtext.readText(row['keyword'], row['native_text'])
 
 			self.raws[-1]['lang-claimed'] = row['lang_claimed']		#  Unicode-escaped
 
 			self.raws[-1]['lang-detected'] = row['lang_detected']	#  ASCII string
 			self.raws[-1]['pub-date'] = row['pub_date']				#  Datetime
 			self.raws[-1]['date-retrieved'] = row['ret_date']		#  Datetime
+		self.fetchBodies(cursor, start)
 		if self.useConfidence and self.verbose:
 			print('Pulled ' + str(len(self.raws)) + ' unprocessed records with confidence >= ' + str(self.confidence))
 		elif self.verbose:
@@ -397,6 +380,7 @@ class ArticleBagger:
 	def select(self, k):
 		#  Declare dictionary-type cursor (assoc-arrays)
 		cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+		start = len(self.raws)
 
 		if isinstance(k, list):
 			for kp in k:
@@ -407,22 +391,16 @@ class ArticleBagger:
 					self.raws.append( {} )
 					self.raws[-1]['kp'] = int(row['kp'])					#  Int
 					self.raws[-1]['url'] = row['url']						#  ASCII string
+					self.raws[-1]['native'] = bool(row['native_text'])	#  How this row's text is stored
 
-					self.raws[-1]['title'] = row['title']					#  Unicode-escaped
-					if self.raws[-1]['title'] is not None:
-						self.raws[-1]['title'] = self.raws[-1]['title'].decode('unicode-escape')
+					self.raws[-1]['title'] = storedtext.readText(row['title'], row['native_text'])
 
-					self.raws[-1]['text'] = row['content']					#  Unicode-escaped
-					if self.raws[-1]['text'] is not None:
-						self.raws[-1]['text'] = self.raws[-1]['text'].decode('unicode-escape')
+					self.raws[-1]['text'] = storedtext.readText(row['content'], row['native_text'])
+					self.raws[-1]['body-ref'] = row['body_ref']			#  Text is in the body store if content is NULL
 
-					self.raws[-1]['summary'] = row['summary']				#  Unicode-escaped
-					if self.raws[-1]['summary'] is not None:
-						self.raws[-1]['summary'] = self.raws[-1]['summary'].decode('unicode-escape')
+					self.raws[-1]['summary'] = storedtext.readText(row['summary'], row['native_text'])
 
-					self.raws[-1]['keyword'] = row['keyword']				#  Unicode-escaped
-					if self.raws[-1]['keyword'] is not None:
-						self.raws[-1]['keyword'] = self.raws[-1]['keyword'].decode('unicode-escape')
+					self.raws[-1]['keyword'] = storedtext.readText(row['keyword'], row['native_text'])
 
 					self.raws[-1]['lang-claimed'] = row['lang_claimed']		#  Unicode-escaped
 
@@ -438,22 +416,16 @@ class ArticleBagger:
 				self.raws.append( {} )
 				self.raws[-1]['kp'] = int(row['kp'])						#  Int
 				self.raws[-1]['url'] = row['url']							#  ASCII string
+				self.raws[-1]['native'] = bool(row['native_text'])	#  How this row's text is stored
 
-				self.raws[-1]['title'] = row['title']						#  Unicode-escaped
-				if self.raws[-1]['title'] is not None:
-					self.raws[-1]['title'] = self.raws[-1]['title'].decode('unicode-escape')
+				self.raws[-1]['title'] = storedtext.readText(row['title'], row['native_text'])
 
-				self.raws[-1]['text'] = row['content']						#  Unicode-escaped
-				if self.raws[-1]['text'] is not None:
-					self.raws[-1]['text'] = self.raws[-1]['text'].decode('unicode-escape')
+				self.raws[-1]['text'] = storedtext.readText(row['content'], row['native_text'])
+				self.raws[-1]['body-ref'] = row['body_ref']			#  Text is in the body store if content is NULL
 
-				self.raws[-1]['summary'] = row['summary']					#  Unicode-escaped
-				if self.raws[-1]['summary'] is not None:
-					self.raws[-1]['summary'] = self.raws[-1]['summary'].decode('unicode-escape')
+				self.raws[-1]['summary'] = storedtext.readText(row['summary'], row['native_text'])
 
-				self.raws[-1]['keyword'] = row['keyword']					#  Unicode-escaped
-				if self.raws[-1]['keyword'] is not None:
-					self.raws[-1]['keyword'] = self.raws[-1]['keyword'].decode('unicode-escape')
+				self.raws[-1]['keyword'] = storedtext.readText(row['keyword'], row['native_text'])
 
 				self.raws[-1]['lang-claimed'] = row['lang_claimed']			#  Unicode-escaped
 
@@ -461,9 +433,22 @@ class ArticleBagger:
 				self.raws[-1]['pub-date'] = row['pub_date']					#  Datetime
 				self.raws[-1]['date-retrieved'] = row['ret_date']			#  Datetime
 
+		self.fetchBodies(cursor, start)
 		cursor.close()
 		return
 
+	#  Fill in the text of raws[start:] whose articles keep it in the body store (see bodystore.py)
+	def fetchBodies(self, cursor, start=0):
+		refs = [x['body-ref'] for x in self.raws[start:] if x['text'] is None and x['body-ref'] is not None]
+		if len(refs) > 0:
+			if self.bodyStore is None:
+				self.bodyStore = BodyStore(self.link)
+			bodies = self.bodyStore.fetch(cursor, refs)
+			for raw in self.raws[start:]:
+				if raw['text'] is None and raw['body-ref'] is not None:
+					raw['text'] = bodies.get(int(raw['body-ref']))
+		return
+
 	#  A more specific record-cleaning routine:
 	#  Assumes 'raws' has the expected content.
 	#  Builds a bag of words for the raw record [i] using language 'lang'
@@ -488,6 +473,33 @@ class ArticleBagger:
 
 		return
 
+	#  Write every bag back to its row: one parameterized UPDATE sent for all rows, committed every
+	#  self.commitEvery rows rather than after each.
+	#  Bags are stored the same way as their article's text:
+	#      u'montclair'          ==> 'montclair'
+	#      u'\u4f0a\u6717\u4eba' ==> '\u4f0a\u6717\u4eba'
+	#  or as they are, if the row stores native text (see storedtext.py).
+	#  A row migrated since we read it is left for the next run.
+	def writeBags(self, cursor):
+		query = 'UPDATE articles SET bag_of_words = %s, processed = TRUE WHERE kp = %s AND native_text = %s'
+		commits = database.CommitBatcher(self.link, self.commitEvery)
+		rows = []
+		for i in range(0, len(self.raws)):
+			bag = u"\t".join(self.bags[i])
+			if self.raws[i]['native']:
+				rows.append( (bag.encode('utf-8'), self.raws[i]['kp'], True) )
+			else:
+				rows.append( (storedtext.legacyValue(bag), self.raws[i]['kp'], False) )
+
+		for i in range(0, len(rows), self.commitEvery):
+			database.executeBatch(cursor, query, rows[i:i + self.commitEvery], commits)
+			if self.verbose:
+				sys.stdout.write('Updating database: ' + \
+				                 str(int(float(min(i + self.commitEvery, len(rows))) / float(len(rows)) * 100)) + '%' + "\r")
+				sys.stdout.flush()
+		commits.flush()
+		return
+
 	#  Assumes raws[] and bags[] have content
 	#  Online saves do NOT update the timing table
 	def save(self):
@@ -499,25 +511,7 @@ class ArticleBagger:
 				sys.stdout.write('Updating database: 0%' + "\r")
 				sys.stdout.flush()
 
-			for i in range(0, len(self.raws)):
-									#  Convert Unicode strings to DB-safe representations
-									#  u'montclair'          ==> 'montclair'
-									#  u'\u4f0a\u6717\u4eba' ==> '\u4f0a\u6717\u4eba'
-				safe = [repr(x)[2:-1] for x in self.bags[i]]
-				safe = [re.sub(r'\"', '\\\"', x) for x in safe]
-				safe = [re.sub(r'\u', '\\u', x) for x in safe]
-
-				query  = 'UPDATE articles SET'
-				query += ' bag_of_words = "' + "\t".join(safe) + '",'
-				query += ' processed = TRUE'
-				query += ' WHERE kp = ' + str(self.raws[i]['kp']) + ';'
-				cursor.execute(query)
-				self.link.commit()
-
-				if self.verbose:
-					sys.stdout.write('Updating database: ' + \
-					                 str(int(float(i + 1) / float(len(self.raws)) * 100)) + '%' + "\r")
-					sys.stdout.flush()
+			self.writeBags(cursor)
 
 			if self.verbose:
 				print("\n")
@@ -604,7 +598,7 @@ class ArticleBagger:
 		   self.dbUser is not None and \
 		   self.dbPword is not None and \
 		   self.dbTable is not None:
-			self.link = MySQLdb.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
+			self.link = database.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
 		elif self.verbose:
 			print('Unable to open a DB connection because credentials are missing.')
 
@@ -612,7 +606,7 @@ class ArticleBagger:
 
 	#  Close the connection to the database
 	def closeDB(self):
-		self.link.close()
+		database.release(self.link)			#  Back to the pool for the next user
 		return
 
 	def setLimit(self, x):
@@ -0,0 +1,117 @@
+import sys
+import time
+import hashlib								#  Body store keys are content fingerprints
+import MySQLdb								#  Used for DB operations
+import database								#  Pooled connections and batched statements
+import storedtext							#  Legacy and native text renderings
+from bodystore import BodyStore				#  Where the text is going
+
+#  Move the text of existing articles out of articles.content and into the compressed body store (bodystore.py),
+#  a batch at a time, while the collectors and readers keep running. With zstandard installed and no dictionary
+#  trained yet, first trains one on a sample of the articles.
+#
+#  As in textmigrate.py, each batch is one short transaction, and a row is only rewritten if its content is still
+#  what was read. Re-running the script picks up wherever the last run stopped.
+
+#  Move everything, 500 rows per batch, resting half a second between batches,
+#  and show your work
+#  python bodymigrate.py 500 0.5 y
+
+#  argv[0] = bodymigrate.py
+#  argv[1] = rows per batch (default 500)
+#  argv[2] = seconds to rest between batches (default 0.5)
+#  argv[3] = verbosity {Y/N}
+#  argv[4] = train a new dictionary first, even if there is one {Y/N}
+def main():
+	batchSize = 500
+	pause = 0.5
+	verbosity = False
+	retrain = False
+
+	if len(sys.argv) > 1:
+		batchSize = int(sys.argv[1])
+
+	if len(sys.argv) > 2:
+		pause = float(sys.argv[2])
+
+	if len(sys.argv) > 3:
+		if sys.argv[3].upper()[0] == 'Y':
+			verbosity = True
+
+	if len(sys.argv) > 4:
+		if sys.argv[4].upper()[0] == 'Y':
+			retrain = True
+
+	link = database.connect('localhost', 'censor', 'blockme', 'corpora')
+	store = BodyStore(link)
+	store.verbose = verbosity
+	if store.useZstd and (store.dictId == 0 or retrain):
+		store.trainDictionary(sampleTexts(link, 5000))
+
+	moved, skipped = migrateBodies(link, store, batchSize, pause, verbosity)
+	print(str(moved) + ' articles moved to the body store, ' + str(skipped) + ' changed underneath us (re-run to retry)')
+	database.release(link)
+
+#  Up to 'n' article texts spread across the table, to train a dictionary on
+def sampleTexts(link, n):
+	cursor = link.cursor(MySQLdb.cursors.DictCursor)
+	cursor.execute('SELECT MAX(kp) AS top FROM articles;')
+	top = cursor.fetchall()[0]['top'] or 0
+	step = max(int(top) / n, 1)
+	query  = 'SELECT content, native_text FROM articles'
+	query += ' WHERE content IS NOT NULL AND kp % ' + str(step) + ' = 0 LIMIT ' + str(n) + ';'
+	cursor.execute(query)
+	samples = [storedtext.readText(x['content'], x['native_text']) for x in cursor.fetchall()]
+	cursor.close()
+	return samples
+
+#  Same digest as FeedFetcher.fingerprint(), so a migrated body and a newly scraped copy share one key
+def fingerprint(text):
+	return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:16], 16)
+
+#  Move every article's content. Returns (rows moved, rows skipped because they changed meanwhile).
+def migrateBodies(link, store, batchSize, pause, verbosity):
+	moved = 0
+	skipped = 0
+	lastKey = 0								#  Walk the primary key, so each batch is an index range scan
+
+	select  = 'SELECT kp, content, native_text FROM articles'
+	select += ' WHERE content IS NOT NULL AND body_ref IS NULL AND kp > %s ORDER BY kp LIMIT %s;'
+	update  = 'UPDATE articles SET content = NULL, body_ref = %s WHERE kp = %s AND content = %s;'
+
+	cursor = link.cursor(MySQLdb.cursors.DictCursor)
+	while True:
+		cursor.execute(select, (lastKey, batchSize))
+		rows = cursor.fetchall()
+		if len(rows) == 0:
+			break
+
+		bodies = []
+		for row in rows:
+			text = storedtext.readText(row['content'], row['native_text'])
+			bodies.append( (fingerprint(text), text) )
+		store.store(cursor, bodies)			#  Bodies first, so no article ever points at nothing
+
+		for row, (ref, text) in zip(rows, bodies):
+			cursor.execute(update, (ref, row['kp'], row['content']))
+			if cursor.rowcount == 1:
+				moved += 1
+			else:
+				skipped += 1
+			lastKey = row['kp']
+		link.commit()						#  One short transaction per batch
+
+		if verbosity:
+			sys.stdout.write(str(moved) + ' articles moved, up to kp ' + str(lastKey) + "\r")
+			sys.stdout.flush()
+
+		if pause > 0:
+			time.sleep(pause)
+
+	cursor.close()
+	if verbosity:
+		print('')
+	return moved, skipped
+
+if __name__ == '__main__':
+	main()
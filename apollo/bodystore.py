@@ -0,0 +1,144 @@
+import zlib								#  Always available: bodies are zlib-compressed when zstd is not
+import MySQLdb								#  Used for DB operations
+import database								#  Batched statements
+from datetime import datetime				#  Time stamp for trained dictionaries
+try:
+	import zstandard						#  https://pypi.python.org/pypi/zstandard (optional)
+except ImportError:
+	zstandard = None
+
+#  A content-addressed, compressed store for article text, in the 'article_body' table.
+#
+#  The same wire story turns up in many feeds under different URLs, and each copy used to carry the whole text in
+#  articles.content. Here a text is stored once, compressed, under its content fingerprint (the article's
+#  hash_content, see FeedFetcher.fingerprint()); an 'articles' row that uses the store leaves 'content' NULL and
+#  points at its text with 'body_ref'. Several rows may point at the same body.
+#
+#  Bodies are compressed with zstd when the zstandard package is installed, using a dictionary trained on our own
+#  articles (see trainDictionary()): news text is short and repetitive, and a shared dictionary roughly halves what
+#  zstd manages on each article alone. Without zstandard, bodies are zlib-compressed. Each body records its codec
+#  and dictionary, so bodies written either way, and under older dictionaries, stay readable.
+#
+#  store = BodyStore(link)
+#  store.store(cursor, [(hash_content, u'Lorem ipsum dolor sit amet...'), ...])
+#  store.fetch(cursor, [hash_content, ...])		==>  {hash_content: u'Lorem ipsum dolor sit amet...', ...}
+
+CODEC_ZLIB = 0								#  Values of article_body.codec
+CODEC_ZSTD = 1
+
+class BodyStore:
+	def __init__(self, link):
+		self.link = link					#  Open MySQL link (see database.connect())
+		self.useZstd = zstandard is not None	#  Compress new bodies with zstd (if installed) rather than zlib
+		self.zstdLevel = 9					#  zstd compression level for new bodies
+		self.zlibLevel = 6					#  zlib compression level for new bodies
+		self.dictSize = 112640				#  Bytes in a trained dictionary (zstd's own default)
+		self.dictId = 0						#  Dictionary used for new bodies (0: none); see loadDictionary()
+		self.compressor = None				#  zstd compressor for new bodies, built around that dictionary
+		self.decompressors = {}				#  [dictionary id] ==> zstd decompressor
+		self.verbose = False				#  Whether to print progress to screen
+		if self.useZstd:
+			self.loadDictionary()
+		return
+
+	#  Use the most recently trained dictionary for new bodies (or none, if none has been trained)
+	def loadDictionary(self):
+		cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+		cursor.execute('SELECT kp FROM body_dictionary ORDER BY kp DESC LIMIT 1;')
+		result = cursor.fetchall()
+		cursor.close()
+		if len(result) > 0:
+			self.dictId = int(result[0]['kp'])
+		else:
+			self.dictId = 0
+		self.compressor = None
+		return
+
+	#  Train a zstd dictionary on the given sample texts (a few thousand articles is plenty), store it in the
+	#  'body_dictionary' table, and use it for new bodies from now on. Returns the new dictionary's id.
+	def trainDictionary(self, samples):
+		if zstandard is None:
+			if self.verbose:
+				print('zstandard is not installed; no dictionary trained.')
+			return 0
+
+		samples = [x.encode('utf-8') if isinstance(x, unicode) else x for x in samples if x]
+		trained = zstandard.train_dictionary(self.dictSize, samples)
+
+		cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+		cursor.execute('INSERT INTO body_dictionary(dict, trained) VALUES(%s, %s);', \
+		               (trained.as_bytes(), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+		self.link.commit()
+		cursor.close()
+
+		self.loadDictionary()
+		if self.verbose:
+			print('Trained dictionary ' + str(self.dictId) + ' on ' + str(len(samples)) + ' samples')
+		return self.dictId
+
+	#  Compress a text for storage. Returns a tuple (codec, dictionary id, compressed bytes).
+	def compress(self, text):
+		if isinstance(text, unicode):
+			text = text.encode('utf-8')
+		if not self.useZstd:
+			return CODEC_ZLIB, 0, zlib.compress(text, self.zlibLevel)
+		if self.compressor is None:
+			if self.dictId > 0:
+				dictionary = zstandard.ZstdCompressionDict(self.dictionaryBytes(self.dictId))
+				self.compressor = zstandard.ZstdCompressor(level=self.zstdLevel, dict_data=dictionary)
+			else:
+				self.compressor = zstandard.ZstdCompressor(level=self.zstdLevel)
+		return CODEC_ZSTD, self.dictId, self.compressor.compress(text)
+
+	#  Undo compress(). Returns a unicode string.
+	def decompress(self, codec, dictId, data):
+		if codec == CODEC_ZLIB:
+			return zlib.decompress(data).decode('utf-8')
+		if zstandard is None:
+			raise RuntimeError('Article body is zstd-compressed, but zstandard is not installed')
+		if dictId not in self.decompressors:
+			if dictId > 0:
+				dictionary = zstandard.ZstdCompressionDict(self.dictionaryBytes(dictId))
+				self.decompressors[dictId] = zstandard.ZstdDecompressor(dict_data=dictionary)
+			else:
+				self.decompressors[dictId] = zstandard.ZstdDecompressor()
+		return self.decompressors[dictId].decompress(data).decode('utf-8')
+
+	#  The raw bytes of a stored dictionary
+	def dictionaryBytes(self, dictId):
+		cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+		cursor.execute('SELECT dict FROM body_dictionary WHERE kp = %s;', (dictId, ))
+		result = cursor.fetchall()
+		cursor.close()
+		if len(result) == 0:
+			raise RuntimeError('No body dictionary ' + str(dictId))
+		return result[0]['dict']
+
+	#  Store the given (fingerprint, text) pairs. Bodies already in the store are left alone, so storing the same
+	#  story twice costs one compression and nothing else. Does not commit: bodies go in with the articles that
+	#  point at them.
+	def store(self, cursor, bodies):
+		rows = []
+		seen = set()
+		for ref, text in bodies:
+			if ref in seen:
+				continue
+			seen.add(ref)
+			codec, dictId, data = self.compress(text)
+			rows.append( (ref, codec, dictId, data) )
+		database.executeBatch(cursor, 'INSERT IGNORE INTO article_body(hash_content, codec, dict_id, body) VALUES (%s, %s, %s, %s)', \
+		                      rows, None, 100)
+		return len(rows)
+
+	#  Return a dictionary [fingerprint] ==> text (unicode) for whichever of the given fingerprints are stored.
+	#  Lookups go in chunks of 1000.
+	def fetch(self, cursor, refs):
+		refs = sorted(set([int(x) for x in refs if x is not None]))
+		found = {}
+		for i in range(0, len(refs), 1000):
+			query  = 'SELECT hash_content, codec, dict_id, body FROM article_body'
+			query += ' WHERE hash_content IN (' + ', '.join([str(x) for x in refs[i:i + 1000]]) + ');'
+			cursor.execute(query)
+			for row in cursor.fetchall():
+				found[int(row['hash_content'])] = self.decompress(int(row['codec']), int(row['dict_id']), row['body'])
+		return found
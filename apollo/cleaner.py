@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import re									#  One compiled pattern does all the work
+import htmlentitydefs						#  Names of the HTML character entities
+
+#  Text clean-up shared by all the collectors (FeedFetcher, FreeWeiboFetcher, WeiboFetcher).
+#
+#  Scraped text used to be cleaned in several passes per field: a BeautifulSoup tree to strip the markup,
+#  one re.sub() per entry in the replacement table, then two more regular expressions for numeric entities.
+#  This class does the same jobs in a single scan of the string:
+#    - strip tags and comments, keeping the text inside CDATA sections,
+#    - decode character entities (&amp; &#8212; &#x4e2d; ...),
+#    - swap out special characters according to the replacement table,
+#    - turn line breaks into spaces.
+#  All of these are alternatives in one compiled regular expression, and a single callback decides
+#  what each match becomes.
+#
+#  cleaner = TextCleaner()
+#  cleaner.clean(u'<p>Fish &amp; chips&#8212;again</p>')				==>  u'Fish & chips--again'
+#  cleaner.clean(html, stripTags=False)									==>  markup kept, entities and line breaks handled
+class TextCleaner:
+	def __init__(self, table=None):
+		if table is None:
+			table = self.initReplace()
+		self.table = table					#  Replacement table: [special character signifier] ==> replacement
+		self.patterns = {}					#  [(stripTags, removeLB, replaceSpecial)] ==> (compiled pattern, callback)
+		return
+
+	#  Clean a string in one pass. Returns a unicode string ('text' may be a UTF-8 byte string).
+	#  stripTags:      Remove markup and decode every character entity, much as BeautifulSoup's get_text() would
+	#  removeLB:       Replace each line break with a single space
+	#  replaceSpecial: Apply the replacement table, and decode numeric entities even when markup is kept
+	def clean(self, text, stripTags=True, removeLB=True, replaceSpecial=True):
+		if text is None:
+			return None
+		if isinstance(text, str):
+			text = unicode(text, 'utf-8', 'replace')
+		pattern, callback = self.compile(stripTags, removeLB, replaceSpecial)
+		return pattern.sub(callback, text)
+
+	#  Build (once) the pattern and callback for one combination of options
+	def compile(self, stripTags, removeLB, replaceSpecial):
+		key = (stripTags, removeLB, replaceSpecial)
+		if key in self.patterns:
+			return self.patterns[key]
+
+		#  The table is keyed by entities, but the same character can be written several ways
+		#  (&#xa0; &#160; &nbsp;), so look replacements up by the character itself.
+		#  Anything in the table that is not an entity is matched literally.
+		byChar = {}
+		literals = []
+		for k, v in self.table.items():
+			ch = self.decodeEntity(k)
+			if ch is not None:
+				byChar[ch] = v
+			else:
+				literals.append(k)
+
+		alternatives = []
+		if replaceSpecial and len(literals) > 0:
+			literals.sort(key=len, reverse=True)
+			alternatives.append(r'(?P<literal>' + '|'.join([re.escape(x) for x in literals]) + r')')
+		if stripTags:
+			alternatives.append(r'<!\[CDATA\[(?P<cdata>.*?)\]\]>')
+			alternatives.append(r'(?P<comment><!--.*?-->)')
+			alternatives.append(r'(?P<tag></?[a-zA-Z!?][^>]*>)')
+		if stripTags or replaceSpecial:
+			alternatives.append(r'(?P<entity>&(?:#[0-9]+|#[xX][0-9a-fA-F]+|[a-zA-Z][a-zA-Z0-9]*);)')
+		if removeLB:
+			alternatives.append(u'(?P<lb>\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029])')
+
+		if len(alternatives) == 0:			#  Nothing to do: match nothing
+			alternatives.append(r'(?!)')
+
+		table = self.table
+
+		def callback(m):
+			kind = m.lastgroup
+			if kind == 'literal':
+				return table[m.group('literal')]
+			if kind == 'entity':
+				entity = m.group('entity')
+				if replaceSpecial and entity in table:
+					return table[entity]
+				numeric = entity[1] == '#'
+				if not stripTags and not numeric:
+					return entity			#  Markup is being kept: leave named entities alone
+				ch = self.decodeEntity(entity)
+				if ch is None:
+					return entity			#  Not an entity we know: keep it as written
+				if replaceSpecial and ch in byChar:
+					return byChar[ch]
+				return ch
+			if kind == 'lb':
+				return u' '
+			if kind == 'cdata':
+				return m.group('cdata')
+			return u''						#  Tags and comments
+
+		self.patterns[key] = (re.compile(u'|'.join(alternatives), re.DOTALL | re.UNICODE), callback)
+		return self.patterns[key]
+
+	#  Return the character written by an entity like '&amp;', '&#38;' or '&#x26;',
+	#  or None if the string is not an entity we recognize.
+	def decodeEntity(self, entity):
+		if len(entity) < 3 or entity[0] != '&' or entity[-1] != ';':
+			return None
+		body = entity[1:-1]
+		try:
+			if body[:2] in ('#x', '#X'):
+				return unichr(int(body[2:], 16))
+			if body[:1] == '#':
+				return unichr(int(body[1:]))
+		except ValueError:					#  Not a number, or beyond what this Python can represent
+			return None
+		if body in htmlentitydefs.name2codepoint:
+			return unichr(htmlentitydefs.name2codepoint[body])
+		if body == 'apos':					#  XML, not HTML 4, so missing from htmlentitydefs
+			return u"'"
+		return None
+
+	#  Build a lookup table of special character signifiers we'll want to replace before storage/parsing/etc.
+	def initReplace(self):
+		d = {}
+		d['&apos;'] = '\''					#  HTML apostrophe
+		d['&#39;'] = '\''					#  Decimal apostrophe
+		d['&amp;'] = '&'					#  HTML ampersand
+		d['&#38;'] = '&'					#  Decimal ampersand
+		d['&quot;'] = '"'					#  HTML double-quote
+		d['&#34;'] = '"'					#  Decimal double-quote
+		d['&lt;'] = '<'						#  HTML less-than
+		d['&#60;'] = '<'					#  Decimal less-than
+		d['&gt;'] = '>'						#  HTML greater-than
+		d['&#62;'] = '>'					#  Decimal greater-than
+		d['&mdash;'] = '--'					#  HTML em-dash
+		d['&#8212;'] = '--'					#  Decimal em-dash
+		d['&ndash;'] = '--'					#  HTML en-dash
+		d['&#8211;'] = '--'					#  Decimal en-dash
+		d['&#8210;'] = '--'					#  Decimal figure-dash
+		d['&#xa0;'] = ''					#  "Non-breakable Space" symbol is irrelevant to our collections
+		d['&#x00a0;'] = ''					#  Four-digit equivalent
+		return d
@@ -1,4 +1,7 @@
 import MySQLdb						#  Used for DB operations
+import database						#  Pooled connections and batched statements
+import storedtext					#  How text columns are written and read back
+from bodystore import BodyStore		#  Article text kept out of the 'articles' table
 
 '''
 A corpus is understood to be a list of strings, where each string represents a "document":
@@ -60,6 +63,9 @@ class CorpusBuilder:
 		self.startTime = None		#  Time this routine
 		self.stopTime = None
 
+		self.fetchChunk = 1000		#  KPs looked up per query (see selectByKeys())
+		self.streaming = False		#  Whether to stream query results rather than buffer them
+
 		self.verbose = False		#  Whether to print progress to screen
 
 	#  What you came to corpusbuilder.py for:
@@ -128,36 +134,31 @@ class CorpusBuilder:
 	#  Fetch values for whichever keys have been added to self.articles
 	def fetchArticles(self):
 		if self.link is not None:
-			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
-			for k in self.articles.keys():
+			refs = {}												#  [k] ==> where its text is in the body store
+			columns = 'title, content, summary, keyword, bag_of_words, body_ref, native_text'
+			for row in self.selectByKeys('articles', columns, self.articles.keys()):
+				k = int(row['kp'])										#  Text is Unicode-escaped or native (see storedtext.py)
 				if self.verbose:
 					print('Retrieving articles[' + str(k) + ']')
 
-				query  = 'SELECT title, content, summary, keyword, bag_of_words FROM articles WHERE kp = ' + str(k) + ';'
-				cursor.execute(query)
-				result = cursor.fetchall()
-				for row in result:											#  Expect text is Unicode-escaped
-					self.articles[k]['title'] = row['title']
-					if self.articles[k]['title'] is not None:
-						self.articles[k]['title'] = self.articles[k]['title'].decode('unicode-escape')
+				self.articles[k]['title'] = storedtext.readText(row['title'], row['native_text'])
 
-					self.articles[k]['content'] = row['content']
-					if self.articles[k]['content'] is not None:
-						self.articles[k]['content'] = self.articles[k]['content'].decode('unicode-escape')
+				self.articles[k]['content'] = storedtext.readText(row['content'], row['native_text'])
+				if row['content'] is None and row['body_ref'] is not None:
+					refs[k] = int(row['body_ref'])
 
-					self.articles[k]['summary'] = row['summary']
-					if self.articles[k]['summary'] is not None:
-						self.articles[k]['summary'] = self.articles[k]['summary'].decode('unicode-escape')
+				self.articles[k]['summary'] = storedtext.readText(row['summary'], row['native_text'])
 
-					self.articles[k]['keyword'] = row['keyword']
-					if self.articles[k]['keyword'] is not None:
-						self.articles[k]['keyword'] = self.articles[k]['keyword'].decode('unicode-escape')
+				self.articles[k]['keyword'] = storedtext.readText(row['keyword'], row['native_text'])
 
-					self.articles[k]['bag_of_words'] = row['bag_of_words']
-					if self.articles[k]['bag_of_words'] is not None:
-						self.articles[k]['bag_of_words'] = self.articles[k]['bag_of_words'].decode('unicode-escape')
+				self.articles[k]['bag_of_words'] = storedtext.readText(row['bag_of_words'], row['native_text'])
 
-			cursor.close()
+			if len(refs) > 0:										#  Fetch stored texts all together
+				cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+				bodies = BodyStore(self.link).fetch(cursor, refs.values())
+				for k, ref in refs.items():
+					self.articles[k]['content'] = bodies.get(ref)
+				cursor.close()
 
 		elif self.verbose:
 			print("Unable to pull articles because not connected to database.")
@@ -193,36 +194,21 @@ class CorpusBuilder:
 	#  Fetch values for whichever keys have been added to self.weibo
 	def fetchWeibo(self):
 		if self.link is not None:
-			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
-			for k in self.weibo.keys():
+			columns = 'title, content, summary, keyword, bag_of_words, native_text'
+			for row in self.selectByKeys('weibo', columns, self.weibo.keys()):
+				k = int(row['kp'])										#  Text is Unicode-escaped or native (see storedtext.py)
 				if self.verbose:
 					print('Retrieving Weibo post[' + str(k) + ']')
 
-				query  = 'SELECT title, content, summary, keyword, bag_of_words FROM weibo WHERE kp = ' + str(k) + ';'
-				cursor.execute(query)
-				result = cursor.fetchall()
-				for row in result:											#  Expect text is Unicode-escaped
-					self.weibo[k]['title'] = row['title']
-					if self.weibo[k]['title'] is not None:
-						self.weibo[k]['title'] = self.weibo[k]['title'].decode('unicode-escape')
-
-					self.weibo[k]['content'] = row['content']
-					if self.weibo[k]['content'] is not None:
-						self.weibo[k]['content'] = self.weibo[k]['content'].decode('unicode-escape')
+				self.weibo[k]['title'] = storedtext.readText(row['title'], row['native_text'])
 
-					self.weibo[k]['summary'] = row['summary']
-					if self.weibo[k]['summary'] is not None:
-						self.weibo[k]['summary'] = self.weibo[k]['summary'].decode('unicode-escape')
+				self.weibo[k]['content'] = storedtext.readText(row['content'], row['native_text'])
 
-					self.weibo[k]['keyword'] = row['keyword']
-					if self.weibo[k]['keyword'] is not None:
-						self.weibo[k]['keyword'] = self.weibo[k]['keyword'].decode('unicode-escape')
+				self.weibo[k]['summary'] = storedtext.readText(row['summary'], row['native_text'])
 
-					self.weibo[k]['bag_of_words'] = row['bag_of_words']
-					if self.weibo[k]['bag_of_words'] is not None:
-						self.weibo[k]['bag_of_words'] = self.weibo[k]['bag_of_words'].decode('unicode-escape')
+				self.weibo[k]['keyword'] = storedtext.readText(row['keyword'], row['native_text'])
 
-			cursor.close()
+				self.weibo[k]['bag_of_words'] = storedtext.readText(row['bag_of_words'], row['native_text'])
 
 		elif self.verbose:
 			print("Unable to pull weibo posts because not connected to database.")
@@ -258,38 +244,46 @@ class CorpusBuilder:
 	#  Fetch values for whichever keys have been added to self.freeweibo
 	def fetchFreeWeibo(self, i):
 		if self.link is not None:
-			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
-			for k in self.freeweibo.keys():
+			columns = 'content, data_id, weibo_id, pub_date, date_retrieved, bag_of_words, native_text'
+			for row in self.selectByKeys('freeweibo', columns, self.freeweibo.keys()):
+				k = int(row['kp'])										#  Text is Unicode-escaped or native (see storedtext.py)
 				if self.verbose:
 					print('Retrieving FreeWeibo post[' + str(k) + ']')
 
-				query  = 'SELECT content, data_id, weibo_id, pub_date, date_retrieved, bag_of_words FROM freeweibo WHERE kp = ' + str(k) + ';'
-				cursor.execute(query)
-				result = cursor.fetchall()
-				for row in result:											#  Expect text is Unicode-escaped
-					self.freeweibo[k]['content'] = row['content']
-					if self.freeweibo[k]['content'] is not None:
-						self.freeweibo[k]['content'] = self.freeweibo[k]['content'].decode('unicode-escape')
-
-					self.freeweibo[k]['data_id'] = row['data_id']
+				self.freeweibo[k]['content'] = storedtext.readText(row['content'], row['native_text'])
 
-					self.freeweibo[k]['weibo_id'] = row['weibo_id']
+				self.freeweibo[k]['data_id'] = row['data_id']
 
-					self.freeweibo[k]['pub_date'] = row['pub_date']
+				self.freeweibo[k]['weibo_id'] = row['weibo_id']
 
-					self.freeweibo[k]['date_retrieved'] = row['date_retrieved']
+				self.freeweibo[k]['pub_date'] = row['pub_date']
 
-					self.freeweibo[k]['bag_of_words'] = row['bag_of_words']
-					if self.freeweibo[k]['bag_of_words'] is not None:
-						self.freeweibo[k]['bag_of_words'] = self.freeweibo[k]['bag_of_words'].decode('unicode-escape')
+				self.freeweibo[k]['date_retrieved'] = row['date_retrieved']
 
-			cursor.close()
+				self.freeweibo[k]['bag_of_words'] = storedtext.readText(row['bag_of_words'], row['native_text'])
 
 		elif self.verbose:
 			print("Unable to pull freeweibo posts because not connected to database.")
 
 		return
 
+	#  Yield the rows of 'table' (with their KPs and the given columns) for the given KPs, self.fetchChunk KPs
+	#  per query rather than one query per KP. With self.streaming, rows come from the server as they are read
+	#  instead of a whole chunk at a time, which keeps memory flat on very large corpora.
+	def selectByKeys(self, table, columns, keys):
+		keys = sorted(keys)
+		for i in range(0, len(keys), self.fetchChunk):
+			if self.streaming:
+				cursor = database.streamingCursor(self.link)
+			else:
+				cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			query  = 'SELECT kp, ' + columns + ' FROM ' + table
+			query += ' WHERE kp IN (' + ', '.join([str(x) for x in keys[i:i + self.fetchChunk]]) + ');'
+			cursor.execute(query)
+			for row in cursor:
+				yield row
+			cursor.close()
+
 	### D B   S t u f f ###########################################################################
 	#  If they were not provided in the constructor, they may be provided here.
 	def setDBcredentials(self, host, uname, pword, table):
@@ -305,7 +299,7 @@ class CorpusBuilder:
 		   self.dbUser is not None and \
 		   self.dbPword is not None and \
 		   self.dbTable is not None:
-			self.link = MySQLdb.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
+			self.link = database.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
 		elif self.verbose:
 			print('Unable to open a DB connection because credentials are missing.')
 
@@ -313,7 +307,7 @@ class CorpusBuilder:
 
 	#  Close the connection to the database
 	def closeDB(self):
-		self.link.close()
+		database.release(self.link)			#  Back to the pool for the next user
 		return
 
 	def startTimer(self):
@@ -0,0 +1,155 @@
+import threading							#  Pools are shared between threads
+import MySQLdb								#  Used for DB operations
+
+#  The one place the apollo classes get their database connections and run their batched statements.
+#
+#  Connections come from a pool per (host, user, database). closeDB() hands a connection back instead of closing
+#  it, so a process that opens and closes the database repeatedly (rssdaemon.py, a bagging run, the corpus
+#  builder inside apollo.py) keeps re-using the same few connections; a connection is checked with ping() before
+#  it is handed out again. Every connection uses utf8mb4 and returns text as UTF-8 byte strings (see
+#  storedtext.py).
+#
+#  MySQLdb has no server-side prepared statements. What it does have is executemany(), which folds a
+#  parameterized INSERT ... VALUES (%s, ...) and a list of rows into one multi-row statement: one round-trip
+#  and one parse for the whole list. executeBatch() wraps that in chunks, and CommitBatcher commits every so
+#  many writes instead of after each one.
+#
+#  link = database.connect('localhost', 'censor', 'blockme', 'corpora')
+#  cursor = link.cursor(MySQLdb.cursors.DictCursor)
+#  commits = database.CommitBatcher(link, 500)
+#  database.executeBatch(cursor, 'INSERT INTO article_source(article_id, source) VALUES (%s, %s)', rows, commits)
+#  commits.flush()
+#  database.release(link)
+
+class ConnectionPool:
+	def __init__(self, host, user, pword, db, size=4):
+		self.host = host					#  Credentials for new connections
+		self.user = user
+		self.pword = pword
+		self.db = db
+		self.size = size					#  Most idle connections kept; any more are closed when released
+		self.idle = []						#  Open connections waiting to be handed out
+		self.lock = threading.Lock()
+		return
+
+	#  Hand out an idle connection that still answers, or open a new one
+	def get(self):
+		while True:
+			self.lock.acquire()
+			try:
+				if len(self.idle) == 0:
+					break
+				link = self.idle.pop()
+			finally:
+				self.lock.release()
+			try:
+				link.ping()
+				return link
+			except MySQLdb.Error:			#  Timed out or dropped while idle: discard it
+				try:
+					link.close()
+				except MySQLdb.Error:
+					pass
+		return MySQLdb.connect(self.host, self.user, self.pword, self.db, charset='utf8mb4', use_unicode=False)
+
+	#  Take a connection back. Whatever it left uncommitted is rolled back, so the next user starts clean.
+	def put(self, link):
+		try:
+			link.rollback()
+		except MySQLdb.Error:
+			return
+		self.lock.acquire()
+		try:
+			if len(self.idle) < self.size:
+				self.idle.append(link)
+				return
+		finally:
+			self.lock.release()
+		link.close()
+		return
+
+	#  Close every idle connection
+	def closeAll(self):
+		self.lock.acquire()
+		try:
+			idle = self.idle
+			self.idle = []
+		finally:
+			self.lock.release()
+		for link in idle:
+			try:
+				link.close()
+			except MySQLdb.Error:
+				pass
+		return
+
+pools = {}									#  [(host, user, db)] ==> ConnectionPool
+owners = {}									#  [id(connection)] ==> the pool it came from
+poolsLock = threading.Lock()
+
+#  Return a connection to the given database from its pool
+def connect(host, user, pword, db):
+	poolsLock.acquire()
+	try:
+		key = (host, user, db)
+		if key not in pools:
+			pools[key] = ConnectionPool(host, user, pword, db)
+		pool = pools[key]
+	finally:
+		poolsLock.release()
+
+	link = pool.get()
+	poolsLock.acquire()
+	owners[id(link)] = pool
+	poolsLock.release()
+	return link
+
+#  Hand a connection from connect() back to its pool (a connection from anywhere else is simply closed)
+def release(link):
+	poolsLock.acquire()
+	pool = owners.pop(id(link), None)
+	poolsLock.release()
+	if pool is not None:
+		pool.put(link)
+	else:
+		link.close()
+	return
+
+#  Run a parameterized statement once per row of 'rows', 'chunk' rows per executemany(). An INSERT ... VALUES
+#  goes to the server as one multi-row statement per chunk. If 'commits' is a CommitBatcher, it is told about
+#  each chunk. Returns the number of rows the server reports as affected.
+def executeBatch(cursor, query, rows, commits=None, chunk=500):
+	affected = 0
+	for i in range(0, len(rows), chunk):
+		cursor.executemany(query, rows[i:i + chunk])
+		affected += max(cursor.rowcount, 0)
+		if commits is not None:
+			commits.wrote(len(rows[i:i + chunk]))
+	return affected
+
+#  A cursor that streams its result set from the server as it is read, rather than loading all of it into
+#  memory first. Read every row (or close it) before running anything else on the same connection.
+def streamingCursor(link):
+	return link.cursor(MySQLdb.cursors.SSDictCursor)
+
+#  Commit once every 'every' writes instead of after each, and once more at flush().
+class CommitBatcher:
+	def __init__(self, link, every=500):
+		self.link = link					#  Connection to commit
+		self.every = every					#  Writes per commit (1: commit after every write, as before)
+		self.pending = 0					#  Writes since the last commit
+		return
+
+	#  Count 'n' writes, committing if enough have built up
+	def wrote(self, n=1):
+		self.pending += n
+		if self.pending >= self.every:
+			self.flush()
+		return
+
+	#  Commit whatever is outstanding
+	def flush(self):
+		if self.pending > 0:
+			self.link.commit()
+			self.pending = 0
+		return
@@ -0,0 +1,95 @@
+import os									#  Archive layout on disk
+import gzip									#  Bodies are stored compressed (readable with zcat)
+import json									#  Response headers are kept alongside each entry in the index
+import hashlib								#  Bodies are filed under their SHA-1
+import threading							#  Download threads archive side by side
+import time
+from datetime import datetime
+
+#  An on-disk archive of raw feed bodies, so that fetchFeedArticles() can be re-run on past inputs
+#  without the network: to regression-test parser and clean-up changes, or to benchmark them.
+#
+#  Bodies are content-addressed: each is gzipped into bodies/ab/abcdef... (its SHA-1), so a body that
+#  several polls (or several feeds) return is stored only once. Each download is recorded as one line
+#  in a daily index, index/YYYY-MM-DD.tsv:
+#      time retrieved <TAB> feed <TAB> SHA-1 <TAB> response headers as JSON
+#
+#  archive = FeedArchive('rss-archive')
+#  archive.store(feed, body, headers)
+#  for feed, body, headers in archive.replay('2018-02-21'): ...
+class FeedArchive:
+	def __init__(self, path):
+		self.path = path					#  Root directory of the archive
+		self.lock = threading.Lock()		#  One writer at a time appends to the index
+		return
+
+	#  Archive one downloaded feed body. 'bodyHash' may be given if the SHA-1 is already known.
+	def store(self, feed, body, headers, bodyHash=None):
+		if bodyHash is None:
+			bodyHash = hashlib.sha1(body).hexdigest()
+
+		bodyPath = self.bodyPath(bodyHash)
+		if not os.path.exists(bodyPath):
+			directory = os.path.dirname(bodyPath)
+			if not os.path.isdir(directory):
+				try:
+					os.makedirs(directory)
+				except OSError:				#  Another thread got there first
+					pass
+			tmpPath = bodyPath + '.' + str(threading.current_thread().ident) + '.tmp'
+			fh = gzip.open(tmpPath, 'wb')
+			fh.write(body)
+			fh.close()
+			os.rename(tmpPath, bodyPath)	#  A body file is either complete or absent
+
+		now = datetime.now()
+		line  = now.strftime('%Y-%m-%d %H:%M:%S') + "\t" + feed + "\t" + bodyHash + "\t"
+		line += json.dumps(headers or {}) + "\n"
+		self.lock.acquire()
+		try:
+			indexPath = self.indexPath(now.strftime('%Y-%m-%d'))
+			if not os.path.isdir(os.path.dirname(indexPath)):
+				os.makedirs(os.path.dirname(indexPath))
+			fh = open(indexPath, 'a')
+			fh.write(line)
+			fh.close()
+		finally:
+			self.lock.release()
+		return bodyHash
+
+	#  Yield a tuple (feed, body, headers) for each download recorded on the given day ('YYYY-MM-DD'),
+	#  in the order they were made. With no day, every day in the archive is replayed.
+	def replay(self, day=None):
+		if day is None:
+			days = self.days()
+		else:
+			days = [day]
+		for d in days:
+			indexPath = self.indexPath(d)
+			if not os.path.exists(indexPath):
+				continue
+			fh = open(indexPath, 'r')
+			for line in fh:
+				retrieved, feed, bodyHash, headers = line.rstrip("\n").split("\t", 3)
+				yield feed, self.load(bodyHash), json.loads(headers)
+			fh.close()
+
+	#  Return the body stored under the given SHA-1
+	def load(self, bodyHash):
+		fh = gzip.open(self.bodyPath(bodyHash), 'rb')
+		body = fh.read()
+		fh.close()
+		return body
+
+	#  Days for which the archive holds an index, oldest first
+	def days(self):
+		directory = os.path.join(self.path, 'index')
+		if not os.path.isdir(directory):
+			return []
+		return sorted([x[:-4] for x in os.listdir(directory) if x.endswith('.tsv')])
+
+	def bodyPath(self, bodyHash):
+		return os.path.join(self.path, 'bodies', bodyHash[:2], bodyHash + '.gz')
+
+	def indexPath(self, day):
+		return os.path.join(self.path, 'index', day + '.tsv')
@@ -1,15 +1,35 @@
 # -*- coding: utf-8 -*-
 
 import re									#  For find-replace regular expressions
+import codecs								#  Debug files hold native (UTF-8) text
 import sys									#  For overwriting output to the screen (verbose mode)
-import requests								#  Part of BeautifulSoup
+import httpclient							#  Shared, kept-alive HTTP session
+import hashlib								#  Recognize a page or post we have already read
+from seenindex import SeenIndex				#  Remembers which posts the page showed us last time
+from topicseries import TopicSeries			#  Compact record of the hot-topic rankings
 import bs4									#  Used to find() the censored bits
 from bs4 import BeautifulSoup
-from guess_language import *				#  Pretty lame trigram detector... but it's free
+try:
+	from lxml import etree					#  http://lxml.de/ (optional): reads only the parts of the page we want
+except ImportError:
+	etree = None
+from io import BytesIO						#  lxml parses the page as a stream
+import cgi									#  Escape text when re-serializing a post's content
+from cleaner import TextCleaner				#  Strips web-formatted characters in one pass
+from langid import LanguageIdentifier			#  Trigram language detection, all candidate languages scored at once
 import MySQLdb								#  Used for DB operations
+import database								#  Pooled connections and batched statements
+import storedtext							#  How text columns are rendered for storage
 import datetime								#  Used for time stamping our retrievals
 from datetime import datetime				#  Used for time stamping our retrievals
 import time									#  Track how long things take
+import threading							#  Download hot-topic pages side by side
+import Queue								#  Hand pages to, and collect them from, download threads
+
+FREEWEIBO_URL = 'https://freeweibo.com/'	#  Front page; hot-topic links are relative to it
+PAGE_KEY = 'page'							#  SeenIndex key: fingerprint of the last page read
+POSTS_KEY = 'posts'							#  SeenIndex key: data-ids of the posts on it
+PAGE_POSTS_KEY = 'page-posts'				#  SeenIndex key: (page fingerprint, data-id) of each post, by the page listing it
 
 #  The job of this class is to periodically grab a bunch of posts from FreeWeibo.com,
 #  parse them and save them to the database. Another routine will perform analysis, which takes
@@ -20,13 +40,14 @@ class FreeWeiboFetcher:
 		self.posts = []						#  List of FreeWeibo posts, stored here as dictionary objects:
 											#  One {} per post:
 											#  ['content'] = DB-safe HTML of post
+											#  ['text'] = the same HTML, as scraped (unicode)
 											#  ['data-id'] = identifier in FreeWeibo
 											#  ['weibo-id'] = identifier in Weibo
 											#  ['pub-date'] = Date time of publication
 											#  ['date-retrieved'] = The date we collected this post
 		self.topics = []					#  List of top ten "hot topics", taken from the FreeWeibo
 											#  right-hand side-bar. One tuple per topic:
-											#  (Link text, Link)
+											#  (Link text (unicode), Link)
 
 		self.link = None					#  MySQL link
 		self.dbHost = dbHost				#  String indicating database host
@@ -36,9 +57,22 @@ class FreeWeiboFetcher:
 
 		self.removeLB = True				#  Whether we remove line breaks
 		self.replaceSpecial = True			#  Whether to use the replacement dictionary to swap out special chars
-		self.replaceDict = self.initReplace()
+		self.nativeText = False				#  Whether to store text as UTF-8 rather than escaped (see storedtext.py)
+		self.cleaner = TextCleaner()		#  Holds the replacement table of special characters
+		self.langid = LanguageIdentifier()	#  Loads the trigram models once
 		self.verbose = False				#  Whether to print progress to screen (sometimes spits up funky chars)
 		self.debugFile = False				#  Whether to output queries to a debug file
+		self.commitEvery = 100				#  Posts written per commit by the one-row-at-a-time save()
+		self.bulkSave = True				#  Whether save() writes all posts and topics in a few set-based statements
+		self.targetedParse = True			#  Whether fetch() reads only the posts and side-bar, with lxml (if installed)
+		self.seenIndex = None				#  Optional SeenIndex of the page and posts read last time (see openSeenIndex())
+		self.topicSeries = None				#  TopicSeries the hot topics are recorded in (see openTopicSeries()); None: freeweibo_topics
+		self.pageUnchanged = False			#  Set by fetch() when the front page is the one read last poll (so are the hot topics)
+		self.crawlTopics = False			#  Whether fetch() also reads the pages of the hot topics
+		self.maxConnections = 3				#  Most hot-topic pages downloaded at once
+		self.politeDelay = 1.0				#  Seconds each download thread waits between its requests to FreeWeibo
+		self.connectTimeout = 10			#  Seconds to wait for FreeWeibo to accept the connection
+		self.readTimeout = 30				#  Seconds to wait for each read from FreeWeibo
 
 		self.startTime = None				#  Time this routine
 		self.stopTime = None
@@ -47,49 +81,201 @@ class FreeWeiboFetcher:
 
 	#  The way FreeWeibo works, this routine just scrapes whatever's on the page.
 	#  They do not appear to archive censored posts--at least not conveniently for retrieval.
+	#  If self.crawlTopics, the pages of the hot topics are read as well (see crawlTopicPages()). They change
+	#  on their own, so they are read whether or not the front page did.
 	def fetch(self):
-		url = "https://freeweibo.com/"
-		page = requests.get(url)
+		page = httpclient.session().get(FREEWEIBO_URL, timeout=(self.connectTimeout, self.readTimeout))
 		if page.status_code == 200:
 
+			pageHash = hashlib.sha1(page.content).hexdigest()
+			if self.seenIndex is not None:
+				self.pageUnchanged = self.seenIndex.contains(PAGE_KEY, [pageHash])
+				self.seenIndex.record(PAGE_KEY, [pageHash])	#  Still on FreeWeibo: keep it in the index
+			if self.pageUnchanged:
+				if self.verbose:
+					print('FreeWeibo is unchanged since the last poll.')
+				self.carryPosts(pageHash)
+				if not self.crawlTopics:
+					return					#  Nothing new since the last poll: no parsing at all
+
 			self.startTimer()				#  Begin timing the scrape
 
-			html = page.text
-			#  Chuck it into the soup
-			soup = BeautifulSoup(html, 'html.parser')
-			#  Get all censored posts
-			censored = soup.findAll('div', attrs={'class':'censored-1'})
+			censored, topics = self.readPage(page)
+			found = set()					#  data-ids read this run, from any page
+			if not self.pageUnchanged:		#  Otherwise read only for its hot-topic links: the same ranking as last poll
+				if self.verbose:
+					print("Scraped " + str(len(censored)) + " censored posts from FreeWeibo.")
+				self.readPosts(censored, found, pageHash)
+
+				if self.verbose:
+					print("FreeWeibo hot topics:")
+
+				for topicText, topicLink in topics:
+					self.topics.append( (topicText, topicLink) )	#  Rendered for storage only when saved
+
+					if self.verbose:
+						print("\t" + topicText)
+
+			if self.crawlTopics:
+				self.crawlTopicPages([x[1] for x in topics], found)
+
+		elif self.verbose:
+			print('Page connection error.')
+		return
+
+	#  Read the page behind each hot topic, which lists many more censored posts than the front page, and
+	#  keep the posts not already read from another page ('found': data-ids read this run).
+	#  The pages are downloaded side by side (see downloadPages()) and parsed here as they arrive.
+	#  Like the front page, a topic page identical to one read on the last poll is not parsed.
+	def crawlTopicPages(self, links, found):
+		before = len(self.posts)
+		for url, page in self.downloadPages([FREEWEIBO_URL + x for x in links]):
+			if page is None or page.status_code != 200:
+				if self.verbose:
+					print('Unable to read ' + url)
+				continue
+
+			pageHash = None
+			if self.seenIndex is not None:
+				pageHash = hashlib.sha1(page.content).hexdigest()
+				unchanged = self.seenIndex.contains(PAGE_KEY, [pageHash])
+				self.seenIndex.record(PAGE_KEY, [pageHash])	#  Still on FreeWeibo: keep it in the index
+				if unchanged:
+					self.carryPosts(pageHash)
+					continue
+
+			censored, topics = self.readPage(page)
 			if self.verbose:
-				print("Scraped " + str(len(censored)) + " censored posts from FreeWeibo.")
-			#  Prepare date matching pattern:
-			#  <a href="/weibo/4209800710047255" target="/weibo/420">2018年02月21日 09:56</a>
-			regex = r'<a href="/weibo/(\d+)" target=".+">(\d+)\xe5\xb9\xb4(\d+)\xe6\x9c\x88(\d+)\xe6\x97\xa5 (\d+):(\d+)</a>'
-			for post in censored:
-				dataId = post['data-id']	#  FreeWeibo post unique identifier
+				print("Scraped " + str(len(censored)) + " censored posts from " + url)
+			self.readPosts(censored, found, pageHash)
+
+		if self.verbose:
+			print(str(len(self.posts) - before) + ' more posts from ' + str(len(links)) + ' hot-topic pages')
+		return
+
+	#  Download the given FreeWeibo pages using self.maxConnections threads, each of which waits
+	#  self.politeDelay seconds between its requests: they all go to the one host. This is a generator:
+	#  it yields a tuple (url, response) for each page as soon as it arrives. 'response' is None if the
+	#  page could not be retrieved.
+	def downloadPages(self, urls):
+		pending = Queue.Queue()				#  Pages not yet claimed by a download thread
+		finished = Queue.Queue()			#  (url, response) tuples ready to be parsed
+		for url in urls:
+			pending.put(url)
+
+		def worker():
+			first = True
+			while True:
+				try:
+					url = pending.get_nowait()
+				except Queue.Empty:
+					return
+				if not first:
+					time.sleep(self.politeDelay)
+				first = False
+				try:
+					page = httpclient.session().get(url, timeout=(self.connectTimeout, self.readTimeout))
+				except Exception as e:		#  Anything at all: a download thread must never die on us
+					if self.verbose:
+						print('Unable to download ' + url + ': ' + str(e))
+					page = None
+				finished.put( (url, page) )
+
+		for i in range(0, min(self.maxConnections, len(urls))):
+			t = threading.Thread(target=worker)
+			t.daemon = True					#  Never let a hung server keep the process alive
+			t.start()
+
+		for i in range(0, len(urls)):
+			yield finished.get()
+
+	#  Parse a downloaded page with whichever reader is available (see streamPage() and soupPage())
+	def readPage(self, page):
+		if self.targetedParse and etree is not None:
+			return self.streamPage(page.content, page.encoding)
+		return self.soupPage(page.text)
+
+	#  Turn the posts a page reader found into post records (see self.posts), skipping those read on the
+	#  last poll and those already read from another page this run ('found': data-ids, updated here).
+	#  'pageHash' is the fingerprint of the page listing them, if there is a seen index.
+	def readPosts(self, censored, found, pageHash=None):
+		dataIds = []						#  Every post the page lists right now
+		skipped = 0							#  Posts we read on an earlier poll
+		for dataId, content, weiboId, pubDate in censored:
+			dataIds.append(dataId)
+			if dataId in found:				#  Already read from another page this run
+				continue
+			found.add(dataId)
+			if self.seenIndex is not None and self.seenIndex.contains(POSTS_KEY, [dataId]):
+				skipped += 1				#  Stored already: skip the language detection and clean-up
+				continue
+			lang, langConfidence = self.determineLanguage(content)
+
+			#  Clean up AFTER we've attempted to identify the language.
+			#  The post's markup is kept: only line breaks and web-formatted characters go.
+			content = self.cleanText(content)
+
+			if self.verbose:
+				noticeStr  = "\tPublished "
+				noticeStr += str(pubDate.month) + '.' + str(pubDate.day) + '.' + str(pubDate.year) + ' '
+				noticeStr += lang + ', ' + str(langConfidence)
+				print(noticeStr)
+
+			self.posts.append( {} )			#  Append new post
+											#  Add post text (render for DB storage)
+			self.posts[-1]['content'] = self.storable(content)
+			self.posts[-1]['text'] = content
+			self.posts[-1]['native'] = self.nativeText
+			self.posts[-1]['hash'] = self.fingerprint(content)	#  Of the text as scraped, however it is stored
+											#  Add post data
+			self.posts[-1]['data-id'] = dataId
+			self.posts[-1]['weibo-id'] = weiboId
+			self.posts[-1]['pub-date'] = pubDate
+			self.posts[-1]['date-retrieved'] = datetime.now()
+
+			#  21FEB18: The markup is confusing the language-detector, so we're just going
+			#  to TELL Python, "This is Chinese. Trust me. I'm CONFIDENT!"
+
+			#self.posts[-1]['lang-detected'] = lang
+			#self.posts[-1]['confidence'] = langConfidence
+			self.posts[-1]['lang-detected'] = 'zh'
+			self.posts[-1]['confidence'] = 1.0
+
+		if self.seenIndex is not None:		#  Committed by save() once these posts are stored
+			self.seenIndex.record(POSTS_KEY, dataIds)
+			self.seenIndex.record(PAGE_POSTS_KEY, [(pageHash, x) for x in dataIds])
+			if self.verbose and skipped > 0:
+				print(str(skipped) + ' posts already seen')
+		return
+
+	#  A page identical to one read on the last poll is not parsed, but the posts it lists are still on
+	#  FreeWeibo: keep them in the index (by the fingerprint 'pageHash' of the page), or the next poll would
+	#  take them for new posts
+	def carryPosts(self, pageHash):
+		listed = [x for x in self.seenIndex.previous(PAGE_POSTS_KEY) if x[0] == pageHash]
+		self.seenIndex.record(PAGE_POSTS_KEY, listed)
+		self.seenIndex.record(POSTS_KEY, [x[1] for x in listed])
+		return
+
+	#  The original page reader: the whole page into an html.parser soup, with the fields cut out of the
+	#  re-serialized markup. Used when self.targetedParse is off or lxml is not installed.
+	#  Returns ([(data-id, content markup, Weibo ID, publication date)], [(topic text, topic link)]).
+	def soupPage(self, html):
+		posts = []
+		topics = []
+		#  Chuck it into the soup
+		soup = BeautifulSoup(html, 'html.parser')
+		#  Get all censored posts
+		censored = soup.findAll('div', attrs={'class':'censored-1'})
+		#  Prepare date matching pattern:
+		#  <a href="/weibo/4209800710047255" target="/weibo/420">2018年02月21日 09:56</a>
+		regex = r'<a href="/weibo/(\d+)" target=".+">(\d+)\xe5\xb9\xb4(\d+)\xe6\x9c\x88(\d+)\xe6\x97\xa5 (\d+):(\d+)</a>'
+		for post in censored:
+			dataId = post['data-id']		#  FreeWeibo post unique identifier
 											#  Only one content div per post:
 											#  Convert it to a string and cut away the enclosing tags.
 											#  This slice-notation is cheesey but straightforward.
-				content  = str(post.find('div', attrs={'class':'content'}))[21:-6]
-				lang, langConfidence = self.determineLanguage(content)
-
-				#  Remove line breaks AFTER we've attempted to identify the language
-				if self.removeLB:
-					if content is not None:
-						content = ' '.join(content.splitlines())
-
-				#  Find-and-replace web-formatted characters
-				if self.replaceSpecial:
-					for k, v in self.replaceDict.items():
-						if content is not None:
-							content = re.sub(k, v, content)
-
-					#  &#nnn;  means the number is DECIMAL     convert to \ummm where mmm is hex for nnn
-					#  &#xnnn; means the number is HEXADECIMAL convert to \unnn
-					if content is not None:
-						content = unicode(content, "utf-8")
-						content = re.sub(r'&#(\d+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group()[2:-1]), 6)[2:], content)
-						content = re.sub(r'&#x([0-9a-fA-F]+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group(1), 16), 6)[2:], content)
-
+			content  = str(post.find('div', attrs={'class':'content'}))[21:-6]
 											#  Lot of information in this line:
 											#  An original Weibo ID		(\1)
 											#  The year					(\2)
@@ -97,99 +283,91 @@ class FreeWeiboFetcher:
 											#  The day					(\4)
 											#  The hour					(\5)
 											#  The minute				(\6)
-				postDate = str(post.find('div', attrs={'class':'date'}).find('a'))
-				matches = re.findall(regex, postDate)
-				weiboId = matches[0][0]
-				weiboPubYear = int(matches[0][1])
-				weiboPubMonth = int(matches[0][2])
-				weiboPubDay = int(matches[0][3])
-				weiboPubHour = int(matches[0][4])
-				weiboPubMinute = int(matches[0][5])
-
-				if self.verbose:
-					noticeStr  = "\tPublished "
-					noticeStr += str(weiboPubMonth) + '.' + str(weiboPubDay) + '.' + str(weiboPubYear) + ' '
-					noticeStr += lang + ', ' + str(langConfidence)
-					print(noticeStr)
-
-				self.posts.append( {} )		#  Append new post
-				safe = repr(content)[2:-1]	#  Add post text (render for DB storage)
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				self.posts[-1]['content'] = safe
-				self.posts[-1]['hash'] = hash(doc['content']) % ((sys.maxsize + 1) * 2)
-											#  Add post data
-				self.posts[-1]['data-id'] = dataId
-				self.posts[-1]['weibo-id'] = weiboId
-				self.posts[-1]['pub-date'] = datetime(weiboPubYear, weiboPubMonth, weiboPubDay, \
-				                                      weiboPubHour, weiboPubMinute)
-				self.posts[-1]['date-retrieved'] = datetime.now()
-
-				#  21FEB18: The markup is confusing the language-detector, so we're just going
-				#  to TELL Python, "This is Chinese. Trust me. I'm CONFIDENT!"
-
-				#self.posts[-1]['lang-detected'] = lang
-				#self.posts[-1]['confidence'] = langConfidence
-				self.posts[-1]['lang-detected'] = 'zh'
-				self.posts[-1]['confidence'] = 1.0
-
-			#  Get all hot topics
-			sidebar = soup.find('div', attrs={'id':'right'})
-			ol = sidebar.find('ol')
-
-			if self.verbose:
-				print("FreeWeibo hot topics:")
-
-			#  Prepare topic matching pattern:
-			#  <li><a href="/weibo/%E8%96%84%E7%86%99%E6%9D%A5">薄熙来</a></li>
-			regex = r'<li><a href="/(weibo/[^\"]+)">(.+)</a></li>'
-			lis = ol.findAll('li')
-			for li in lis:
-
-				content = str(li)
-
-				#  Remove line breaks
-				if self.removeLB:
-					if content is not None:
-						content = ' '.join(content.splitlines())
-
-				#  Find-and-replace web-formatted characters
-				if self.replaceSpecial:
-					for k, v in self.replaceDict.items():
-						if content is not None:
-							content = re.sub(k, v, content)
-
-					#  &#nnn;  means the number is DECIMAL     convert to \ummm where mmm is hex for nnn
-					#  &#xnnn; means the number is HEXADECIMAL convert to \unnn
-					if content is not None:
-						content = unicode(content, "utf-8")
-						content = re.sub(r'&#(\d+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group()[2:-1]), 6)[2:], content)
-						content = re.sub(r'&#x([0-9a-fA-F]+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group(1), 16), 6)[2:], content)
-
-				matches = re.findall(regex, content)
-				topicLink = matches[0][0]
-				topicText = matches[0][1]
-
-				safe = repr(topicText)[2:-1]#  Render topic text for DB storage
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				self.topics.append( (safe, topicLink) )
-
-				if self.verbose:
-					print("\t" + topicText)
-
-		elif self.verbose:
-			print('Page connection error.')
-		return
+			postDate = str(post.find('div', attrs={'class':'date'}).find('a'))
+			matches = re.findall(regex, postDate)
+			posts.append( (dataId, content, matches[0][0], \
+			               datetime(int(matches[0][1]), int(matches[0][2]), int(matches[0][3]), \
+			                        int(matches[0][4]), int(matches[0][5]))) )
+
+		#  Get all hot topics
+		sidebar = soup.find('div', attrs={'id':'right'})
+		if sidebar is None:
+			return posts, topics
+		ol = sidebar.find('ol')
+
+		#  Prepare topic matching pattern:
+		#  <li><a href="/weibo/%E8%96%84%E7%86%99%E6%9D%A5">薄熙来</a></li>
+		regex = r'<li><a href="/(weibo/[^\"]+)">(.+)</a></li>'
+		lis = ol.findAll('li')
+		for li in lis:
+
+			#  Remove line breaks and web-formatted characters
+			content = self.cleanText(str(li))
+
+			matches = re.findall(regex, content)
+			topics.append( (matches[0][1], matches[0][0]) )
+		return posts, topics
+
+	#  Targeted page reader: lxml parses the page as a stream of closing <div>s, and only the censored posts
+	#  and the right-hand side-bar are looked at. Fields are read straight off the element tree; only a post's
+	#  content is serialized, since it is stored as markup. Each post is dropped from the tree once it is read,
+	#  so the tree never holds much more than the page's skeleton.
+	#  Returns the same as soupPage().
+	def streamPage(self, body, encoding=None):
+		posts = []
+		topics = []
+		for event, elem in etree.iterparse(BytesIO(body), events=('end', ), tag='div', html=True, \
+		                                   encoding=encoding or 'utf-8'):
+			if hasClass(elem, 'censored-1'):
+				post = self.streamPost(elem)
+				if post is not None:
+					posts.append(post)
+				elem.clear()				#  Done with this post, and with everything before it
+				while elem.getprevious() is not None:
+					del elem.getparent()[0]
+			elif elem.get('id') == 'right':	#  The side-bar: hot topics are the links of its list
+				ol = elem.find('.//ol')
+				if ol is None:
+					continue
+				for a in ol.iterfind('li/a'):
+					link = a.get('href', '')
+					if link.startswith('/weibo/'):
+						topics.append( (self.cleanText(u''.join(a.itertext())), link[1:]) )
+		return posts, topics
+
+	#  Read one censored post <div> of streamPage(). Returns (data-id, content markup, Weibo ID, publication
+	#  date), or None if the post lacks any of them.
+	#  The date link looks like <a href="/weibo/4209800710047255" target="/weibo/420">2018年02月21日 09:56</a>
+	def streamPost(self, elem):
+		dataId = elem.get('data-id')
+		content = None
+		dateLink = None
+		for div in elem.iter('div'):
+			if content is None and hasClass(div, 'content'):
+				content = innerHTML(div)
+			elif dateLink is None and hasClass(div, 'date'):
+				dateLink = div.find('.//a')
+		if dataId is None or content is None or dateLink is None:
+			return None
+
+		weiboId = re.match(r'/weibo/(\d+)', dateLink.get('href', ''))
+		when = re.search(u'(\\d+)年(\\d+)月(\\d+)日\\s*(\\d+):(\\d+)', u''.join(dateLink.itertext()))
+		if weiboId is None or when is None:
+			return None
+		return (dataId, content, weiboId.group(1), datetime(*[int(x) for x in when.groups()]))
 
 	#  Save the internal list of dictionary objects to the database, checking each time that
 	#  we do not already have this one. The CONTENT field and the PUB-DATE constitute a unique identifier.
 	#  Return the number of UNIQUE records added
 	def save(self):
+		if self.bulkSave:
+			return self.saveBulk()
+
+		added = 0
 		if self.link is not None:			#  Attempt to save to the DB
 
 			if self.debugFile:
-				fh = open('freeweibo-' + str(time.time()) + '.debug', 'w')
+				fh = codecs.open('freeweibo-' + str(time.time()) + '.debug', 'w', 'utf-8')
 
 			totalRecords = len(self.posts)
 			recordsWritten = 0				#  Track progress
@@ -200,6 +378,7 @@ class FreeWeiboFetcher:
 				sys.stdout.flush()
 
 			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			commits = database.CommitBatcher(self.link, self.commitEvery)
 			for post in self.posts:
 
 				foundUnique = False			#  Find out whether we have this post already
@@ -226,7 +405,10 @@ class FreeWeiboFetcher:
 					if post['content'] is not None:
 						query += 'content, '
 						#vals += u'"' + post['content'].encode('utf-8').decode('unicode-escape') + u'", '
-						vals += '"' + post['content'] + '", '
+						if post['native']:
+							vals += storedtext.nativeLiteral(self.link, post['content']) + ', '
+						else:
+							vals += '"' + post['content'] + '", '
 					#  DATA-ID is ASCII
 					if post['data-id'] is not None:
 						query += 'data_id, '
@@ -249,8 +431,11 @@ class FreeWeiboFetcher:
 						vals += '"' + post['lang-detected'] + '", '
 					#  CONFIDENCE is float
 					if post['confidence'] is not None:
-						query += 'confidence'
-						vals += str(post['confidence'])
+						query += 'confidence, '
+						vals += str(post['confidence']) + ', '
+					#  NATIVE-TEXT says how the content is rendered
+					query += 'native_text'
+					vals += 'TRUE' if post['native'] else 'FALSE'
 
 					query += ') VALUES(' + vals + ');'
 
@@ -258,9 +443,10 @@ class FreeWeiboFetcher:
 						fh.write(query + "\n")
 
 					cursor.execute(query)
-					self.link.commit()
+					commits.wrote()
 
 					recordsWritten += 1
+					added += 1
 
 					if self.verbose:
 						sys.stdout.write('Writing to database: ' + \
@@ -274,35 +460,69 @@ class FreeWeiboFetcher:
 					                     str(int(float(recordsWritten) / float(totalRecords) * 100)) + '%' + "\r")
 						sys.stdout.flush()
 
-			#  Insert new hot-topics samplings
-			#  Topics are united by a common sample time
-			currenttime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-			for i in range(0, len(self.topics)):
-				query  = 'INSERT INTO freeweibo_topics(date_sampled, topic, link, n)'
-				query += ' VALUES("' + currenttime + '", '
-				query +=         '"' + self.topics[i][0] + '", '
-				query +=         '"' + self.topics[i][1] + '", '
-				query +=               str(i + 1) + ');'
+			self.finishSave(cursor, totalRecords, commits, fh if self.debugFile else None)
+			cursor.close()					#  Close the cursor
+
+			if self.debugFile:				#  Close the debug file
+				fh.close()
+
+		else:
+			if self.verbose:
+				print("\n" + 'NO CONNECTION TO DATABASE! CANNOT SAVE SCRAPED CONTENT!')
+
+		if self.verbose:
+			print("\n" + 'Done.')
 
-				if self.debugFile:
-					fh.write(query + "\n")
+		return added
 
-				cursor.execute(query)
-				self.link.commit()
+	#  Set-based version of save(): the same rules for what counts as a duplicate, applied to all posts at once.
+	#    1. Look up every post's data-id and (hash, pub_date) fingerprint in one query.
+	#    2. Insert the new posts, then the hot topics, with multi-row INSERTs.
+	#  Everything is committed as a single transaction, so a run costs a handful of round-trips however many
+	#  posts it scraped. data_id is a unique key, so a post saved meanwhile by another run is skipped, not doubled.
+	#  Return the number of UNIQUE records added
+	def saveBulk(self):
+		added = 0
 
-			self.stopTimer()				#  Report time taken
+		if self.link is not None:			#  Attempt to save to the DB
 
-			if self.stopTime is not None and self.startTime is not None:
-				query  = 'INSERT INTO performance_metrics(process, parameter, date_started, sec)'
-				query += ' VALUES("collect-freeweibo", ' + str(totalRecords) + ', "'
-				query +=   datetime.fromtimestamp(int(self.startTime)).strftime('%Y-%m-%d %H:%M:%S') + '", '
-				query +=   str(self.stopTime - self.startTime) + ');'
-				cursor.execute(query)
-				self.link.commit()
+			if self.debugFile:
+				fh = codecs.open('freeweibo-' + str(time.time()) + '.debug', 'w', 'utf-8')
+			else:
+				fh = None
 
-			cursor.close()					#  Close the cursor
+			totalRecords = len(self.posts)
 
-			if self.debugFile:				#  Close the debug file
+			if self.verbose:
+				print("\n" + str(totalRecords) + " posts scraped (not all may be unique)\n")
+
+			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			knownIds, knownHashes = self.lookupPosts(cursor, self.posts)
+
+			rows = []
+			for post in self.posts:
+				if post['hash'] is None or post['pub-date'] is None:
+					continue				#  Cannot be checked for uniqueness (as in save())
+				key = (post['hash'], post['pub-date'])
+				if post['data-id'] in knownIds or key in knownHashes:
+					continue
+				knownIds.add(post['data-id'])	#  The page may list a post twice
+				knownHashes.add(key)
+				rows.append(self.postValues(post))
+
+			query  = 'INSERT IGNORE INTO freeweibo(hash, content, data_id, weibo_id, pub_date, ret_date,'
+			query += ' lang_detected, confidence, native_text) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)'
+			if fh is not None and len(rows) > 0:
+				fh.write(query + '  -- ' + str(len(rows)) + ' rows: ' + repr(rows) + "\n")
+			added = database.executeBatch(cursor, query, rows, None, 200)
+
+			if self.verbose:
+				print(str(added) + ' new posts written to database')
+
+			self.finishSave(cursor, totalRecords, None, fh)
+			cursor.close()
+
+			if fh is not None:
 				fh.close()
 
 		else:
@@ -312,6 +532,101 @@ class FreeWeiboFetcher:
 		if self.verbose:
 			print("\n" + 'Done.')
 
+		return added
+
+	#  Return (set of data-ids, set of (hash, pub_date)) of the given posts that are already in the 'freeweibo' table
+	def lookupPosts(self, cursor, posts):
+		knownIds = set()
+		knownHashes = set()
+		ids = [x['data-id'] for x in posts if x['data-id'] is not None]
+		hashes = [x['hash'] for x in posts if x['hash'] is not None]
+		if len(ids) + len(hashes) == 0:
+			return knownIds, knownHashes
+
+		clauses = []
+		if len(ids) > 0:
+			clauses.append('data_id IN (' + ', '.join(['%s'] * len(ids)) + ')')
+		if len(hashes) > 0:
+			clauses.append('hash IN (' + ', '.join([str(x) for x in hashes]) + ')')
+		cursor.execute('SELECT data_id, hash, pub_date FROM freeweibo WHERE ' + ' OR '.join(clauses) + ';', ids)
+		for row in cursor.fetchall():
+			knownIds.add(row['data_id'])
+			if row['hash'] is not None:
+				knownHashes.add( (int(row['hash']), row['pub_date']) )
+		return knownIds, knownHashes
+
+	#  The query parameters of a post's row, in the column order saveBulk() inserts
+	def postValues(self, post):
+		if post['native']:
+			content = post['text']
+		else:
+			content = storedtext.legacyValue(post['text'])
+		return (post['hash'], content, post['data-id'], post['weibo-id'], post['pub-date'], \
+		        post['date-retrieved'], post['lang-detected'], post['confidence'], post['native'])
+
+	#  Bookkeeping shared by save() and saveBulk() once the posts are written: record this sampling of hot
+	#  topics and this run's performance, and commit. 'commits' is save()'s CommitBatcher, if any.
+	def finishSave(self, cursor, totalRecords, commits=None, fh=None):
+		if self.topicSeries is not None:	#  Compact record: only changes to the ranking are written
+			sampled = datetime.now().replace(microsecond=0)
+			if len(self.topics) > 0:
+				self.topicSeries.record(cursor, sampled, self.topics)
+			elif self.pageUnchanged:		#  Same page, so the same ranking, still showing now
+				self.topicSeries.touch(cursor, sampled)
+			if commits is not None:
+				commits.flush()
+		else:
+			self.saveTopics(cursor, commits, fh)
+
+		self.stopTimer()					#  Report time taken
+
+		if self.stopTime is not None and self.startTime is not None:
+			query  = 'INSERT INTO performance_metrics(process, parameter, date_started, sec)'
+			query += ' VALUES("collect-freeweibo", ' + str(totalRecords) + ', "'
+			query +=   datetime.fromtimestamp(int(self.startTime)).strftime('%Y-%m-%d %H:%M:%S') + '", '
+			query +=   str(self.stopTime - self.startTime) + ');'
+			cursor.execute(query)
+		self.link.commit()
+
+		if self.seenIndex is not None:		#  Only now that the posts are stored is it safe to
+			self.seenIndex.commit()			#  tell the next poll that it has seen them
+			self.seenIndex.save()
+		return
+
+	#  Add this sampling of hot topics to the 'freeweibo_topics' table, one row per topic
+	def saveTopics(self, cursor, commits=None, fh=None):
+		#  Insert new hot-topics samplings
+		#  Topics are united by a common sample time
+		currenttime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+		rows = []
+		for i in range(0, len(self.topics)):
+			rows.append( (currenttime, storedtext.legacyValue(self.topics[i][0]), self.topics[i][1], i + 1) )
+		query = 'INSERT INTO freeweibo_topics(date_sampled, topic, link, n) VALUES (%s, %s, %s, %s)'
+
+		if fh is not None and len(rows) > 0:
+			fh.write(query + '  -- ' + str(len(rows)) + ' rows: ' + repr(rows) + "\n")
+
+		database.executeBatch(cursor, query, rows, commits)
+		if commits is not None:
+			commits.flush()
+		return
+
+	#  Record hot topics in the compact time series of topicseries.py instead of the 'freeweibo_topics' table.
+	#  Needs an open database link.
+	def openTopicSeries(self):
+		if self.link is not None:
+			self.topicSeries = TopicSeries(self.link)
+			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			self.topicSeries.load(cursor)
+			cursor.close()
+		return
+
+	#  Keep a persistent index of the posts FreeWeibo showed us, and a fingerprint of the page itself,
+	#  stored in the file 'path'. fetch() then skips a page it read on the previous poll and, on a page
+	#  that did change, the posts it read before.
+	def openSeenIndex(self, path):
+		self.seenIndex = SeenIndex(path)
+		self.seenIndex.load()
 		return
 
 	#  If they were not provided in the constructor, they may be provided here.
@@ -327,13 +642,13 @@ class FreeWeiboFetcher:
 		   self.dbUser is not None and \
 		   self.dbPword is not None and \
 		   self.dbTable is not None:
-			self.link = MySQLdb.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
+			self.link = database.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
 		elif self.verbose:
 			print('Unable to open a DB connection because credentials are missing.')
 
 	#  Close the connection to the database
 	def closeDB(self):
-		self.link.close()
+		database.release(self.link)			#  Back to the pool for the next user
 		return
 
 	def startTimer(self):
@@ -344,130 +659,39 @@ class FreeWeiboFetcher:
 		self.stopTime = time.mktime(time.gmtime())
 		return
 
-	#  Build a lookup table of special character signifiers we'll want to replace before storage/parsing/etc.
-	def initReplace(self):
-		d = {}
-		d['&apos;'] = '\''					#  HTML apostrophe
-		d['&#39;'] = '\''					#  Decimal apostrophe
-		d['&amp;'] = '&'					#  HTML ampersand
-		d['&#38;'] = '&'					#  Decimal ampersand
-		d['&quot;'] = '"'					#  HTML double-quote
-		d['&#34;'] = '"'					#  Decimal double-quote
-		d['&lt;'] = '<'						#  HTML less-than
-		d['&#60;'] = '<'					#  Decimal less-than
-		d['&gt;'] = '>'						#  HTML greater-than
-		d['&#62;'] = '>'					#  Decimal greater-than
-		d['&mdash;'] = '--'					#  HTML em-dash
-		d['&#8212;'] = '--'					#  Decimal em-dash
-		d['&ndash;'] = '--'					#  HTML en-dash
-		d['&#8211;'] = '--'					#  Decimal en-dash
-		d['&#8210;'] = '--'					#  Decimal figure-dash
-		d['&#xa0;'] = ''					#  "Non-breakable Space" symbol is irrelevant to our collections
-		d['&#x00a0;'] = ''					#  Four-digit equivalent
-		return d
-
-	#  Given a string of text, try determine its language.
-	#  (Hardly enough code to justify being its own function, but this used to
-	#   be larger. I tried using Google's language detection API, but it enforces
-	#   limits and asks for money. If we ever change our resources later, then this
-	#   routine would be best off as a sovereign function.)
-	def determineLanguage(self, text):
-
-		#return guessLanguage(text)
-		if not text:
-			return guess_language.UNKNOWN, 0.0
-
-		if isinstance(text, str):
-			text = unicode(text, 'utf-8')
-
-		text = guess_language.normalize(text)
-
-		return self.identifyWithConf(text, guess_language.find_runs(text))
+	#  Stable 64-bit message digest of a string (the first 8 bytes of its MD5), as FeedFetcher.fingerprint().
+	#  Unlike hash(), this gives the same number in every process and on every machine.
+	def fingerprint(self, text):
+		if isinstance(text, unicode):
+			text = text.encode('utf-8')
+		return int(hashlib.md5(text).hexdigest()[:16], 16)
 
-	#  A re-write of the _identify function in the guess_language package:
-	#  We want to preserve the confidence of the identification.
-	def identifyWithConf(self, sample, scripts):
-		if len(sample) < 3:
-			return guess_language.UNKNOWN, 0.0
+	#  Render scraped text for storage: legacy-escaped, or as-is if self.nativeText (see storedtext.py)
+	def storable(self, text):
+		if self.nativeText:
+			return text
+		return storedtext.legacyText(text)
 
-		if "Hangul Syllables" in scripts or "Hangul Jamo" in scripts \
-		   or "Hangul Compatibility Jamo" in scripts or "Hangul" in scripts:
-			return "ko", 1.0
+	#  Clean up a piece of scraped markup according to this fetcher's settings. Posts are stored as
+	#  HTML, so tags are kept; line breaks (if self.removeLB) and special characters (if self.replaceSpecial) go.
+	def cleanText(self, text):
+		return self.cleaner.clean(text, False, self.removeLB, self.replaceSpecial)
 
-		if "Greek and Coptic" in scripts:
-			return "el", 1.0
-
-		if "Katakana" in scripts:
-			return "ja", 1.0
-
-		if "CJK Unified Ideographs" in scripts or "Bopomofo" in scripts \
-		   or "Bopomofo Extended" in scripts or "KangXi Radicals" in scripts:
-
-			# This is in both Ceglowski and Rideout
-			# I can't imagine why...
-			#            or "Arabic Presentation Forms-A" in scripts
-			return "zh", 1.0
-
-		if "Cyrillic" in scripts:
-			return self.checkWithConf( sample, guess_language.CYRILLIC )
-
-		if "Arabic" in scripts or "Arabic Presentation Forms-A" in scripts or "Arabic Presentation Forms-B" in scripts:
-			return self.checkWithConf( sample, guess_language.ARABIC )
-
-		if "Devanagari" in scripts:
-			return self.checkWithConf( sample, guess_language.DEVANAGARI )
-
-
-		# Try languages with unique scripts
-		for blockName, langName in guess_language.SINGLETONS:
-			if blockName in scripts:
-				return langName
-
-		if "Latin Extended Additional" in scripts:
-			return "vi"
-
-		if "Extended Latin" in scripts:
-			latinLang = self.checkWithConf( sample, guess_language.EXTENDED_LATIN )
-			if latinLang == "pt":
-				return self.checkWithConf(sample, guess_language.PT)
-			else:
-				return latinLang
-
-		if "Basic Latin" in scripts:
-			return self.checkWithConf( sample, guess_language.ALL_LATIN )
-
-		return guess_language.UNKNOWN, 0.0
-
-	#  A re-write of the check function in the guess_language package:
-	#  We want to preserve the confidence of the identification.
-	def checkWithConf(self, sample, langs):
-		if len(sample) < guess_language.MIN_LENGTH:
-			return guess_language.UNKNOWN, 0.0
-
-		scores = []
-		model = guess_language.createOrderedModel(sample)  # QMap<int,QString>
-
-		greatest = float('-inf')
-		least = float('inf')
-		for key in langs:
-			lkey = key.lower()
-
-			if lkey in guess_language.models:
-				d = guess_language.distance(model, guess_language.models[lkey])
-				if d > greatest:
-					greatest = d
-				if d < least:
-					least = d
-				scores.append( [d, key] )
-
-		#  Normalize scores
-		for score in scores:
-			#score[0] = float(score[0] - least) / float(greatest - least)
-			score[0] = float(score[0]) / float(greatest)
-
-		if not scores:
-			return guess_language.UNKNOWN, 0.0
-
-		# we want the lowest score, less distance = greater chance of match
-		#    pprint(sorted(scores))
-		return min(scores)[1], 1.0 - min(scores)[0]
+	#  Given a string of text, try determine its language.
+	#  Returns a tuple (language code, confidence in [0.0, 1.0]).
+	#  The trigram scoring lives in langid.py, shared with the other collectors.
+	def determineLanguage(self, text):
+		return self.langid.identify(text)
+
+#  Whether lxml element 'elem' has 'name' among its classes (as BeautifulSoup's attrs={'class':...} matches)
+def hasClass(elem, name):
+	return name in (elem.get('class') or '').split()
+
+#  The markup inside lxml element 'elem', without the element's own tags, as a unicode string
+def innerHTML(elem):
+	parts = []
+	if elem.text:
+		parts.append(cgi.escape(elem.text))
+	for child in elem:
+		parts.append(etree.tostring(child, encoding=unicode, method='html', with_tail=True))
+	return u''.join(parts)
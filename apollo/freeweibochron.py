@@ -3,13 +3,19 @@ from freeweibo import FreeWeiboFetcher
 
 #  Scrape posts and show your work
 #  python freeweibochron.py y
+#  Scrape the hot-topic pages too, quietly
+#  python freeweibochron.py n n y
 
 #  argv[0] = freeweibochron.py
 #  argv[1] = verbosity {Y/N}
 #  argv[2] = debug output to file {Y/N}
+#  argv[3] = also read the hot-topic pages {Y/N}
+#  argv[4] = store text as native UTF-8 rather than legacy escapes, storedtext.py {Y/N}
 def main():
 	verbosity = False
 	debugOutput = False
+	crawlTopics = False
+	nativeText = False
 
 	if len(sys.argv) > 1:
 		if sys.argv[1].upper()[0] == 'Y':
@@ -19,10 +25,22 @@ def main():
 		if sys.argv[2].upper()[0] == 'Y':
 			debugOutput = True
 
+	if len(sys.argv) > 3:
+		if sys.argv[3].upper()[0] == 'Y':
+			crawlTopics = True
+
+	if len(sys.argv) > 4:
+		if sys.argv[4].upper()[0] == 'Y':
+			nativeText = True
+
 	fetcher = FreeWeiboFetcher('localhost', 'censor', 'blockme', 'corpora')
 	fetcher.verbose = verbosity
 	fetcher.debugFile = debugOutput
+	fetcher.crawlTopics = crawlTopics
+	fetcher.nativeText = nativeText
+	fetcher.openSeenIndex('freeweibo-seen.idx')	#  Skip an unchanged page, and posts read on the last poll
 	fetcher.openDB()
+	fetcher.openTopicSeries()				#  Record only changes to the hot-topic ranking (topicseries.py)
 	fetcher.fetch()
 	fetcher.save()
 	fetcher.closeDB()
@@ -0,0 +1,154 @@
+import socket								#  Host name look-ups
+import threading							#  The session and the DNS cache are shared between threads
+import time									#  DNS cache entries expire
+import requests								#  http://docs.python-requests.org/
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util import connection		#  create_connection(), and allowed_gai_family(): IPv4, IPv6 or both
+try:
+	import brotli							#  https://pypi.python.org/pypi/Brotli (optional)
+except ImportError:
+	brotli = None
+
+#  The one HTTP client the collectors share (RSS feeds, FreeWeibo pages, Alexa ranks).
+#
+#  requests.get() builds a throw-away session for every call, so every poll paid for its own TCP connection and
+#  TLS handshake, even when it went to the same news host as the poll before it. Here every download goes
+#  through one requests.Session, which keeps up to 'poolSize' idle connections per host alive between requests
+#  and hands them to whichever thread asks next.
+#
+#  Bodies are requested compressed: gzip and deflate always, and Brotli as well when the brotli package is
+#  installed (urllib3 decodes it transparently then). Host name look-ups made by the session's connections are
+#  cached for 'dnsTTL' seconds, so the hundreds of feeds that live on a few dozen hosts cost a few dozen look-ups
+#  per run rather than one each. Nothing else in the process (database links, say) goes through that cache.
+#
+#  import httpclient
+#  response = httpclient.session().get('https://freeweibo.com/', timeout=(10, 30))
+
+poolHosts = 64								#  Hosts whose connections are kept alive at once
+poolSize = 16								#  Idle connections kept alive per host; keep this >= FeedFetcher.maxPerHost
+dnsTTL = 300								#  Seconds a host name look-up is re-used
+dnsHosts = 1024								#  Most host names whose look-ups are cached at once
+userAgent = 'Mozilla/5.0 (compatible; apollo-collector)'
+
+shared = None								#  The shared requests.Session, built on first use
+sharedLock = threading.Lock()
+
+#  Return the shared session, building it on first use
+def session():
+	global shared
+	sharedLock.acquire()
+	try:
+		if shared is None:
+			shared = newSession()
+		return shared
+	finally:
+		sharedLock.release()
+
+#  A new session with our pool sizes and headers. Anything that needs settings of its own (a proxy, say) can
+#  build one here rather than reach for requests.get().
+def newSession():
+	s = requests.Session()
+	adapter = CachingAdapter(pool_connections=poolHosts, pool_maxsize=poolSize)
+	s.mount('http://', adapter)
+	s.mount('https://', adapter)
+	s.headers['User-Agent'] = userAgent
+	s.headers['Accept-Encoding'] = acceptEncoding()
+	return s
+
+#  The transfer encodings we can decode
+def acceptEncoding():
+	if brotli is not None:
+		return 'gzip, deflate, br'
+	return 'gzip, deflate'
+
+#################################### D N S   C a c h e ####################################
+
+resolved = {}								#  [(host, port)] ==> (expiry time, address to connect to)
+resolvedLock = threading.Lock()
+
+#  An HTTPAdapter whose connections look host names up through the cache below
+class CachingAdapter(HTTPAdapter):
+	def init_poolmanager(self, *args, **kwargs):
+		HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+		self.poolmanager.pool_classes_by_scheme = {'http': CachingHTTPPool, 'https': CachingHTTPSPool}
+
+class CachingHTTPConnection(HTTPConnection):
+	def _new_conn(self):
+		return connectCached(self)
+
+class CachingHTTPSConnection(HTTPSConnection):
+	def _new_conn(self):
+		return connectCached(self)
+
+class CachingHTTPPool(HTTPConnectionPool):
+	ConnectionCls = CachingHTTPConnection
+
+class CachingHTTPSPool(HTTPSConnectionPool):
+	ConnectionCls = CachingHTTPSConnection
+
+#  Open the socket of urllib3 connection 'conn' to the cached address of its host, as urllib3's own _new_conn()
+#  would to the name, and raise the same errors it would. Only the socket goes to the address: the Host header,
+#  SNI and certificate checks (all done after this, in connect()) still see the name. Only the connection's public
+#  settings are used, so this works the same on urllib3 1.26 and 2.x. A connection that fails drops its host from
+#  the cache, so the next attempt looks it up afresh.
+def connectCached(conn):
+	address = lookup(conn.host, conn.port)
+	try:
+		return connection.create_connection((address, conn.port), conn.timeout, source_address=conn.source_address, \
+		                                    socket_options=conn.socket_options)
+	except socket.timeout:
+		forget(conn.host, conn.port)
+		raise ConnectTimeoutError(conn, 'Connection to %s timed out. (connect timeout=%s)' % (conn.host, conn.timeout))
+	except socket.error as e:
+		forget(conn.host, conn.port)
+		raise NewConnectionError(conn, 'Failed to establish a new connection: %s' % e)
+
+#  The address to connect to for (host, port): the first one getaddrinfo() gives, as urllib3 would try first.
+#  Failed look-ups are not cached. Once 'dnsHosts' are cached, the entry closest to expiry makes way.
+def lookup(host, port):
+	key = (host, port)
+	now = time.time()
+	resolvedLock.acquire()
+	try:
+		hit = resolved.get(key)
+	finally:
+		resolvedLock.release()
+	if hit is not None and hit[0] > now:
+		return hit[1]
+
+	try:
+		addresses = socket.getaddrinfo(host.strip('[]'), port, connection.allowed_gai_family(), socket.SOCK_STREAM)
+	except socket.error:
+		return host							#  Let urllib3 look it up again and report the error its own way
+	if len(addresses) == 0:
+		return host
+	address = addresses[0][4][0]
+	resolvedLock.acquire()
+	try:
+		if key not in resolved and len(resolved) >= dnsHosts:
+			del resolved[min(resolved, key=lambda x: resolved[x][0])]
+		resolved[key] = (now + dnsTTL, address)
+	finally:
+		resolvedLock.release()
+	return address
+
+#  Drop the cached look-up of (host, port)
+def forget(host, port):
+	resolvedLock.acquire()
+	try:
+		resolved.pop((host, port), None)
+	finally:
+		resolvedLock.release()
+	return
+
+#  Forget every cached look-up (after a network change, say)
+def flushDNS():
+	resolvedLock.acquire()
+	try:
+		resolved.clear()
+	finally:
+		resolvedLock.release()
+	return
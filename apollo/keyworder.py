@@ -4,6 +4,7 @@ import sys							#  Used for re-writable screen output
 import re							#  For find-and-replace work
 import math
 import MySQLdb						#  Used for DB operations
+import database						#  Pooled connections and batched statements
 from datetime import datetime		#  Used for time stamping our retrievals
 									#  Used for English only to get (e.g.) "catch" from "caught",
 from nltk.stem.wordnet import WordNetLemmatizer							#  "bring" from "brought"
@@ -93,7 +94,7 @@ class Keyworder:
 		   self.dbUser is not None and \
 		   self.dbPword is not None and \
 		   self.dbTable is not None:
-			self.link = MySQLdb.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
+			self.link = database.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
 		elif self.verbose:
 			print('Unable to open a DB connection because credentials are missing.')
 
@@ -101,7 +102,7 @@ class Keyworder:
 
 	#  Close the connection to the database
 	def closeDB(self):
-		self.link.close()
+		database.release(self.link)			#  Back to the pool for the next user
 		return
 
 	def startTimer(self):
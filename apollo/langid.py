@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import re
+import sys
+import unicodedata
+import numpy as np							#  Score every candidate language at once
+from guess_language import *				#  Trigram models, script detection and text normalization
+
+#  Language identification shared by all the collectors (FeedFetcher, FreeWeiboFetcher, WeiboFetcher).
+#
+#  This gives the same answers as the identifyWithConf()/checkWithConf() routines the collectors used to carry,
+#  which were re-writes of the guess_language package's own _identify() and check(). Those compared a sample
+#  against each candidate language's trigram model in turn, in a Python loop, so every scraped item cost
+#  (number of candidate languages) dictionary walks. Here all the models are loaded once into one NumPy array,
+#  [language, trigram] ==> rank, and a sample is scored against every candidate in a single array operation.
+#  identifyBatch() scores a whole list of texts with one array operation.
+#
+#  langid = LanguageIdentifier()
+#  langid.identify(u'The quick brown fox jumped over the lazy dog and ran away')	==>  ('en', 0.61...)
+#  langid.identifyBatch([text1, text2, ...])									==>  [(lang, confidence), ...]
+class LanguageIdentifier:
+	sharedModels = None						#  (languages, rows, columns, ranks), built by the first instance (see loadModels())
+	sharedNonAlpha = None					#  The non-letter pattern, built by the first instance (see buildNonAlpha())
+
+	def __init__(self):
+		self.maxGrams = guess_language.MAXGRAMS	#  Only the sample's most frequent trigrams count; also the penalty for a missing one
+		self.languages = []					#  Row of the rank array ==> language code, e.g. 'en'
+		self.rows = {}						#  [language code] ==> row of the rank array
+		self.columns = {}					#  [trigram] ==> column of the rank array
+		self.ranks = None					#  [row, column] ==> rank of that trigram in that language's model (-1 if absent)
+		self.spaces = re.compile(r'\s\s', re.UNICODE)	#  Trigrams with a double space are skipped, as guess_language does
+		self.nonAlpha = None				#  Matches any character that is not a letter (see normalize())
+		self.runsOfSpace = re.compile(r'\s+', re.UNICODE)
+		self.loadModels()
+		self.buildNonAlpha()
+		return
+
+	#  Copy guess_language's models (a dictionary per language) into one NumPy array. This is done once per
+	#  process: every instance (one per collector) shares the array, which is only ever read.
+	def loadModels(self):
+		if LanguageIdentifier.sharedModels is not None:
+			self.languages, self.rows, self.columns, self.ranks = LanguageIdentifier.sharedModels
+			return
+
+		self.languages = sorted(guess_language.models.keys())
+		self.rows = dict([(lang, i) for i, lang in enumerate(self.languages)])
+
+		self.columns = {}
+		for lang in self.languages:
+			for trigram in guess_language.models[lang]:
+				if trigram not in self.columns:
+					self.columns[trigram] = len(self.columns)
+
+		self.ranks = np.empty((len(self.languages), len(self.columns)), dtype=np.int32)
+		self.ranks.fill(-1)
+		for lang in self.languages:
+			row = self.rows[lang]
+			model = guess_language.models[lang]
+			cols = np.fromiter([self.columns[x] for x in model.keys()], dtype=np.int32, count=len(model))
+			self.ranks[row, cols] = np.fromiter(model.values(), dtype=np.int32, count=len(model))
+		LanguageIdentifier.sharedModels = (self.languages, self.rows, self.columns, self.ranks)
+		return
+
+	#  guess_language.normalize() finds non-letters with a character class listing every letter in Unicode,
+	#  which costs more than all the scoring put together. Characters that are not letters are the same as
+	#  non-word characters, plus the underscore, plus the digits and numerals that count as alphanumeric;
+	#  the last are few enough to list. Finding them means testing every code point, so it is done once per process.
+	def buildNonAlpha(self):
+		if LanguageIdentifier.sharedNonAlpha is None:
+			numerals = []
+			for i in xrange(0, sys.maxunicode + 1):
+				c = unichr(i)
+				if c.isalnum() and not c.isalpha():
+					numerals.append(re.escape(c))
+			LanguageIdentifier.sharedNonAlpha = re.compile(u'[\\W_' + u''.join(numerals) + u']', re.UNICODE)
+		self.nonAlpha = LanguageIdentifier.sharedNonAlpha
+		return
+
+	#  Same result as guess_language.normalize(): NFC form, non-letters blanked out, runs of spaces squeezed
+	def normalize(self, text):
+		text = unicodedata.normalize('NFC', text)
+		text = self.nonAlpha.sub(' ', text)
+		return self.runsOfSpace.sub(' ', text)
+
+	#  Given a string of text, try determine its language.
+	#  Returns a tuple (language code, confidence in [0.0, 1.0]).
+	def identify(self, text):
+		return self.identifyBatch([text])[0]
+
+	#  Identify a list of texts. Returns a list of (language code, confidence) tuples in the same order.
+	#  Texts whose script settles the question (Chinese, Korean, ...) never reach the trigram models;
+	#  all the others are scored together.
+	def identifyBatch(self, texts):
+		results = [None] * len(texts)
+		pending = []						#  (index into texts, normalized sample, candidate languages)
+
+		for i, text in enumerate(texts):
+			if not text:
+				results[i] = (guess_language.UNKNOWN, 0.0)
+				continue
+			if isinstance(text, str):
+				text = unicode(text, 'utf-8')
+			sample = self.normalize(text)
+			answer = self.identifyByScript(sample, guess_language.find_runs(sample))
+			if isinstance(answer, tuple):
+				results[i] = answer
+			else:							#  A list of languages the models must choose between
+				pending.append( (i, sample, answer) )
+
+		if len(pending) > 0:
+			distances = self.distances([x[1] for x in pending])
+			for j, (i, sample, langs) in enumerate(pending):
+				#  guess_language would go on to split 'pt' into pt_BR/pt_PT. The old collectors never did
+				#  (they compared a tuple to "pt"), and the corpora are keyed on 'pt', so neither do we.
+				results[i] = self.checkWithConf(sample, langs, distances[:, j])
+
+		return results
+
+	#  A re-write of the _identify function in the guess_language package.
+	#  Returns a (language code, confidence) tuple when the scripts alone decide the language;
+	#  otherwise the list of languages whose trigram models should decide.
+	def identifyByScript(self, sample, scripts):
+		if len(sample) < 3:
+			return guess_language.UNKNOWN, 0.0
+
+		if "Hangul Syllables" in scripts or "Hangul Jamo" in scripts \
+		   or "Hangul Compatibility Jamo" in scripts or "Hangul" in scripts:
+			return "ko", 1.0
+
+		if "Greek and Coptic" in scripts:
+			return "el", 1.0
+
+		if "Katakana" in scripts:
+			return "ja", 1.0
+
+		if "CJK Unified Ideographs" in scripts or "Bopomofo" in scripts \
+		   or "Bopomofo Extended" in scripts or "KangXi Radicals" in scripts:
+
+			# This is in both Ceglowski and Rideout
+			# I can't imagine why...
+			#            or "Arabic Presentation Forms-A" in scripts
+			return "zh", 1.0
+
+		if "Cyrillic" in scripts:
+			return guess_language.CYRILLIC
+
+		if "Arabic" in scripts or "Arabic Presentation Forms-A" in scripts or "Arabic Presentation Forms-B" in scripts:
+			return guess_language.ARABIC
+
+		if "Devanagari" in scripts:
+			return guess_language.DEVANAGARI
+
+		# Try languages with unique scripts
+		for blockName, langName in guess_language.SINGLETONS:
+			if blockName in scripts:
+				return langName, 1.0
+
+		if "Latin Extended Additional" in scripts:
+			return "vi", 1.0
+
+		if "Extended Latin" in scripts:
+			return guess_language.EXTENDED_LATIN
+
+		if "Basic Latin" in scripts:
+			return guess_language.ALL_LATIN
+
+		return guess_language.UNKNOWN, 0.0
+
+	#  Distance from each sample to every language model: an array [language row, sample] of
+	#  the same sums guess_language.distance() computes, one per pair.
+	def distances(self, samples):
+		positions = []						#  Rank of each counted trigram in its own sample
+		columns = []						#  ... its column in self.ranks (-1 if no model has it)
+		offsets = []						#  Where each sample's trigrams start in the lists above
+		for sample in samples:
+			offsets.append(len(positions))
+			if len(sample) < guess_language.MIN_LENGTH:
+				continue					#  checkWithConf() will not look at this sample's scores
+			model = guess_language.createOrderedModel(sample)
+			for i, trigram in enumerate(model[:self.maxGrams]):
+				if not self.spaces.search(trigram):
+					positions.append(i)
+					columns.append(self.columns.get(trigram, -1))
+
+		result = np.zeros((len(self.languages), len(samples)), dtype=np.int64)
+		if len(positions) == 0:
+			return result
+
+		positions = np.array(positions, dtype=np.int32)
+		columns = np.array(columns, dtype=np.int32)
+
+		#  Every language pays maxGrams for a trigram it does not have, and |i - rank| for one it does
+		ranks = self.ranks[:, np.maximum(columns, 0)]
+		missing = (ranks < 0) | (columns < 0)
+		penalties = np.where(missing, self.maxGrams, np.abs(positions - ranks))
+
+		#  Sum each sample's stretch of columns. Samples that contributed nothing keep a zero.
+		offsets = np.array(offsets, dtype=np.int64)
+		counted = np.diff(np.append(offsets, len(positions))) > 0
+		result[:, counted] = np.add.reduceat(penalties, offsets[counted], axis=1)
+		return result
+
+	#  A re-write of the check function in the guess_language package:
+	#  We want to preserve the confidence of the identification.
+	#  'distances' holds this sample's distance to every language model (one column of distances()).
+	def checkWithConf(self, sample, langs, distances):
+		if len(sample) < guess_language.MIN_LENGTH:
+			return guess_language.UNKNOWN, 0.0
+
+		keys = [x for x in langs if x.lower() in self.rows]
+		if not keys:
+			return guess_language.UNKNOWN, 0.0
+
+		scores = distances[[self.rows[x.lower()] for x in keys]].astype(np.float64)
+		greatest = scores.max()
+		if greatest > 0:					#  Normalize scores
+			scores /= greatest
+
+		#  We want the lowest score, less distance = greater chance of match.
+		#  Ties go to the alphabetically first language code, as min() over [score, key] pairs would.
+		best = min(zip(scores.tolist(), keys))
+		return best[1], 1.0 - best[0]
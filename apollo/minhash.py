@@ -0,0 +1,80 @@
+import re
+import hashlib								#  Shingles are hashed the same way on every machine
+import numpy as np							#  Every shingle through every hash function at once
+
+#  MinHash signatures, for recognizing near-duplicate articles.
+#
+#  A wire story republished with a new byline or an extra sentence gets a different hash_content, but most of its
+#  three-word shingles are unchanged: the two texts have a high Jaccard similarity (shared shingles over all
+#  shingles). A MinHash signature estimates that similarity cheaply. Each of PERMUTATIONS hash functions is applied
+#  to every shingle and the minimum kept; two texts agree in any one position with probability equal to their
+#  Jaccard similarity, so the share of positions in which two signatures agree estimates it.
+#
+#  To find candidates without comparing against every article, the signature is cut into BANDS bands of ROWS
+#  positions, and each band is hashed to a single number. Texts agree in a whole band with probability J ** ROWS,
+#  so with 16 bands of 4, pairs above about 0.6 similarity almost always share at least one band, and unrelated
+#  texts almost never do. The 'minhash_band' table indexes the bands of recent articles, so candidates are found
+#  with index lookups (see FeedFetcher.nearDuplicates()); each is then confirmed by comparing whole signatures.
+#
+#  Unlike SimHash, whose 64 bits are swayed by every added shingle, this copes with the short texts many feeds
+#  carry: a summary and the same summary plus a byline still come out near 0.85.
+#
+#  sig = signature(u'The quick brown fox jumped over the lazy dog')
+#  bands(sig)				==>  [(0, 1234567890123L), (1, ...), ...]
+#  similarity(sig, sig2)	==>  estimated Jaccard similarity, 0.0 to 1.0
+
+SHINGLE = 3									#  Tokens per shingle
+PERMUTATIONS = 64							#  Hash functions, i.e. positions in a signature
+BANDS = 16									#  Bands per signature ...
+ROWS = 4									#  ... of this many positions each
+PRIME = 4294967291							#  Largest prime below 2 ** 32: hash values fit 32 bits
+
+tokenPattern = re.compile(r'\w+', re.UNICODE)
+
+#  The hash functions h(x) = (a * x + b) mod PRIME, with coefficients fixed for all time: stored signatures must
+#  stay comparable with new ones
+def coefficients(name):
+	return np.array([int(hashlib.md5(name + str(i)).hexdigest()[:8], 16) % (PRIME - 1) + 1 \
+	                 for i in range(0, PERMUTATIONS)], dtype=np.uint64)
+multipliers = coefficients('a')
+increments = coefficients('b')
+
+#  Split text into tokens: words, except in scripts written without spaces (CJK), where each character is a token
+def tokenize(text):
+	tokens = []
+	for word in tokenPattern.findall(text.lower()):
+		if word[0] >= u'\u2e80':		#  CJK radicals and beyond
+			tokens.extend(list(word))
+		else:
+			tokens.append(word)
+	return tokens
+
+#  The MinHash signature of a (unicode) text as a NumPy array of PERMUTATIONS 32-bit values,
+#  or None if the text has no words at all
+def signature(text):
+	if isinstance(text, str):
+		text = unicode(text, 'utf-8')
+	tokens = tokenize(text)
+	if len(tokens) == 0:
+		return None
+	grams = set([u' '.join(tokens[i:i + SHINGLE]) for i in range(0, max(len(tokens) - SHINGLE + 1, 1))])
+
+	hashes = np.array([int(hashlib.md5(x.encode('utf-8')).hexdigest()[:8], 16) for x in grams], dtype=np.uint64)
+	#  [permutation, shingle]; a * x < 2 ** 64, so nothing overflows
+	values = (multipliers[:, np.newaxis] * hashes[np.newaxis, :] + increments[:, np.newaxis]) % PRIME
+	return values.min(axis=1).astype(np.uint32)
+
+#  The signature's bands, as (band number, 64-bit hash of the band) pairs
+def bands(sig):
+	return [(i, int(hashlib.md5(pack(sig[i * ROWS:(i + 1) * ROWS])).hexdigest()[:16], 16)) for i in range(0, BANDS)]
+
+#  Estimated Jaccard similarity of the texts behind two signatures
+def similarity(a, b):
+	return float(np.count_nonzero(a == b)) / PERMUTATIONS
+
+#  A signature as bytes for storage, and back
+def pack(sig):
+	return sig.astype('<u4').tostring()
+
+def unpack(data):
+	return np.fromstring(data, dtype='<u4').astype(np.uint32)
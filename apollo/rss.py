@@ -1,13 +1,25 @@
 # -*- coding: utf-8 -*-
 import re									#  For string clean-up
+import codecs								#  Debug files hold native (UTF-8) text
 import sys									#  Used for on-screen notices (print with no carriage return)
-import bs4
-from bs4 import BeautifulSoup				#  Handles HTML encoding and parsing
+import threading							#  Download feeds side by side (concurrent mode)
+import multiprocessing						#  Parse feeds on every core (see parseProcesses)
+import Queue								#  Hand feeds to, and collect bodies from, download threads
+import urlparse								#  Identify each feed's host for per-host limits
+import httpclient							#  Download feeds ourselves (kept-alive, compressed) so parsing can happen separately
+import hashlib								#  Recognize a feed body we have already seen
 import feedparser							#  https://pythonhosted.org/feedparser/
-from guess_language import *				#  Pretty lame trigram detector... but it's free
 import MySQLdb								#  Used for DB operations
+import database								#  Pooled connections and batched statements
 from datetime import datetime				#  Used for time stamping our retrievals
 import time									#  Track how long things take
+from seenindex import SeenIndex				#  Remembers which entries each feed showed us last time
+from feedarchive import FeedArchive			#  Keeps raw feed bodies for offline replay
+from bodystore import BodyStore				#  Compressed, de-duplicated storage for article text
+import minhash								#  Signatures for spotting near-duplicate articles
+import storedtext							#  How text columns are written and read back
+from cleaner import TextCleaner				#  Strips markup and web-formatted characters in one pass
+from langid import LanguageIdentifier			#  Trigram language detection, all candidate languages scored at once
 
 #  The job of this class is to periodically grab a bunch of RSS feeds from a list of sources,
 #  parse them and save them to the database. Another routine will perform analysis, which takes
@@ -16,6 +28,19 @@ class FeedFetcher:
 	#  fetcher = FeedFetcher('localhost', 'censor', 'blockme', 'corpora')
 	def __init__(self, dbHost=None, dbUser=None, dbPword=None, dbTable=None):
 		self.feeds = []						#  List of RSS URLs
+		self.feedState = {}					#  [feed] ==> { 'etag', 'last-modified', 'body-hash' } as stored in the 'rss' table
+		self.pendingState = {}				#  Same, for state learned during this run but not yet written back
+		self.failures = {}					#  [feed] ==> consecutive failed polls, as stored in the 'rss' table
+		self.pendingHealth = {}				#  [feed] ==> (failures, retry_after) learned this run, not yet written back
+		self.seenIndex = None				#  Optional SeenIndex of entries already read from each feed (see openSeenIndex())
+		self.archive = None					#  Optional FeedArchive keeping every body we parse (see openArchive())
+		self.replaySource = None			#  If set, (feed, body, headers) tuples to parse instead of downloading
+		self.langStats = {}					#  [feed] ==> { [language code] ==> weight }: what each feed has been written in
+		self.langStatsChanged = set()		#  Feeds whose language statistics have not yet been written back
+		self.highWater = {}					#  [feed] ==> (fingerprint, published) of the newest entry read, as stored in 'rss'
+		self.pendingHighWater = {}			#  Same, for marks moved during this run but not yet written back
+		self.hubs = {}						#  [feed] ==> (hub, topic) the feed advertises for WebSub, as stored in 'rss'
+		self.pendingHubs = {}				#  Same, for hubs discovered during this run but not yet written back
 
 		self.link = None					#  MySQL link
 		self.dbHost = dbHost				#  String indicating database host
@@ -25,9 +50,42 @@ class FeedFetcher:
 
 		self.removeLB = True				#  Whether we remove line breaks
 		self.replaceSpecial = True			#  Whether to use the replacement dictionary to swap out special chars
-		self.replaceDict = self.initReplace()
+		self.nativeText = False				#  Whether to store text as UTF-8 rather than escaped (see storedtext.py)
+		self.storeBodies = False			#  Whether article text goes to the compressed body store (see openBodyStore())
+		self.commitEvery = 100				#  Articles written per commit by the one-row-at-a-time save()
+		self.collapseNear = True			#  Whether near-duplicates join the article they copy (see nearDuplicates())
+		self.nearSimilarity = 0.7			#  Estimated share of shingles in common that makes a near-duplicate
+		self.nearDays = 14					#  How far back to look for the original of a near-duplicate
+		self.useHighWater = True			#  Whether reading an ordered feed stops at the last entry read (see belowHighWater())
+		self.skipPushed = True				#  Whether getFeeds() leaves feeds pushed to us by websub.py off the polling list
+		self.bodyStore = None				#  BodyStore holding article text, if storeBodies
+		self.cleaner = TextCleaner()		#  Holds the replacement table of special characters
+		self.langid = LanguageIdentifier()	#  Loads the trigram models once
 		self.verbose = False				#  Whether to print progress to screen (sometimes spits up funky chars)
 		self.debugFile = False				#  Whether to output queries to a debug file
+		self.bulkSave = True				#  Whether save() writes the whole haul in a few set-based statements
+		self.maxStatementBytes = 1048576	#  Keep multi-row statements well under the server's max_allowed_packet
+		self.streamQueueSize = 8			#  Feeds' worth of docs allowed to wait for the database (see stream())
+		self.streamBatchSize = 500			#  Docs written per database batch (see stream())
+
+		self.concurrent = False				#  Whether to download feeds side by side instead of one at a time
+		self.maxConnections = 16			#  Most downloads allowed in flight at once (concurrent mode)
+		self.maxPerHost = 2					#  Most downloads allowed in flight to any single host (concurrent mode)
+		self.connectTimeout = 10			#  Seconds to wait for a feed server to accept the connection
+		self.readTimeout = 30				#  Seconds to wait for each read from a feed server
+		self.deadline = 60					#  Seconds allowed for one feed's whole download, however slowly it trickles in
+		self.backoff = 900					#  Seconds to leave a feed alone after its first failure; doubled for each further one
+		self.maxBackoff = 86400 * 7			#  Longest a failing feed is left alone
+		self.parseProcesses = 0				#  Worker processes parsing feeds (0: parse in this process; see parseInPool())
+		self.parseQueueSize = 32			#  Downloaded feeds allowed to wait for a parser
+		self.parseTimeout = 300				#  Seconds a feed may spend in the parse pool before it is given up on
+
+		self.usePrior = True				#  Whether a feed's usual language only needs confirming (see detectFeedLanguage())
+		self.priorMinWeight = 20.0			#  Evidence a feed needs before its usual language is trusted
+		self.priorShare = 0.9				#  Share of that evidence its usual language must hold
+		self.priorMaxWeight = 200.0			#  Halve a feed's evidence past this, so old verdicts fade
+		self.priorPrefix = 200				#  Characters of text used to confirm the usual language
+		self.claimWeight = 0.5				#  Weight of an entry's claimed language, next to a detection's confidence
 
 		self.startTime = None				#  Time this routine
 		self.stopTime = None
@@ -36,24 +94,411 @@ class FeedFetcher:
 
 	#  Iterate over feeds and build a giant list
 	def fetch(self):
-		feedCtr = 1
 		records = []
-		for feed in self.feeds:
-			if self.verbose:
-				print(str(feedCtr) + '.  ' + feed)
-			records += self.fetchFeedArticles(feed)
-			feedCtr += 1
+		for feed, docs in self.fetchFeeds():
+			records += docs
 
 		return records
 
+	#  Iterate over feeds, yielding a tuple (feed, docs) for each feed that had something new to parse.
+	#  'docs' is the list fetchFeedArticles() built for that feed.
+	def fetchFeeds(self):
+		if self.parseProcesses > 0:
+			for feed, docs in self.parseInPool():
+				yield feed, docs
+		else:
+			for feed, body, headers in self.downloadAll():
+				if body is not None:
+					yield feed, self.fetchFeedArticles(feed, body, headers)
+
+	#  The download stage: yield a tuple (feed, body, headers) for every feed, where 'body' is None if
+	#  there is nothing new to parse (see downloadFeed()).
+	def downloadAll(self):
+		feedCtr = 1
+		if self.replaySource is not None:	#  Past downloads (e.g. FeedArchive.replay()): no network at all
+			for feed, body, headers in self.replaySource:
+				if self.verbose:
+					print(str(feedCtr) + '.  ' + feed)
+				yield feed, body, headers
+				feedCtr += 1
+		elif self.concurrent:					#  Feeds arrive in the order their downloads finish,
+											#  so the run takes as long as the slowest feeds, not all of them.
+			for feed, body, headers in self.downloadFeeds(self.feeds):
+				if self.verbose:
+					print(str(feedCtr) + '.  ' + feed)
+				yield feed, body, headers
+				feedCtr += 1
+		else:
+			for feed in self.feeds:
+				if self.verbose:
+					print(str(feedCtr) + '.  ' + feed)
+				body, headers = self.downloadFeed(feed)
+				yield feed, body, headers
+				feedCtr += 1
+
+	#  The parse stage on self.parseProcesses worker processes. Markup clean-up and language detection
+	#  are CPU-bound and the GIL lets only one thread do them at a time, so with a pool of processes
+	#  parsing scales with cores while this process keeps downloading. A download thread hands bodies to
+	#  the pool, blocking once self.parseQueueSize of them are waiting, so memory stays bounded when the
+	#  network outruns the parsers. Yields (feed, docs) in the order parsing finishes.
+	#
+	#  A job that never comes back (its result cannot be pickled, an error escapes parseFeed(), its worker
+	#  process is killed) must not hold its slot forever: each job is watched through its AsyncResult, and
+	#  one that failed, or is still out after self.parseTimeout seconds, is counted as a feed we could not parse.
+	#
+	#  Each worker has its own FeedFetcher (see initParser()). What fetchFeedArticles() needs to know
+	#  about a feed (the entries we have seen, its language statistics, its high-water mark, its hub) travels
+	#  with the job, and what it learns comes back with the docs to be merged here.
+	def parseInPool(self):
+		settings = {}
+		for k in PARSER_SETTINGS:
+			settings[k] = getattr(self, k)
+		pool = multiprocessing.Pool(self.parseProcesses, initParser, (settings,))
+
+		results = Queue.Queue()				#  (job number, parsed feed), and finally the number of jobs submitted
+		slots = threading.BoundedSemaphore(self.parseQueueSize)
+		failure = []						#  Anything that goes wrong while downloading, to re-raise here
+		outstanding = {}					#  [job number] ==> (feed, AsyncResult, deadline) of the jobs not yet back
+		outstandingLock = threading.Lock()
+
+		def submit():
+			submitted = 0
+			try:
+				for feed, body, headers in self.downloadAll():
+					if body is not None:
+						seen = None
+						if self.seenIndex is not None:
+							seen = self.seenIndex.seen.get(feed)
+						slots.acquire()		#  Wait for room in the parse queue
+						job = (feed, body, headers, seen, self.langStats.get(feed), self.highWater.get(feed), \
+						       self.hubs.get(feed))
+						outstandingLock.acquire()	#  The callback may fire before apply_async() returns
+						try:
+							callback = lambda parsed, n=submitted: results.put( (n, parsed) )
+							outstanding[submitted] = (feed, pool.apply_async(parseFeed, (job,), callback=callback), \
+							                          time.time() + self.parseTimeout)
+						finally:
+							outstandingLock.release()
+						submitted += 1
+			except Exception:
+				failure.append(sys.exc_info())
+			finally:
+				results.put(submitted)
+			return
+
+		t = threading.Thread(target=submit)
+		t.daemon = True
+		t.start()
+
+		#  Take job 'n' off the books, once: None if it was already given up on
+		def settle(n):
+			outstandingLock.acquire()
+			try:
+				return outstanding.pop(n, None)
+			finally:
+				outstandingLock.release()
+
+		received = 0
+		submitted = None
+		try:
+			while submitted is None or received < submitted:
+				try:
+					item = results.get(True, 1)
+				except Queue.Empty:
+					item = None
+
+				outstandingLock.acquire()
+				try:
+					lost = [(n, x[0], x[1]) for n, x in outstanding.items() \
+					        if (x[1].ready() and not x[1].successful()) or time.time() > x[2]]
+				finally:
+					outstandingLock.release()
+				for n, feed, result in lost:
+					if settle(n) is not None:
+						slots.release()
+						received += 1
+						if self.verbose:
+							reason = 'no result within ' + str(self.parseTimeout) + ' seconds'
+							if result.ready():
+								try:
+									result.get(0)
+								except Exception as e:
+									reason = repr(e)
+							print("\t" + 'Could not parse ' + feed + ': ' + reason)
+
+				if item is None:
+					continue
+				if not isinstance(item, tuple):
+					submitted = item		#  All downloads are done
+					continue
+				if settle(item[0]) is None:
+					continue				#  Given up on already: too late
+				slots.release()
+				received += 1
+
+				feed, docs, entryIds, stats, mark, hub, error = item[1]
+				if error is not None:
+					if self.verbose:
+						print("\t" + 'Could not parse ' + feed + ': ' + error)
+					continue
+				if self.seenIndex is not None:
+					self.seenIndex.record(feed, entryIds)
+				if stats is not None:
+					self.langStats[feed] = stats
+					self.langStatsChanged.add(feed)
+				if mark is not None:
+					self.pendingHighWater[feed] = mark
+				if hub is not None:
+					self.pendingHubs[feed] = hub
+				yield feed, docs
+		finally:
+			pool.terminate()				#  Nothing is left running, even if the caller stops early
+			pool.join()
+
+		if len(failure) > 0:
+			raise failure[0][0], failure[0][1], failure[0][2]
+
+	#  Fetch and save at the same time. Instead of building one giant list of docs, a fetching thread
+	#  hands each feed's docs to a queue holding at most self.streamQueueSize feeds, and this thread saves
+	#  them in batches of about self.streamBatchSize docs as they come. Memory use is capped no matter
+	#  how many feeds we poll, and articles reach the database while later feeds are still downloading.
+	#  Use in place of save(fetch()). Returns the number of UNIQUE records added.
+	def stream(self):
+		added = 0
+
+		if self.link is not None:
+			handoff = Queue.Queue(self.streamQueueSize)
+			failure = []					#  Anything that goes wrong while fetching, to re-raise here
+
+			def producer():
+				try:
+					for feed, docs in self.fetchFeeds():
+						handoff.put( (feed, docs) )
+				except Exception:
+					failure.append(sys.exc_info())
+				finally:
+					handoff.put(None)		#  No more feeds
+
+			t = threading.Thread(target=producer)
+			t.daemon = True
+			t.start()
+
+			if self.debugFile:
+				fh = codecs.open('rss-' + str(time.time()) + '.debug', 'w', 'utf-8')
+			else:
+				fh = None
+
+			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			totalRecords = 0
+			batch = []						#  Docs waiting to be written
+			batchFeeds = []					#  ... and the feeds they came from
+			finished = False
+			while not finished:
+				item = handoff.get()
+				if item is None:
+					finished = True
+				else:
+					batch += item[1]
+					batchFeeds.append(item[0])
+
+				if len(batch) >= self.streamBatchSize or (finished and len(batchFeeds) > 0):
+					totalRecords += len(batch)
+					added += self.writeBatch(cursor, batch, fh)
+					self.saveFeedState(cursor, batchFeeds)
+					if self.seenIndex is not None:
+						self.seenIndex.commit(batchFeeds)
+					if self.verbose:
+						print("\n" + str(added) + ' new articles of ' + str(totalRecords) + ' scraped so far')
+					batch = []
+					batchFeeds = []
+
+			self.finishSave(cursor, totalRecords)
+			cursor.close()
+
+			if fh is not None:
+				fh.close()
+
+			if len(failure) > 0:			#  Whatever was fetched before the failure is saved; now report it
+				raise failure[0][0], failure[0][1], failure[0][2]
+
+		elif self.verbose:
+			print("\n" + 'NO CONNECTION TO DATABASE! CANNOT SAVE SCRAPED CONTENT!')
+
+		return added
+
+	#  Download all the given feeds using a pool of self.maxConnections threads, never holding more than
+	#  self.maxPerHost connections to the same host. This is a generator: it yields a tuple
+	#  (feed, body, headers) for each feed as soon as that feed's download completes.
+	#  'body' is None if the download failed, whatever went wrong.
+	def downloadFeeds(self, feeds):
+		pending = Queue.Queue()				#  Feeds not yet claimed by a download thread
+		finished = Queue.Queue()			#  (feed, body, headers) tuples ready to be parsed
+		hostLocks = {}						#  [host] ==> semaphore allowing self.maxPerHost downloads
+
+		for feed in self.interleaveHosts(feeds):
+			host = self.feedHost(feed)
+			if host not in hostLocks:
+				hostLocks[host] = threading.BoundedSemaphore(self.maxPerHost)
+			pending.put(feed)
+
+		def worker():
+			while True:
+				try:
+					feed = pending.get_nowait()
+				except Queue.Empty:
+					return
+				lock = hostLocks[self.feedHost(feed)]
+				if not lock.acquire(False):	#  This host is busy: put the feed back and try another one
+					pending.put(feed)		#  rather than hold a global slot while we wait.
+					time.sleep(0.05)
+					continue
+				try:
+					body, headers = self.downloadFeed(feed)
+				except Exception as e:		#  Every feed must come out of 'finished', or the caller waits forever
+					self.feedFailed(feed, str(e))
+					body, headers = None, None
+				finally:
+					lock.release()
+				finished.put( (feed, body, headers) )
+
+		for i in range(0, min(self.maxConnections, len(feeds))):
+			t = threading.Thread(target=worker)
+			t.daemon = True					#  Never let a hung server keep the process alive
+			t.start()
+
+		for i in range(0, len(feeds)):
+			yield finished.get()
+
+	#  Download a single feed. Return a tuple (body, headers), where 'body' is the raw bytes of the
+	#  feed and 'headers' is a dictionary of lower-cased response headers.
+	#  Returns (None, None) if the feed could not be retrieved.
+	#
+	#  The request is conditional: we send back the ETag and Last-Modified values the server gave us
+	#  last time. If the server answers 304 Not Modified, or sends a body identical to the last one we
+	#  parsed, then there is nothing new to read and this returns (None, headers).
+	#  Fresh validators are held in self.pendingState until save() writes them back.
+	#
+	#  No server can hold us up for long: connecting and each read are limited by self.connectTimeout and
+	#  self.readTimeout, and the whole download by self.deadline. Every failure (no answer, an HTTP error,
+	#  a download past its deadline) counts against the feed; see feedFailed().
+	def downloadFeed(self, feed):
+		state = self.feedState.get(feed, {})
+		requestHeaders = {}
+		if state.get('etag') is not None:
+			requestHeaders['If-None-Match'] = state['etag']
+		if state.get('last-modified') is not None:
+			requestHeaders['If-Modified-Since'] = state['last-modified']
+
+		deadline = time.time() + self.deadline
+		try:
+			response = httpclient.session().get(feed, headers=requestHeaders, stream=True, \
+			                                    timeout=(self.connectTimeout, self.readTimeout))
+		except Exception as e:				#  Anything at all: a download thread must never die on us
+			self.feedFailed(feed, str(e))
+			return None, None
+
+		headers = {}
+		for k, v in response.headers.items():
+			headers[k.lower()] = v
+
+		if response.status_code == 304:
+			response.close()
+			self.feedSucceeded(feed)
+			if self.verbose:
+				print('Unchanged since last poll: ' + feed)
+			return None, headers
+
+		if response.status_code != 200:
+			response.close()
+			self.feedFailed(feed, 'HTTP ' + str(response.status_code))
+			return None, None
+
+		chunks = []							#  Read the body ourselves, a little at a time, so that we can give up
+		try:								#  soon after the deadline even when a server sends only a trickle
+			for chunk in response.iter_content(4096):
+				chunks.append(chunk)
+				if time.time() > deadline:
+					raise IOError('no complete answer within ' + str(self.deadline) + ' seconds')
+		except Exception as e:
+			response.close()
+			self.feedFailed(feed, str(e))
+			return None, None
+		body = ''.join(chunks)
+		self.feedSucceeded(feed)
+
+		#  Keep the fresh validators even if the body is unchanged: some servers rotate them with every answer
+		bodyHash = hashlib.sha1(body).hexdigest()
+		self.pendingState[feed] = {'etag': headers.get('etag'), \
+		                           'last-modified': headers.get('last-modified'), \
+		                           'body-hash': bodyHash}
+		if bodyHash == state.get('body-hash'):
+			if self.verbose:				#  Some servers ignore conditional requests entirely
+				print('Unchanged since last poll: ' + feed)
+			return None, headers
+
+		if self.archive is not None:
+			try:
+				self.archive.store(feed, body, headers, bodyHash)
+			except (IOError, OSError) as e:	#  A full or unwritable disk must not cost us the feed itself
+				if self.verbose:
+					print('Unable to archive ' + feed + ': ' + str(e))
+		return body, headers
+
+	#  Circuit breaker: count one more consecutive failure against 'feed' and stop polling it for a while.
+	#  The pause starts at self.backoff seconds and doubles with each further failure, up to self.maxBackoff;
+	#  getFeeds() skips the feed until then. Held in self.pendingHealth until save() writes it back.
+	def feedFailed(self, feed, reason):
+		failures = self.failures.get(feed, 0) + 1
+		pause = min(self.backoff * (2 ** min(failures - 1, 30)), self.maxBackoff)
+		retryAfter = datetime.fromtimestamp(int(time.time() + pause))
+		self.pendingHealth[feed] = (failures, retryAfter)
+		if self.verbose:
+			print('Unable to download ' + feed + ': ' + reason)
+			print("\t" + str(failures) + ' failure(s) in a row; next attempt after ' + str(retryAfter))
+		return
+
+	#  The feed answered: close its circuit
+	def feedSucceeded(self, feed):
+		if self.failures.get(feed, 0) > 0:
+			self.pendingHealth[feed] = (0, None)
+		return
+
+	#  Re-order a list of feeds so that feeds from the same host are spread out rather than bunched
+	#  together. This keeps download threads from queueing up behind one busy host.
+	def interleaveHosts(self, feeds):
+		byHost = {}
+		hosts = []							#  Hosts in order of first appearance
+		for feed in feeds:
+			host = self.feedHost(feed)
+			if host not in byHost:
+				byHost[host] = []
+				hosts.append(host)
+			byHost[host].append(feed)
+
+		ordered = []
+		i = 0
+		while len(ordered) < len(feeds):
+			for host in hosts:
+				if i < len(byHost[host]):
+					ordered.append(byHost[host][i])
+			i += 1
+		return ordered
+
+	#  Return the host (network location) of a feed URL, e.g. 'www.chinadaily.com.cn'
+	def feedHost(self, feed):
+		return urlparse.urlparse(feed).netloc.lower()
+
 	#  Save the given list of dictionary objects to the database, checking each time that
 	#  we do not already have one. URLs are considered unique identifiers.
 	#  Return the number of UNIQUE records added
 	def save(self, docs):
+		if self.bulkSave:
+			return self.saveBulk(docs)
+
 		if self.link is not None:			#  Attempt to save to the DB
 
 			if self.debugFile:
-				fh = open('rss-' + str(time.time()) + '.debug', 'w')
+				fh = codecs.open('rss-' + str(time.time()) + '.debug', 'w', 'utf-8')
 
 			totalRecords = len(docs)
 			recordsWritten = 0				#  Track progress
@@ -64,6 +509,7 @@ class FeedFetcher:
 				sys.stdout.flush()
 
 			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			commits = database.CommitBatcher(self.link, self.commitEvery)
 			for doc in docs:
 
 				foundUnique = False			#  Find out whether we have this article already by looking up
@@ -94,6 +540,16 @@ class FeedFetcher:
 								query += ' VALUES(' + str(aID) + ', "' + doc['rss'] + '");'
 								cursor.execute(query)
 
+				if foundUnique and self.collapseNear:
+					near = {}				#  A near-duplicate is recorded against the article it copies
+					if len(self.nearDuplicates(cursor, [doc], near)[0]) == 0:
+						foundUnique = False
+						aID = near[(doc['hash_url'], doc['hash_content'])][0]
+						if (aID, doc['rss']) not in self.lookupSources(cursor, [aID]):
+							query  = 'INSERT INTO article_source(article_id, source)'
+							query += ' VALUES(' + str(aID) + ', "' + doc['rss'] + '");'
+							cursor.execute(query)
+
 				if foundUnique:				#  Add record to the database (accounting for its being potentially partial)
 					query = 'INSERT INTO articles('
 					vals = ''
@@ -114,27 +570,27 @@ class FeedFetcher:
 					if doc['title'] is not None:
 						query += 'title, '
 						#vals += u'"' + doc['title'].encode('utf-8').decode('unicode-escape') + u'", '
-						vals += '"' + doc['title'] + '", '
+						vals += self.sqlText(doc, 'title') + ', '
 					#  CONTENT is UNICODE
 					if doc['text'] is not None:
 						query += 'content, '
 						#vals += u'"' + doc['text'].encode('utf-8').decode('unicode-escape') + u'", '
-						vals += '"' + doc['text'] + '", '
+						vals += self.sqlText(doc, 'text') + ', '
 					#  SUMMARY is UNICODE
 					if doc['summary'] is not None:
 						query += 'summary, '
 						#vals += u'"' + doc['summary'].encode('utf-8').decode('unicode-escape') + u'", '
-						vals += '"' + doc['summary'] + '", '
+						vals += self.sqlText(doc, 'summary') + ', '
 					#  KEYWORD is UNICODE
 					if doc['keyword'] is not None:
 						query += 'keyword, '
 						#vals += u'"' + doc['keyword'].encode('utf-8').decode('unicode-escape') + u'", '
-						vals += '"' + doc['keyword'] + '", '
+						vals += self.sqlText(doc, 'keyword') + ', '
 					#  LANG-CLAIMED is UNICODE
 					if doc['lang-claimed'] is not None:
 						query += 'lang_claimed, '
 						#vals += u'"' + doc['lang-claimed'].encode('utf-8').decode('unicode-escape') + u'", '
-						vals += '"' + doc['lang-claimed'] + '", '
+						vals += self.sqlText(doc, 'lang-claimed') + ', '
 					#  LANG-DETECTED is ASCII
 					if doc['lang-detected'] is not None:
 						query += 'lang_detected, '
@@ -147,8 +603,16 @@ class FeedFetcher:
 						query += 'pub_date, '
 						vals += '"' + doc['pub-date'] + '", '
 					if doc['date-retrieved'] is not None:
-						query += 'ret_date'
-						vals += '"' + doc['date-retrieved'].strftime('%Y-%m-%d %H:%M:%S') + '"'
+						query += 'ret_date, '
+						vals += '"' + doc['date-retrieved'].strftime('%Y-%m-%d %H:%M:%S') + '", '
+					#  BODY_REF points at the text in the body store, in place of CONTENT
+					if doc['body'] is not None:
+						query += 'body_ref, '
+						vals += str(doc['hash_content']) + ', '
+						self.bodyStore.store(cursor, [(doc['hash_content'], doc['body'])])
+					#  NATIVE-TEXT says how the text columns are rendered
+					query += 'native_text'
+					vals += 'TRUE' if doc['native'] else 'FALSE'
 
 					query += ') VALUES(' + vals + ');'
 
@@ -162,7 +626,10 @@ class FeedFetcher:
 					query += ' VALUES(' + str(newRow) + ', "' + doc['rss'] + '");'
 					cursor.execute(query)
 
-					self.link.commit()
+					if self.collapseNear:
+						self.indexMinHashes(cursor, [doc], {(doc['hash_url'], doc['hash_content']): [newRow]})
+
+					commits.wrote()
 
 					recordsWritten += 1
 
@@ -178,19 +645,54 @@ class FeedFetcher:
 					                     str(int(float(recordsWritten) / float(totalRecords) * 100)) + '%' + "\r")
 						sys.stdout.flush()
 
-			self.stopTimer()				#  Report time taken
+			commits.flush()
+			self.finishSave(cursor, totalRecords)
+			cursor.close()					#  Close the cursor
 
-			if self.stopTime is not None and self.startTime is not None:
-				query  = 'INSERT INTO performance_metrics(process, parameter, date_started, sec)'
-				query += ' VALUES("collect-rss", ' + str(totalRecords) + ', "'
-				query +=   datetime.fromtimestamp(int(self.startTime)).strftime('%Y-%m-%d %H:%M:%S') + '", '
-				query +=   str(self.stopTime - self.startTime) + ');'
-				cursor.execute(query)
-				self.link.commit()
+			if self.debugFile:
+				fh.close()
 
-			cursor.close()					#  Close the cursor
+		else:
+			if self.verbose:
+				print("\n" + 'NO CONNECTION TO DATABASE! CANNOT SAVE SCRAPED CONTENT!')
+
+		if self.verbose:
+			print("\n" + 'Done.')
+
+		return
+
+	#  Set-based version of save(): the same rules for what counts as a duplicate and which
+	#  article-source pairs get recorded, but applied to the whole list of docs at once.
+	#    1. Look up every (hash_url, hash_content) fingerprint pair in one pass.
+	#    2. Insert all new articles with multi-row INSERTs and read back their KPs.
+	#    3. Look up which article-source pairs already exist and insert the missing ones.
+	#  Everything is committed as a single transaction.
+	#  Return the number of UNIQUE records added
+	def saveBulk(self, docs):
+		added = 0
+
+		if self.link is not None:			#  Attempt to save to the DB
 
 			if self.debugFile:
+				fh = codecs.open('rss-' + str(time.time()) + '.debug', 'w', 'utf-8')
+			else:
+				fh = None
+
+			totalRecords = len(docs)
+
+			if self.verbose:
+				print("\n" + str(totalRecords) + " articles scraped (not all may be unique)\n")
+
+			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			added = self.writeBatch(cursor, docs, fh)
+
+			if self.verbose:
+				print(str(added) + ' new articles written to database')
+
+			self.finishSave(cursor, totalRecords)
+			cursor.close()					#  Close the cursor
+
+			if fh is not None:
 				fh.close()
 
 		else:
@@ -200,6 +702,303 @@ class FeedFetcher:
 		if self.verbose:
 			print("\n" + 'Done.')
 
+		return added
+
+	#  The database work of saveBulk(), done in one transaction: write one batch of docs and return the
+	#  number of new articles. Queries are also written to 'fh' if it is an open debug file.
+	def writeBatch(self, cursor, docs, fh=None):
+		#  Only docs carrying both digests can be checked for uniqueness (as in save())
+		docs = [x for x in docs if x['hash_url'] is not None and x['hash_content'] is not None]
+
+		#  1. Which of these do we already have?
+		kps = self.lookupArticles(cursor, docs)
+
+		#  2. Insert the rest. Several feeds may carry the same article in this very batch,
+		#     so insert each fingerprint pair only once.
+		newDocs = []
+		for doc in docs:
+			key = (doc['hash_url'], doc['hash_content'])
+			if key not in kps:
+				kps[key] = []
+				newDocs.append(doc)
+
+		#     Near-duplicates of an article we have (or of one earlier in this batch) are not inserted:
+		#     like exact duplicates, they are only recorded in article_source against the original.
+		aliases = {}
+		if self.collapseNear:
+			newDocs, aliases = self.nearDuplicates(cursor, newDocs, kps)
+
+		bodies = [(x['hash_content'], x['body']) for x in newDocs if x['body'] is not None]
+		if len(bodies) > 0:				#  Texts bound for the body store go in alongside their articles
+			self.bodyStore.store(cursor, bodies)
+
+		columns  = 'url, hash_url, hash_content, title, content, summary, keyword,'
+		columns += ' lang_claimed, lang_detected, confidence, pub_date, ret_date, body_ref, native_text'
+		rows = [self.articleValues(x) for x in newDocs]
+		for query in self.multiRowInserts('INSERT INTO articles(' + columns + ') VALUES', rows):
+			if fh is not None:
+				fh.write(query + "\n")
+			cursor.execute(query)
+		added = len(newDocs)
+
+		if added > 0:					#  Multi-row INSERTs only report the first new KP, so read them all back
+			kps.update(self.lookupArticles(cursor, newDocs))
+			for key, original in aliases.items():
+				kps[key] = kps[original]
+			if self.collapseNear:
+				self.indexMinHashes(cursor, newDocs, kps)
+
+		#  3. Record where each article was found, skipping pairs we already know about
+		articleIds = set()
+		for doc in docs:
+			articleIds.update(kps[(doc['hash_url'], doc['hash_content'])])
+		known = self.lookupSources(cursor, articleIds)
+
+		rows = []
+		for doc in docs:
+			for aID in kps[(doc['hash_url'], doc['hash_content'])]:
+				if (aID, doc['rss']) not in known:
+					known.add( (aID, doc['rss']) )
+					rows.append( (aID, doc['rss']) )
+		query = 'INSERT INTO article_source(article_id, source) VALUES (%s, %s)'
+		if fh is not None and len(rows) > 0:
+			fh.write(query + '  -- ' + str(len(rows)) + ' rows: ' + repr(rows) + "\n")
+		database.executeBatch(cursor, query, rows)
+
+		self.link.commit()				#  One transaction for the whole haul
+
+		return added
+
+	#  Bookkeeping shared by save() and saveBulk() once the articles themselves are stored:
+	#  log this run's performance and write back what we learned about each feed.
+	def finishSave(self, cursor, totalRecords):
+		self.stopTimer()					#  Report time taken
+
+		if self.stopTime is not None and self.startTime is not None:
+			query  = 'INSERT INTO performance_metrics(process, parameter, date_started, sec)'
+			query += ' VALUES("collect-rss", ' + str(totalRecords) + ', "'
+			query +=   datetime.fromtimestamp(int(self.startTime)).strftime('%Y-%m-%d %H:%M:%S') + '", '
+			query +=   str(self.stopTime - self.startTime) + ');'
+			cursor.execute(query)
+			self.link.commit()
+
+		self.saveFeedState(cursor)			#  Only now that the articles are stored is it safe to
+											#  tell the next poll that it has seen these feed bodies
+		if self.seenIndex is not None:		#  ... and these entries
+			self.seenIndex.commit()
+			self.seenIndex.save()
+		return
+
+	#  Return a dictionary [(hash_url, hash_content)] ==> [kp, kp, ...] for those of the given docs
+	#  which are already in the 'articles' table. Lookups go by hash_url in chunks of 1000.
+	def lookupArticles(self, cursor, docs):
+		wanted = set([(x['hash_url'], x['hash_content']) for x in docs])
+		urls = sorted(set([x[0] for x in wanted]))
+		found = {}
+		for i in range(0, len(urls), 1000):
+			query  = 'SELECT kp, hash_url, hash_content FROM articles'
+			query += ' WHERE hash_url IN (' + ', '.join([str(x) for x in urls[i:i + 1000]]) + ');'
+			cursor.execute(query)
+			for row in cursor.fetchall():
+				key = (int(row['hash_url']), int(row['hash_content']))
+				if key in wanted:
+					if key not in found:
+						found[key] = []
+					found[key].append(int(row['kp']))
+		return found
+
+	#  Sort out which of the given new docs are near-duplicates (see minhash.py): of an article stored in the last
+	#  self.nearDays days, or of a doc earlier in the list. A doc whose estimated similarity to one of these is at
+	#  least self.nearSimilarity gets kps[its key] = [that article's KP]; for one matching an earlier doc, the
+	#  returned aliases map its key to that doc's key (its KP is not known until it is inserted).
+	#  Returns (the docs that really are new, aliases).
+	def nearDuplicates(self, cursor, docs, kps):
+		wanted = {}							#  [(band, value)] ==> indices into docs with that band
+		for i, doc in enumerate(docs):
+			if doc['minhash'] is not None:
+				for band in minhash.bands(doc['minhash']):
+					if band not in wanted:
+						wanted[band] = []
+					wanted[band].append(i)
+
+		#  Stored articles sharing a band with any of the docs: one look-up for the whole list
+		candidates = {}						#  [index into docs] ==> {KP: packed signature}
+		cutoff = datetime.fromtimestamp(int(time.time()) - self.nearDays * 86400).strftime('%Y-%m-%d %H:%M:%S')
+		allBands = sorted(wanted.keys())
+		for j in range(0, len(allBands), 500):
+			query  = 'SELECT b.band, b.value, m.article_id, m.signature'
+			query += ' FROM minhash_band b JOIN article_minhash m ON m.article_id = b.article_id'
+			query += ' WHERE (b.band, b.value) IN (' + ', '.join(['(' + str(x) + ', ' + str(y) + ')' for x, y in allBands[j:j + 500]]) + ')'
+			query += ' AND m.added >= "' + cutoff + '";'
+			cursor.execute(query)
+			for row in cursor.fetchall():
+				for i in wanted[(int(row['band']), int(row['value']))]:
+					if i not in candidates:
+						candidates[i] = {}
+					candidates[i][int(row['article_id'])] = row['signature']
+
+		remaining = []
+		aliases = {}
+		local = {}							#  [(band, value)] ==> keys of docs in this list that will be inserted
+		for i, doc in enumerate(docs):
+			key = (doc['hash_url'], doc['hash_content'])
+			if doc['minhash'] is None:
+				remaining.append(doc)
+				continue
+
+			best = None
+			bestSimilarity = self.nearSimilarity
+			for aID, packed in candidates.get(i, {}).items():
+				similarity = minhash.similarity(doc['minhash'], minhash.unpack(packed))
+				if similarity >= bestSimilarity:
+					best = aID
+					bestSimilarity = similarity
+			if best is not None:
+				kps[key] = [best]
+				continue
+
+			bands = minhash.bands(doc['minhash'])
+			for other in set([x for band in bands for x in local.get(band, [])]):
+				similarity = minhash.similarity(doc['minhash'], docs[other]['minhash'])
+				if similarity >= bestSimilarity:
+					best = other
+					bestSimilarity = similarity
+			if best is not None:
+				aliases[key] = (docs[best]['hash_url'], docs[best]['hash_content'])
+				continue
+
+			remaining.append(doc)
+			for band in bands:
+				if band not in local:
+					local[band] = []
+				local[band].append(i)
+
+		if self.verbose and len(remaining) < len(docs):
+			print(str(len(docs) - len(remaining)) + ' near-duplicate(s) attached to the articles they copy')
+		return remaining, aliases
+
+	#  Add the signatures of newly inserted docs to the near-duplicate index. 'kps' maps each doc's key to its KPs.
+	def indexMinHashes(self, cursor, docs, kps):
+		now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+		signatures = []
+		bands = []
+		for doc in docs:
+			if doc['minhash'] is None:
+				continue
+			for aID in kps.get((doc['hash_url'], doc['hash_content']), []):
+				signatures.append( (aID, minhash.pack(doc['minhash']), now) )
+				for band, value in minhash.bands(doc['minhash']):
+					bands.append( (band, value, aID) )
+		database.executeBatch(cursor, 'INSERT IGNORE INTO article_minhash(article_id, signature, added) VALUES (%s, %s, %s)', signatures)
+		database.executeBatch(cursor, 'INSERT IGNORE INTO minhash_band(band, value, article_id) VALUES (%s, %s, %s)', bands)
+		return
+
+	#  Drop articles older than self.nearDays from the near-duplicate index; nothing looks that far back
+	def pruneMinHashes(self):
+		if self.link is not None:
+			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			cutoff = datetime.fromtimestamp(int(time.time()) - self.nearDays * 86400).strftime('%Y-%m-%d %H:%M:%S')
+			query  = 'DELETE b FROM minhash_band b JOIN article_minhash m ON m.article_id = b.article_id'
+			query += ' WHERE m.added < "' + cutoff + '";'
+			cursor.execute(query)
+			cursor.execute('DELETE FROM article_minhash WHERE added < "' + cutoff + '";')
+			self.link.commit()
+			cursor.close()
+		return
+
+	#  Return the set of (article_id, source) pairs already recorded for the given article KPs
+	def lookupSources(self, cursor, articleIds):
+		articleIds = sorted(articleIds)
+		found = set()
+		for i in range(0, len(articleIds), 1000):
+			query  = 'SELECT article_id, source FROM article_source'
+			query += ' WHERE article_id IN (' + ', '.join([str(x) for x in articleIds[i:i + 1000]]) + ');'
+			cursor.execute(query)
+			for row in cursor.fetchall():
+				found.add( (int(row['article_id']), row['source']) )
+		return found
+
+	#  Render one doc as a parenthesized VALUES tuple for a multi-row INSERT INTO articles.
+	#  Values are rendered exactly as save() renders them; missing values become DEFAULT,
+	#  which is what save() gets by leaving the column out.
+	def articleValues(self, doc):
+		vals = []
+		vals.append('"' + doc['url'] + '"' if doc['url'] is not None else 'DEFAULT')
+		vals.append(str(doc['hash_url']) if doc['hash_url'] is not None else 'DEFAULT')
+		vals.append(str(doc['hash_content']) if doc['hash_content'] is not None else 'DEFAULT')
+		for k in ['title', 'text', 'summary', 'keyword', 'lang-claimed']:
+			vals.append(self.sqlText(doc, k) if doc[k] is not None else 'DEFAULT')
+		vals.append('"' + doc['lang-detected'] + '"' if doc['lang-detected'] is not None else 'DEFAULT')
+		vals.append(str(doc['lang-confidence']) if doc['lang-confidence'] is not None else 'DEFAULT')
+		vals.append('"' + doc['pub-date'] + '"' if doc['pub-date'] is not None else 'DEFAULT')
+		if doc['date-retrieved'] is not None:
+			vals.append('"' + doc['date-retrieved'].strftime('%Y-%m-%d %H:%M:%S') + '"')
+		else:
+			vals.append('DEFAULT')
+		vals.append(str(doc['hash_content']) if doc['body'] is not None else 'DEFAULT')
+		vals.append('TRUE' if doc['native'] else 'FALSE')
+		return '(' + ', '.join(vals) + ')'
+
+	#  Pack rendered VALUES tuples into as few INSERT statements as self.maxStatementBytes allows.
+	#  Returns a list of complete query strings.
+	def multiRowInserts(self, prefix, rows):
+		queries = []
+		query = None
+		for row in rows:
+			if query is not None and len(query) + len(row) + 2 > self.maxStatementBytes:
+				queries.append(query + ';')
+				query = None
+			if query is None:
+				query = prefix + ' ' + row
+			else:
+				query += ', ' + row
+		if query is not None:
+			queries.append(query + ';')
+		return queries
+
+	#  Stable 64-bit message digest of a string (the first 8 bytes of its MD5).
+	#  Unlike hash(), this gives the same number in every process and on every machine,
+	#  which is what makes it usable as a stored identifier.
+	def fingerprint(self, text):
+		if isinstance(text, unicode):
+			text = text.encode('utf-8')
+		return int(hashlib.md5(text).hexdigest()[:16], 16)
+
+	#  One-off maintenance: recompute hash_url and hash_content for articles stored before
+	#  fingerprint() replaced hash(), so that newly scraped copies are recognized as duplicates.
+	#  Works through the table 'batch' rows at a time.
+	def rehashArticles(self, batch=1000):
+		if self.link is not None:
+			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			lastKP = 0
+			while True:
+				query  = 'SELECT kp, url, title, content, body_ref, native_text FROM articles'
+				query += ' WHERE kp > ' + str(lastKP) + ' ORDER BY kp ASC LIMIT ' + str(batch) + ';'
+				cursor.execute(query)
+				result = cursor.fetchall()
+				if len(result) == 0:
+					break
+				for row in result:			#  Hash what was scraped, however it is stored
+					hashURL = 'NULL'
+					if row['url'] is not None:
+						hashURL = str(self.fingerprint(row['url']))
+					hashContent = 'NULL'
+					if row['body_ref'] is not None:	#  Already a fingerprint(), and the key to its stored body
+						hashContent = str(row['body_ref'])
+					elif row['content'] is not None:
+						hashContent = str(self.fingerprint(storedtext.readText(row['content'], row['native_text'])))
+					elif row['title'] is not None:
+						hashContent = str(self.fingerprint(storedtext.readText(row['title'], row['native_text'])))
+					query  = 'UPDATE articles SET hash_url = ' + hashURL + ', hash_content = ' + hashContent
+					query += ' WHERE kp = ' + str(row['kp']) + ';'
+					cursor.execute(query)
+					lastKP = int(row['kp'])
+				self.link.commit()
+				if self.verbose:
+					print('Re-hashed articles through KP ' + str(lastKP))
+			cursor.close()
+		elif self.verbose:
+			print('No database connection; unable to re-hash.')
 		return
 
 	#  Given a feed (a URL string) retrieve all its entries.
@@ -224,15 +1023,54 @@ class FeedFetcher:
 	#  lang-confidence:Confidence about this language categorization, [0.0, 1.0]
 	#  pub-date:       The date the article was published
 	#  date-retrieved: Timestamp of when this article was scraped by us
-	def fetchFeedArticles(self, feed):
+	#
+	#  If 'body' is given, it is the already-downloaded feed (see downloadFeed()) and 'headers' are the
+	#  response headers that came with it. Otherwise the feed is downloaded here.
+	def fetchFeedArticles(self, feed, body=None, headers=None):
 		docs = []
 		#  One feed yields one or more entries.
 		#  RSSstruct is a list of dictionaries, each keyed by RSS attributes
 		#  such as title, content (itself a list of dictionaries), summary_detail,
 		#  keyword, etc...
-		RSSstruct = feedparser.parse(feed)
+		if body is None:					#  Download it ourselves: feedparser would wait on the server forever
+			body, headers = self.downloadFeed(feed)
+			if body is None:
+				return docs
+
+		#  Tell feedparser where the bytes came from so that it can still
+		#  resolve relative links and honor the declared character set.
+		responseHeaders = {}
+		if headers is not None:
+			responseHeaders.update(headers)
+		if 'content-location' not in responseHeaders:
+			responseHeaders['content-location'] = feed
+		RSSstruct = feedparser.parse(body, response_headers=responseHeaders)
+		self.noteHub(feed, RSSstruct, headers)
+
+		entries = RSSstruct['entries']
+		ordered = self.entriesOrdered(entries)
+		mark = None							#  Where we stopped reading this feed last time
+		if self.useHighWater:
+			mark = self.highWater.get(feed)
+			self.raiseHighWater(feed, entries)
+
 		entryCtr = 1
-		for entry in RSSstruct['entries']:
+		entryIds = []						#  Fingerprints of every entry this feed lists right now
+		skipped = 0							#  Entries we already read on an earlier poll
+		for i, entry in enumerate(entries):
+			#  Drop entries we read on the last poll before spending any effort on them
+			ids = self.entryIds(entry)
+			entryIds += ids
+			if ordered and mark is not None and self.belowHighWater(entry, ids, mark):
+				skipped += len(entries) - i	#  Newest first: everything from here on is older still
+				if self.seenIndex is not None:
+					for rest in entries[i + 1:]:
+						entryIds += self.entryIds(rest)
+				break
+			if self.seenIndex is not None and self.seenIndex.contains(feed, ids):
+				skipped += 1
+				continue
+
 			#  Use BeautifulSoup to retrieve an encoding-agnostic plaintext string of the article attributes.
 			#  We include ['content']['value'], ['title'], ['summary'], ['keyword'].
 			#  (We also check ['content']['language']. This field is often left blank, and there is no guarantee
@@ -253,44 +1091,48 @@ class FeedFetcher:
 			#  summary seems to be labeled "summary_detail." If summary_detail is present and content
 			#  is None, then save summary to content and save summary_detail to summary.
 
+			#  Every field is cleaned in a single pass as it is scraped: markup stripped, entities decoded,
+			#  line breaks removed (if self.removeLB) and special characters swapped (if self.replaceSpecial).
+
 			#  Scrape article content
 			if 'content' in entry:
 				for e in entry['content']:
 					if 'value' in e and e['value'] is not None:
-						articleContent = BeautifulSoup(e['value'].encode('utf-8'), 'html.parser').get_text()
+						articleContent = self.cleanText(e['value'])
 					if 'language' in e and e['language'] is not None:
-						langClaimed = BeautifulSoup(e['language'].encode('utf-8'), 'html.parser').get_text()
+						langClaimed = self.cleanText(e['language'])
 
 			#  Scrape article title
 			if 'title' in entry and entry['title'] is not None:
-				articleTitle = BeautifulSoup(entry['title'].encode('utf-8'), 'html.parser').get_text()
+				articleTitle = self.cleanText(entry['title'])
 
 			#  Scrape article summary
 			if 'summary' in entry and entry['summary'] is not None:
-				articleSummary = BeautifulSoup(entry['summary'].encode('utf-8'), 'html.parser').get_text()
+				articleSummary = self.cleanText(entry['summary'])
 
 			#  Is 'summary_detail' present?
 			if 'summary_detail' in entry and entry['summary_detail'] is not None:
 				if 'value' in entry['summary_detail'] and entry['summary_detail']['value'] is not None:
-					articleSummaryDetail = BeautifulSoup(entry['summary_detail']['value'].encode('utf-8'), 'html.parser').get_text()
+					articleSummaryDetail = self.cleanText(entry['summary_detail']['value'])
 
 			#  Scrape article keyword(s)
 			if 'keyword' in entry and entry['keyword'] is not None:
-				articleKeyword = BeautifulSoup(entry['keyword'].encode('utf-8'), 'html.parser').get_text()
+				articleKeyword = self.cleanText(entry['keyword'])
 
 			#  Probe various attributes (in order of preference) to determine which language the feed contains
 			if lang is None:
 				if articleContent is not None:
-					lang, langConfidence = self.determineLanguage(articleContent)
+					lang, langConfidence = self.detectFeedLanguage(feed, articleContent)
 				elif articleSummary is not None:
-					lang, langConfidence = self.determineLanguage(articleSummary)
+					lang, langConfidence = self.detectFeedLanguage(feed, articleSummary)
 				elif articleTitle is not None:
-					lang, langConfidence = self.determineLanguage(articleTitle)
+					lang, langConfidence = self.detectFeedLanguage(feed, articleTitle)
 				elif articleKeyword is not None:
-					lang, langConfidence = self.determineLanguage(articleKeyword)
+					lang, langConfidence = self.detectFeedLanguage(feed, articleKeyword)
 				else:
 					lang = 'UNKNOWN'
 					langConfidence = 0.0
+				self.learnLanguage(feed, lang, langConfidence, langClaimed)
 
 			'''
 			#  This bit of code rendered visible parsings which did NOT contain 'content'.
@@ -307,51 +1149,6 @@ class FeedFetcher:
 				fh.close()
 			'''
 
-			#  Remove line breaks AFTER we've attempted to identify the language
-			if self.removeLB:
-				if articleContent is not None:
-					articleContent = ' '.join(articleContent.splitlines())
-				if articleSummary is not None:
-					articleSummary = ' '.join(articleSummary.splitlines())
-				if articleSummaryDetail is not None:
-					articleSummaryDetail = ' '.join(articleSummaryDetail.splitlines())
-				if articleTitle is not None:
-					articleTitle = ' '.join(articleTitle.splitlines())
-				if articleKeyword is not None:
-					articleKeyword = ' '.join(articleKeyword.splitlines())
-
-			#  Find-and-replace web-formatted characters
-			if self.replaceSpecial:
-				for k, v in self.replaceDict.items():
-					if articleContent is not None:
-						articleContent = re.sub(k, v, articleContent)
-					if articleSummary is not None:
-						articleSummary = re.sub(k, v, articleSummary)
-					if articleSummaryDetail is not None:
-						articleSummaryDetail = re.sub(k, v, articleSummaryDetail)
-					if articleTitle is not None:
-						articleTitle = re.sub(k, v, articleTitle)
-					if articleKeyword is not None:
-						articleKeyword = re.sub(k, v, articleKeyword)
-
-				#  &#nnn;  means the number is DECIMAL     convert to \ummm where mmm is hex for nnn
-				#  &#xnnn; means the number is HEXADECIMAL convert to \unnn
-				if articleContent is not None:
-					articleContent = re.sub(r'&#(\d+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group()[2:-1]), 6)[2:], articleContent)
-					articleContent = re.sub(r'&#x([0-9a-fA-F]+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group(1), 16), 6)[2:], articleContent)
-				if articleSummary is not None:
-					articleSummary = re.sub(r'&#(\d+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group()[2:-1]), 6)[2:], articleSummary)
-					articleSummary = re.sub(r'&#x([0-9a-fA-F]+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group(1), 16), 6)[2:], articleSummary)
-				if articleSummaryDetail is not None:
-					articleSummaryDetail = re.sub(r'&#(\d+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group()[2:-1]), 6)[2:], articleSummaryDetail)
-					articleSummaryDetail = re.sub(r'&#x([0-9a-fA-F]+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group(1), 16), 6)[2:], articleSummaryDetail)
-				if articleTitle is not None:
-					articleTitle = re.sub(r'&#(\d+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group()[2:-1]), 6)[2:], articleTitle)
-					articleTitle = re.sub(r'&#x([0-9a-fA-F]+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group(1), 16), 6)[2:], articleTitle)
-				if articleKeyword is not None:
-					articleKeyword = re.sub(r'&#(\d+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group()[2:-1]), 6)[2:], articleKeyword)
-					articleKeyword = re.sub(r'&#x([0-9a-fA-F]+);', lambda m: r'\u' + "{0:#0{1}x}".format(int(m.group(1), 16), 6)[2:], articleKeyword)
-
 			#  Display notifications to the screen about what we're scraping
 			scrapeNotice = unicode(str(entryCtr) + '.  ')
 			outstr = u''
@@ -386,73 +1183,65 @@ class FeedFetcher:
 				print(outstr)
 
 			#  Pack up all the information we want to save (anticipating that it may be incomplete).
-			#  Also, notice that anything which comes from the article is being sanitized using repr().
-			#  This is to account for all languages. Just remember that they are stored this way when
-			#  you retrieve them from the DB.
+			#  Also, notice that anything which comes from the article is being sanitized using repr(),
+			#  unless self.nativeText is set (see storable()). This is to account for all languages.
+			#  Just remember that they are stored this way when you retrieve them from the DB.
 			doc = {}						#  Build new dictionary object
 			doc['rss'] = feed				#  Save source for reference
+			doc['native'] = self.nativeText	#  How the text fields below are rendered
 			if 'link' in entry:				#  Add URL
 				doc['url'] = entry['link']	#  Hash URL
-				doc['hash_url'] = hash(doc['url']) % ((sys.maxsize + 1) * 2)
+				doc['hash_url'] = self.fingerprint(doc['url'])
 			else:
 				doc['url'] = None
 				doc['hash_url'] = None
 
 			if articleTitle is not None:	#  Add article title (render for DB storage)
-				safe = repr(articleTitle)[2:-1]
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				doc['title'] = safe
+				doc['title'] = self.storable(articleTitle)
 			else:
 				doc['title'] = None
 
+			doc['body'] = None				#  Article text bound for the body store instead (see storeBodies)
+			doc['minhash'] = None			#  Signature for spotting near-duplicates (see collapseNear)
 			if articleContent is not None:	#  Add article text (render for DB storage)
-				safe = repr(articleContent)[2:-1]
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				doc['text'] = safe			#  Hash text
-				doc['hash_content'] = hash(doc['text']) % ((sys.maxsize + 1) * 2)
+				doc['text'] = self.storable(articleContent)			#  Hash text
+				doc['hash_content'] = self.fingerprint(articleContent)
+				if self.storeBodies:
+					doc['text'] = None
+					doc['body'] = articleContent
+				if self.collapseNear:
+					doc['minhash'] = minhash.signature(articleContent)
 			elif articleSummary is not None and articleSummaryDetail is not None:
-				safe = repr(articleSummary)[2:-1]
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				doc['text'] = safe			#  Hash text
-				doc['hash_content'] = hash(doc['text']) % ((sys.maxsize + 1) * 2)
+				doc['text'] = self.storable(articleSummary)			#  Hash text
+				doc['hash_content'] = self.fingerprint(articleSummary)
+				if self.storeBodies:
+					doc['text'] = None
+					doc['body'] = articleSummary
+				if self.collapseNear:
+					doc['minhash'] = minhash.signature(articleSummary)
 			elif articleTitle is not None:
 				doc['text'] = None
 				#  We only use the hashed title if other text was unavailable
 				#  (Some Chinese RSS feeds are packaged differently)
-				doc['hash_content'] = hash(doc['title']) % ((sys.maxsize + 1) * 2)
+				doc['hash_content'] = self.fingerprint(articleTitle)
 			else:
 				doc['text'] = None
 				doc['hash_content'] = None
 											#  Add article summary (render for DB storage)
 			if articleSummary is not None and articleSummaryDetail is None:
-				safe = repr(articleSummary)[2:-1]
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				doc['summary'] = safe
+				doc['summary'] = self.storable(articleSummary)
 			elif articleSummaryDetail is not None:
-				safe = repr(articleSummaryDetail)[2:-1]
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				doc['summary'] = safe
+				doc['summary'] = self.storable(articleSummaryDetail)
 			else:
 				doc['summary'] = None
 
 			if articleKeyword is not None:	#  Add keyword (render for DB storage)
-				safe = repr(articleKeyword)[2:-1]
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				doc['keyword'] = safe
+				doc['keyword'] = self.storable(articleKeyword)
 			else:
 				doc['keyword'] = None
 
 			if langClaimed is not None:		#  Add language claimed (render for DB storage)
-				safe = repr(langClaimed)[2:-1]
-				safe = re.sub(r'\"', '\\\"', safe)
-				safe = re.sub(r'\u', '\\u', safe)
-				doc['lang-claimed'] = safe
+				doc['lang-claimed'] = self.storable(langClaimed)
 			else:
 				doc['lang-claimed'] = None
 
@@ -476,8 +1265,130 @@ class FeedFetcher:
 			docs.append(doc)				#  Add new record to list
 			entryCtr += 1					#  Update count
 
+		if self.seenIndex is not None:		#  Committed by save() once these docs are stored
+			self.seenIndex.record(feed, entryIds)
+		if self.verbose and skipped > 0:
+			print("\t" + str(skipped) + ' entries already seen')
+
 		return docs
 
+	#  Render a scraped field for storage: legacy-escaped, or as-is if self.nativeText (see storedtext.py)
+	def storable(self, text):
+		if self.nativeText:
+			return text
+		return storedtext.legacyText(text)
+
+	#  A text field of 'doc' as an SQL literal. Legacy renderings are already escaped;
+	#  native text is escaped (and UTF-8 encoded) by the connection.
+	def sqlText(self, doc, k):
+		if doc['native']:
+			return storedtext.nativeLiteral(self.link, doc[k])
+		return '"' + doc[k] + '"'
+
+	#  Reduce a scraped field to plain text according to this fetcher's clean-up settings
+	def cleanText(self, text):
+		return self.cleaner.clean(text, True, self.removeLB, self.replaceSpecial)
+
+	#  Return the fingerprints by which we recognize a feed entry on later polls: its GUID and its link
+	def entryIds(self, entry):
+		ids = []
+		if 'id' in entry and entry['id']:
+			ids.append(self.fingerprint(entry['id']))
+		if 'link' in entry and entry['link']:
+			ids.append(self.fingerprint(entry['link']))
+		return ids
+
+	#  When an entry was published (or, failing that, last updated), as a datetime in UTC; None if it does not say
+	def entryPublished(self, entry):
+		for k in ['published_parsed', 'updated_parsed']:
+			if k in entry and entry[k] is not None:
+				return datetime(*entry[k][:6])
+		return None
+
+	#  Return True if the feed lists its entries newest first: every entry is dated and none is newer than
+	#  the one before it. Most of our feeds do, and for them reading can stop at the high-water mark.
+	#  Any other feed is read in full, leaving it to the seen index and the fingerprints to drop repeats.
+	def entriesOrdered(self, entries):
+		previous = None
+		for entry in entries:
+			published = self.entryPublished(entry)
+			if published is None or (previous is not None and published > previous):
+				return False
+			previous = published
+		return True
+
+	#  Return True if an entry of an ordered feed is at or below the feed's high-water mark 'mark',
+	#  a tuple (fingerprint, published): it IS the newest entry we read last time, or is older than it.
+	#  Entries published in the same second as the mark are read, in case they are new.
+	def belowHighWater(self, entry, ids, mark):
+		if mark[0] in ids:
+			return True
+		published = self.entryPublished(entry)
+		return mark[1] is not None and published is not None and published < mark[1]
+
+	#  Move the feed's high-water mark up to the newest dated entry it lists, if that is newer than the mark.
+	#  Held in self.pendingHighWater until save() writes it back, so a run that dies before its articles are
+	#  stored reads them again next time.
+	def raiseHighWater(self, feed, entries):
+		newest = None
+		for entry in entries:
+			published = self.entryPublished(entry)
+			if published is not None and (newest is None or published > newest[1]):
+				ids = self.entryIds(entry)
+				if len(ids) > 0:
+					newest = (ids[0], published)
+		if newest is None:
+			return
+		current = self.pendingHighWater.get(feed, self.highWater.get(feed))
+		if newest != current and (current is None or current[1] is None or newest[1] >= current[1]):
+			self.pendingHighWater[feed] = newest
+		return
+
+	#  Remember the WebSub hub a feed advertises, if any, along with the topic URL to subscribe to there
+	#  (the feed's rel="self" link, or the feed URL itself). Both may come as <link> elements in the feed
+	#  or in an HTTP Link header. Held in self.pendingHubs until save() writes them back; websub.py subscribes.
+	def noteHub(self, feed, RSSstruct, headers=None):
+		hub = None
+		topic = None
+		for link in RSSstruct['feed'].get('links', []):
+			if link.get('rel') == 'hub' and hub is None:
+				hub = link.get('href')
+			elif link.get('rel') == 'self' and topic is None:
+				topic = link.get('href')
+		if headers is not None and 'link' in headers:
+			for href, rel in re.findall(r'<([^>]+)>\s*;\s*rel="?([^";,]+)"?', headers['link']):
+				if rel == 'hub' and hub is None:
+					hub = href
+				elif rel == 'self' and topic is None:
+					topic = href
+		if hub is None:
+			return
+		found = (hub, topic or feed)
+		if found != self.pendingHubs.get(feed, self.hubs.get(feed)):
+			self.pendingHubs[feed] = found
+		return
+
+	#  Keep every new feed body we download in a FeedArchive under the directory 'path',
+	#  so that runs can be replayed later without the network (see rssreplay.py).
+	def openArchive(self, path):
+		self.archive = FeedArchive(path)
+		return
+
+	#  Store the text of new articles once per distinct text, compressed, in the 'article_body' table
+	#  (see bodystore.py), rather than in articles.content. Call after openDB().
+	def openBodyStore(self):
+		self.bodyStore = BodyStore(self.link)
+		self.bodyStore.verbose = self.verbose
+		self.storeBodies = True
+		return
+
+	#  Keep a persistent index of the entries each feed has shown us, stored in the file 'path'.
+	#  fetchFeedArticles() then skips entries it read on the previous poll.
+	def openSeenIndex(self, path):
+		self.seenIndex = SeenIndex(path)
+		self.seenIndex.load()
+		return
+
 	#  Pull a list of news feeds to check for new articles
 	#  Returns a list of URL strings:
 	#  e.g. [
@@ -491,145 +1402,169 @@ class FeedFetcher:
 			self.startTimer()
 
 			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
-			query = 'SELECT feed FROM rss WHERE enabled = TRUE;'
+			query  = 'SELECT feed, etag, last_modified, body_hash, lang_stats, failures, retry_after, hwm_id, hwm_published,'
+			query += ' hub, hub_topic, push_until FROM rss WHERE enabled = TRUE;'
 			cursor.execute(query)
 			result = cursor.fetchall()
 			if len(result) > 0:
+				now = datetime.now()
+				resting = 0					#  Feeds whose circuit is open (see feedFailed())
+				pushed = 0					#  Feeds a hub pushes to websub.py instead
 				for row in result:
+					self.failures[row['feed']] = row['failures']
+					if row['retry_after'] is not None and row['retry_after'] > now:
+						resting += 1
+						continue
+					self.feedState[row['feed']] = {'etag': row['etag'], \
+					                               'last-modified': row['last_modified'], \
+					                               'body-hash': row['body_hash']}
+					self.langStats[row['feed']] = self.parseLangStats(row['lang_stats'])
+					if row['hwm_id'] is not None:
+						self.highWater[row['feed']] = (int(row['hwm_id']), row['hwm_published'])
+					if row['hub'] is not None:
+						self.hubs[row['feed']] = (row['hub'], row['hub_topic'])
+					if self.skipPushed and row['push_until'] is not None and row['push_until'] > now:
+						pushed += 1
+						continue
 					self.feeds.append(row['feed'])
+				if self.verbose and resting > 0:
+					print(str(resting) + ' failing feeds left alone this time')
+				if self.verbose and pushed > 0:
+					print(str(pushed) + ' feeds pushed to us by their hubs, not polled')
 			elif self.verbose:
 				print('No RSS feeds found.')
 			cursor.close()
 		elif self.verbose:
 			print('No target RSS feeds found.')
 
-	#  Given a string of text, try determine its language.
-	#  (Hardly enough code to justify being its own function, but this used to
-	#   be larger. I tried using Google's language detection API, but it enforces
-	#   limits and asks for money. If we ever change our resources later, then this
-	#   routine would be best off as a sovereign function.)
-	def determineLanguage(self, text):
-
-		#return guessLanguage(text)
-		if not text:
-			return guess_language.UNKNOWN, 0.0
-
-		if isinstance(text, str):
-			text = unicode(text, 'utf-8')
-
-		text = guess_language.normalize(text)
-
-		return self.identifyWithConf(text, guess_language.find_runs(text))
-
-	#  A re-write of the _identify function in the guess_language package:
-	#  We want to preserve the confidence of the identification.
-	def identifyWithConf(self, sample, scripts):
-		if len(sample) < 3:
-			return guess_language.UNKNOWN, 0.0
-
-		if "Hangul Syllables" in scripts or "Hangul Jamo" in scripts \
-		   or "Hangul Compatibility Jamo" in scripts or "Hangul" in scripts:
-			return "ko", 1.0
-
-		if "Greek and Coptic" in scripts:
-			return "el", 1.0
-
-		if "Katakana" in scripts:
-			return "ja", 1.0
-
-		if "CJK Unified Ideographs" in scripts or "Bopomofo" in scripts \
-		   or "Bopomofo Extended" in scripts or "KangXi Radicals" in scripts:
-
-			# This is in both Ceglowski and Rideout
-			# I can't imagine why...
-			#            or "Arabic Presentation Forms-A" in scripts
-			return "zh", 1.0
-
-		if "Cyrillic" in scripts:
-			return self.checkWithConf( sample, guess_language.CYRILLIC )
-
-		if "Arabic" in scripts or "Arabic Presentation Forms-A" in scripts or "Arabic Presentation Forms-B" in scripts:
-			return self.checkWithConf( sample, guess_language.ARABIC )
-
-		if "Devanagari" in scripts:
-			return self.checkWithConf( sample, guess_language.DEVANAGARI )
+	#  Write the conditional-GET validators learned during this run back to the 'rss' table,
+	#  so that the next poll can ask each server whether anything has changed,
+	#  along with each feed's failure count, its high-water mark, its WebSub hub and what we have learned about its language.
+	#  If 'feeds' is given, only those feeds are written.
+	#  ETags are quoted strings by definition, so these values are passed as query parameters.
+	def saveFeedState(self, cursor, feeds=None):
+		if feeds is None:
+			feeds = list(set(self.pendingState.keys()) | set(self.pendingHealth.keys()) | \
+			             set(self.pendingHighWater.keys()) | set(self.pendingHubs.keys()) | self.langStatsChanged)
+		written = False
+
+		health = [x for x in feeds if x in self.pendingHealth]
+		if len(health) > 0:
+			rows = []
+			for feed in health:
+				failures, retryAfter = self.pendingHealth.pop(feed)
+				rows.append( (failures, retryAfter, feed) )
+				self.failures[feed] = failures
+			database.executeBatch(cursor, 'UPDATE rss SET failures = %s, retry_after = %s WHERE feed = %s', rows)
+			written = True
+
+		validators = [x for x in feeds if x in self.pendingState]
+		if len(validators) > 0:
+			rows = []
+			for feed in validators:
+				state = self.pendingState.pop(feed)
+				rows.append( (state['etag'], state['last-modified'], state['body-hash'], feed) )
+				self.feedState[feed] = state
+			query  = 'UPDATE rss SET etag = %s, last_modified = %s, body_hash = %s'
+			query += ' WHERE feed = %s'
+			database.executeBatch(cursor, query, rows)
+			written = True
+
+		marks = [x for x in feeds if x in self.pendingHighWater]
+		if len(marks) > 0:
+			rows = []
+			for feed in marks:
+				mark = self.pendingHighWater.pop(feed)
+				rows.append( (mark[0], mark[1], feed) )
+				self.highWater[feed] = mark
+			database.executeBatch(cursor, 'UPDATE rss SET hwm_id = %s, hwm_published = %s WHERE feed = %s', rows)
+			written = True
+
+		hubs = [x for x in feeds if x in self.pendingHubs]
+		if len(hubs) > 0:
+			rows = []
+			for feed in hubs:
+				hub = self.pendingHubs.pop(feed)
+				rows.append( (hub[0], hub[1], feed) )
+				self.hubs[feed] = hub
+			database.executeBatch(cursor, 'UPDATE rss SET hub = %s, hub_topic = %s WHERE feed = %s', rows)
+			written = True
+
+		languages = [x for x in feeds if x in self.langStatsChanged]
+		if len(languages) > 0:
+			rows = []
+			for feed in languages:
+				self.langStatsChanged.discard(feed)
+				rows.append( (self.formatLangStats(self.langStats[feed]), feed) )
+			database.executeBatch(cursor, 'UPDATE rss SET lang_stats = %s WHERE feed = %s', rows)
+			written = True
+
+		if written:
+			self.link.commit()
+		return
 
+	#  Detect the language of an entry from feed 'feed'. Returns a tuple (language code, confidence).
+	#  Nearly all our feeds publish in a single language. Once a feed has shown us enough entries in one
+	#  language (see feedPrior()), the first self.priorPrefix characters are enough to confirm that
+	#  language, and only entries whose opening disagrees are scored in full.
+	#  A confirmed verdict carries the confidence measured on the opening alone.
+	def detectFeedLanguage(self, feed, text):
+		prior = None
+		if self.usePrior:
+			prior = self.feedPrior(feed)
+		if prior is not None and text is not None and len(text) > self.priorPrefix:
+			lang, langConfidence = self.determineLanguage(text[:self.priorPrefix])
+			if lang == prior:
+				return lang, langConfidence
+		return self.determineLanguage(text)
+
+	#  Return the language feed 'feed' is almost always written in, or None if we cannot say yet
+	def feedPrior(self, feed):
+		stats = self.langStats.get(feed)
+		if not stats:
+			return None
+		total = sum(stats.values())
+		if total < self.priorMinWeight:
+			return None
+		lang = max(stats, key=stats.get)
+		if stats[lang] < total * self.priorShare:
+			return None
+		return lang
+
+	#  Add one entry's evidence to what we know about feed 'feed': the detected language weighs as much as
+	#  the detector's confidence in it, and the language the entry claims (if any) weighs self.claimWeight.
+	def learnLanguage(self, feed, lang, langConfidence, langClaimed=None):
+		stats = self.langStats.setdefault(feed, {})
+		if lang is not None and lang != 'UNKNOWN' and langConfidence > 0.0:
+			stats[lang] = stats.get(lang, 0.0) + langConfidence
+		if langClaimed is not None:			#  'en-US', 'en_gb', 'EN' ==> 'en'
+			claimed = re.split(r'[-_]', langClaimed.strip().lower())[0]
+			if re.match(r'^[a-z]{2,3}$', claimed):
+				stats[claimed] = stats.get(claimed, 0.0) + self.claimWeight
+		if sum(stats.values()) > self.priorMaxWeight:
+			for k in stats.keys():
+				stats[k] /= 2.0
+		self.langStatsChanged.add(feed)
+		return
 
-		# Try languages with unique scripts
-		for blockName, langName in guess_language.SINGLETONS:
-			if blockName in scripts:
-				return langName
+	#  Language statistics are stored in the 'rss' table as 'en:41.27 fr:0.52'
+	def parseLangStats(self, text):
+		stats = {}
+		if text:
+			for pair in text.split():
+				k, v = pair.split(':')
+				stats[k] = float(v)
+		return stats
 
-		if "Latin Extended Additional" in scripts:
-			return "vi"
+	def formatLangStats(self, stats):
+		pairs = sorted(stats.items(), key=lambda x: -x[1])
+		return ' '.join([k + ':' + ('%.2f' % v) for k, v in pairs if v >= 0.01])
 
-		if "Extended Latin" in scripts:
-			latinLang = self.checkWithConf( sample, guess_language.EXTENDED_LATIN )
-			if latinLang == "pt":
-				return self.checkWithConf(sample, guess_language.PT)
-			else:
-				return latinLang
-
-		if "Basic Latin" in scripts:
-			return self.checkWithConf( sample, guess_language.ALL_LATIN )
-
-		return guess_language.UNKNOWN, 0.0
-
-	#  A re-write of the check function in the guess_language package:
-	#  We want to preserve the confidence of the identification.
-	def checkWithConf(self, sample, langs):
-		if len(sample) < guess_language.MIN_LENGTH:
-			return guess_language.UNKNOWN, 0.0
-
-		scores = []
-		model = guess_language.createOrderedModel(sample)  # QMap<int,QString>
-
-		greatest = float('-inf')
-		least = float('inf')
-		for key in langs:
-			lkey = key.lower()
-
-			if lkey in guess_language.models:
-				d = guess_language.distance(model, guess_language.models[lkey])
-				if d > greatest:
-					greatest = d
-				if d < least:
-					least = d
-				scores.append( [d, key] )
-
-		#  Normalize scores
-		for score in scores:
-			#score[0] = float(score[0] - least) / float(greatest - least)
-			score[0] = float(score[0]) / float(greatest)
-
-		if not scores:
-			return guess_language.UNKNOWN, 0.0
-
-		# we want the lowest score, less distance = greater chance of match
-		#    pprint(sorted(scores))
-		return min(scores)[1], 1.0 - min(scores)[0]
-
-	#  Build a lookup table of special character signifiers we'll want to replace before storage/parsing/etc.
-	def initReplace(self):
-		d = {}
-		d['&apos;'] = '\''					#  HTML apostrophe
-		d['&#39;'] = '\''					#  Decimal apostrophe
-		d['&amp;'] = '&'					#  HTML ampersand
-		d['&#38;'] = '&'					#  Decimal ampersand
-		d['&quot;'] = '"'					#  HTML double-quote
-		d['&#34;'] = '"'					#  Decimal double-quote
-		d['&lt;'] = '<'						#  HTML less-than
-		d['&#60;'] = '<'					#  Decimal less-than
-		d['&gt;'] = '>'						#  HTML greater-than
-		d['&#62;'] = '>'					#  Decimal greater-than
-		d['&mdash;'] = '--'					#  HTML em-dash
-		d['&#8212;'] = '--'					#  Decimal em-dash
-		d['&ndash;'] = '--'					#  HTML en-dash
-		d['&#8211;'] = '--'					#  Decimal en-dash
-		d['&#8210;'] = '--'					#  Decimal figure-dash
-		d['&#xa0;'] = ''					#  "Non-breakable Space" symbol is irrelevant to our collections
-		d['&#x00a0;'] = ''					#  Four-digit equivalent
-		return d
+	#  Given a string of text, try determine its language.
+	#  Returns a tuple (language code, confidence in [0.0, 1.0]).
+	#  The trigram scoring lives in langid.py, shared with the other collectors.
+	def determineLanguage(self, text):
+		return self.langid.identify(text)
 
 	#  If they were not provided in the constructor, they may be provided here.
 	def setDBcredentials(self, host, uname, pword, table):
@@ -644,13 +1579,13 @@ class FeedFetcher:
 		   self.dbUser is not None and \
 		   self.dbPword is not None and \
 		   self.dbTable is not None:
-			self.link = MySQLdb.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
+			self.link = database.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
 		elif self.verbose:
 			print('Unable to open a DB connection because credentials are missing.')
 
 	#  Close the connection to the database
 	def closeDB(self):
-		self.link.close()
+		database.release(self.link)			#  Back to the pool for the next user
 		return
 
 	def startTimer(self):
@@ -660,3 +1595,46 @@ class FeedFetcher:
 	def stopTimer(self):
 		self.stopTime = time.mktime(time.gmtime())
 		return
+
+#  FeedFetcher settings copied to each parse worker
+PARSER_SETTINGS = ['verbose', 'removeLB', 'replaceSpecial', 'nativeText', 'storeBodies', 'collapseNear', 'useHighWater', \
+                   'usePrior', 'priorMinWeight', 'priorShare', 'priorMaxWeight', 'priorPrefix', 'claimWeight']
+
+parser = None								#  This worker process's own FeedFetcher
+
+#  Pool initializer: give each parse worker a FeedFetcher (with its own cleaner and language models)
+#  configured like the one that started the pool
+def initParser(settings):
+	global parser
+	parser = FeedFetcher()
+	for k, v in settings.items():
+		setattr(parser, k, v)
+	return
+
+#  Parse one downloaded feed in a worker process (see FeedFetcher.parseInPool()).
+#  'job' is (feed, body, headers, fingerprints seen last poll or None, language statistics or None,
+#  high-water mark or None, WebSub hub or None). Returns (feed, docs, fingerprints found this poll, updated
+#  language statistics, moved high-water mark or None, newly found hub or None, error or None).
+#  Errors are returned rather than raised so that the parent never waits on a job that died.
+def parseFeed(job):
+	feed, body, headers, seen, stats, mark, hub = job
+	parser.seenIndex = SeenIndex()
+	if seen is not None:
+		parser.seenIndex.seen[feed] = seen
+	parser.langStats = {}
+	if stats is not None:
+		parser.langStats[feed] = stats
+	parser.highWater = {}
+	parser.pendingHighWater = {}
+	if mark is not None:
+		parser.highWater[feed] = mark
+	parser.hubs = {}
+	parser.pendingHubs = {}
+	if hub is not None:
+		parser.hubs[feed] = hub
+	try:
+		docs = parser.fetchFeedArticles(feed, body, headers)
+	except Exception as e:
+		return feed, None, None, None, None, None, repr(e)
+	return feed, docs, parser.seenIndex.pending.get(feed, set()), parser.langStats.get(feed), \
+	       parser.pendingHighWater.get(feed), parser.pendingHubs.get(feed), None
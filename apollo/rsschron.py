@@ -8,9 +8,21 @@ from rss import FeedFetcher
 #  argv[0] = rsschron.py
 #  argv[1] = verbosity {Y/N}
 #  argv[2] = debug output to file {Y/N}
+#  argv[3] = download feeds concurrently {Y/N}
+#  argv[4] = save while fetching, in batches {Y/N}
+#  argv[5] = number of processes parsing feeds (default 0: parse in the main process)
+#  argv[6] = directory in which to archive raw feed bodies for rssreplay.py (default, or -: no archive)
+#  argv[7] = store article text in the compressed body store, bodystore.py {Y/N}
+#  argv[8] = store text as native UTF-8 rather than legacy escapes, storedtext.py {Y/N}
 def main():
 	verbosity = False
 	debugOutput = False
+	concurrent = False
+	streaming = False
+	parseProcesses = 0
+	archive = None
+	storeBodies = False
+	nativeText = False
 
 	if len(sys.argv) > 1:
 		if sys.argv[1].upper()[0] == 'Y':
@@ -20,12 +32,46 @@ def main():
 		if sys.argv[2].upper()[0] == 'Y':
 			debugOutput = True
 
+	if len(sys.argv) > 3:
+		if sys.argv[3].upper()[0] == 'Y':
+			concurrent = True
+
+	if len(sys.argv) > 4:
+		if sys.argv[4].upper()[0] == 'Y':
+			streaming = True
+
+	if len(sys.argv) > 5:
+		parseProcesses = int(sys.argv[5])
+
+	if len(sys.argv) > 6 and sys.argv[6] != '-':
+		archive = sys.argv[6]
+
+	if len(sys.argv) > 7:
+		if sys.argv[7].upper()[0] == 'Y':
+			storeBodies = True
+
+	if len(sys.argv) > 8:
+		if sys.argv[8].upper()[0] == 'Y':
+			nativeText = True
+
 	fetcher = FeedFetcher('localhost', 'censor', 'blockme', 'corpora')
 	fetcher.verbose = verbosity
 	fetcher.debugFile = debugOutput
+	fetcher.concurrent = concurrent
+	fetcher.parseProcesses = parseProcesses
+	fetcher.nativeText = nativeText
+	fetcher.openSeenIndex('rss-seen.idx')	#  Skip entries read on the last poll
+	if archive is not None:
+		fetcher.openArchive(archive)
 	fetcher.openDB()
+	if storeBodies:
+		fetcher.openBodyStore()
 	fetcher.getFeeds()
-	fetcher.save(fetcher.fetch())
+	if streaming:
+		fetcher.stream()					#  Save each batch as soon as it is fetched
+	else:
+		fetcher.save(fetcher.fetch())
+	fetcher.pruneMinHashes()				#  Keep the near-duplicate index to recent articles
 	fetcher.closeDB()
 
 if __name__ == '__main__':
@@ -0,0 +1,40 @@
+import sys
+from rss import FeedFetcher
+from rssscheduler import FeedScheduler
+
+#  Poll feeds continuously, each as often as it publishes
+#  (runs until interrupted; use this instead of rsschron.py in cron)
+#  and show your work
+#  python rssdaemon.py y y
+
+#  argv[0] = rssdaemon.py
+#  argv[1] = verbosity {Y/N}
+#  argv[2] = download feeds concurrently {Y/N}
+def main():
+	verbosity = False
+	concurrent = False
+
+	if len(sys.argv) > 1:
+		if sys.argv[1].upper()[0] == 'Y':
+			verbosity = True
+
+	if len(sys.argv) > 2:
+		if sys.argv[2].upper()[0] == 'Y':
+			concurrent = True
+
+	fetcher = FeedFetcher('localhost', 'censor', 'blockme', 'corpora')
+	fetcher.verbose = verbosity
+	fetcher.concurrent = concurrent
+	fetcher.openSeenIndex('rss-seen.idx')	#  Rates count only entries we have not seen before
+	fetcher.openDB()
+
+	scheduler = FeedScheduler(fetcher)
+	scheduler.verbose = verbosity
+	try:
+		scheduler.run()
+	except KeyboardInterrupt:
+		pass
+	fetcher.closeDB()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,45 @@
+import sys
+import os
+from rss import FeedFetcher
+from websub import WebSubReceiver
+
+#  Take pushes from the WebSub hubs our feeds advertise, instead of polling those feeds
+#  (runs until interrupted; run it next to rssdaemon.py or rsschron.py, which keep polling everything else).
+#  Hubs must be able to reach the callback URL, and it must lead to the port given here.
+#  Listen on port 8080 behind http://collector.example.org:8080/websub
+#  and show your work
+#  python rsspush.py http://collector.example.org:8080/websub 8080 y
+
+#  argv[0] = rsspush.py
+#  argv[1] = public callback URL
+#  argv[2] = local port (default 8080)
+#  argv[3] = verbosity {Y/N}
+def main():
+	if len(sys.argv) < 2:
+		print('Usage: python rsspush.py <callback URL> [port] [verbose Y/N]')
+		return
+
+	callback = sys.argv[1]
+	port = 8080
+	verbosity = False
+
+	if len(sys.argv) > 2:
+		port = int(sys.argv[2])
+
+	if len(sys.argv) > 3:
+		if sys.argv[3].upper()[0] == 'Y':
+			verbosity = True
+
+	fetcher = FeedFetcher('localhost', 'censor', 'blockme', 'corpora')
+	fetcher.verbose = verbosity
+	fetcher.openDB()
+	fetcher.getFeeds()						#  Hubs, high-water marks and language statistics of every feed
+
+	#  A fresh secret each run: every subscription is renewed with it at start-up
+	receiver = WebSubReceiver(fetcher, callback, port, os.urandom(20).encode('hex'))
+	receiver.verbose = verbosity
+	receiver.serve()
+	fetcher.closeDB()
+
+if __name__ == '__main__':
+	main()
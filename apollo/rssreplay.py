@@ -0,0 +1,75 @@
+import sys
+import time
+from rss import FeedFetcher
+from feedarchive import FeedArchive
+
+#  Re-run archived feed bodies (see rsschron.py, argv[6]) through the parser, and optionally into a database,
+#  without touching the network. Use it to check parser and clean-up changes against real inputs, and to
+#  measure parse and ingest throughput on the same inputs every time.
+#  Point it at a scratch database: the articles are saved exactly as a live run would save them.
+
+#  Replay everything archived on 21 February 2018 into the local database
+#  and show your work
+#  python rssreplay.py rss-archive 2018-02-21 y y
+
+#  argv[0] = rssreplay.py
+#  argv[1] = archive directory
+#  argv[2] = day to replay, YYYY-MM-DD, or * for every day in the archive
+#  argv[3] = verbosity {Y/N}
+#  argv[4] = save to the database {Y/N} (N: parse only)
+#  argv[5] = number of processes parsing feeds (default 0: parse in the main process)
+def main():
+	if len(sys.argv) < 3:
+		print('Usage: python rssreplay.py <archive directory> <YYYY-MM-DD or *> [verbose Y/N] [save Y/N] [processes]')
+		return
+
+	path = sys.argv[1]
+	day = sys.argv[2]
+	verbosity = False
+	saving = False
+	parseProcesses = 0
+
+	if day == '*':
+		day = None
+
+	if len(sys.argv) > 3:
+		if sys.argv[3].upper()[0] == 'Y':
+			verbosity = True
+
+	if len(sys.argv) > 4:
+		if sys.argv[4].upper()[0] == 'Y':
+			saving = True
+
+	if len(sys.argv) > 5:
+		parseProcesses = int(sys.argv[5])
+
+	#  Read the bodies up front, so that disk reads are not counted as parse time
+	archive = FeedArchive(path)
+	bodies = list(archive.replay(day))
+	size = sum([len(x[1]) for x in bodies])
+
+	fetcher = FeedFetcher('localhost', 'censor', 'blockme', 'corpora')
+	fetcher.verbose = verbosity
+	fetcher.parseProcesses = parseProcesses
+	fetcher.replaySource = bodies
+
+	startTime = time.time()
+	docs = fetcher.fetch()
+	parseTime = time.time() - startTime
+
+	print(str(len(bodies)) + ' feed bodies, ' + str(size) + ' bytes, ' + str(len(docs)) + ' entries')
+	print('Parse:  ' + '%.3f' % parseTime + ' sec  (' + '%.1f' % (len(bodies) / max(parseTime, 0.001)) + ' feeds/sec, ' \
+	      + '%.1f' % (len(docs) / max(parseTime, 0.001)) + ' entries/sec)')
+
+	if saving:
+		fetcher.openDB()
+		fetcher.startTimer()
+		startTime = time.time()
+		added = fetcher.save(docs)
+		saveTime = time.time() - startTime
+		fetcher.closeDB()
+		print('Save:   ' + '%.3f' % saveTime + ' sec  (' + '%.1f' % (len(docs) / max(saveTime, 0.001)) + ' entries/sec, ' \
+		      + str(added) + ' new articles)')
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,185 @@
+import heapq								#  Feeds ordered by when they are next due
+import time									#  Sleep until the next feed is due
+from datetime import datetime				#  Due times are stored in the 'rss' table
+import MySQLdb								#  Used for DB operations
+import database								#  Batched statements
+
+#  Polls each feed as often as it actually publishes, instead of every feed on the same cron schedule.
+#
+#  For each feed we keep a running estimate of how many new entries it publishes per hour (an exponentially
+#  weighted moving average of what each poll finds) and the time its next poll is due. Due times live in a
+#  priority queue: the scheduler sleeps until the earliest, polls every feed due by then through a FeedFetcher,
+#  and schedules each again about self.targetEntries new entries ahead, within [minInterval, maxInterval].
+#  A feed posting every five minutes is polled every few minutes; one posting twice a day, every few hours.
+#  Feeds whose circuit is open (see FeedFetcher.feedFailed()) wait until their retry time.
+#
+#  Rates and due times are kept in the 'rss' table (entry_rate, next_poll), so a restarted scheduler
+#  picks up where it left off.
+#
+#  fetcher = FeedFetcher('localhost', 'censor', 'blockme', 'corpora')
+#  fetcher.openDB()
+#  scheduler = FeedScheduler(fetcher)
+#  scheduler.run()
+class FeedScheduler:
+	def __init__(self, fetcher):
+		self.fetcher = fetcher				#  FeedFetcher, connected to the database, that does the polling
+		self.queue = []						#  Heap of (due time in epoch seconds, feed)
+		self.due = {}						#  [feed] ==> its due time in self.queue; entries that disagree are stale
+		self.rate = {}						#  [feed] ==> estimated new entries per hour
+		self.lastPoll = {}					#  [feed] ==> epoch seconds of its last poll by this scheduler
+
+		self.targetEntries = 2.0			#  Poll a feed when about this many new entries should be waiting
+		self.minInterval = 300				#  Never poll a feed more often than this (seconds)
+		self.maxInterval = 86400			#  Never leave a feed unpolled longer than this (seconds)
+		self.defaultRate = 1.0				#  Entries per hour assumed for a feed we know nothing about
+		self.smoothing = 0.3				#  Weight of the latest poll in the moving average
+		self.refreshInterval = 3600			#  Seconds between re-reads of the feed list (new or disabled feeds)
+		self.nextRefresh = 0				#  Epoch seconds of the next re-read
+		self.maxBatch = 200					#  Most feeds polled in one go when many are due together
+		self.verbose = False				#  Whether to print progress to screen
+		return
+
+	#  Poll feeds as they come due, forever (or until interrupted)
+	def run(self):
+		while True:
+			self.runOnce()
+			wait = self.secondsUntilDue()
+			if wait > 0:
+				if self.verbose:
+					print('Sleeping ' + str(int(wait)) + ' seconds')
+				time.sleep(wait)
+		return
+
+	#  Poll every feed that is due now. Returns the number of new articles saved.
+	def runOnce(self):
+		now = time.time()
+		if now >= self.nextRefresh:
+			self.loadFeeds()
+			self.nextRefresh = now + self.refreshInterval
+			now = time.time()				#  Feeds new to us were made due just now
+
+		feeds = []
+		while len(self.queue) > 0 and self.queue[0][0] <= now and len(feeds) < self.maxBatch:
+			dueTime, feed = heapq.heappop(self.queue)
+			if self.due.get(feed) == dueTime:
+				del self.due[feed]
+				feeds.append(feed)
+
+		if len(feeds) == 0:
+			return 0
+
+		if self.verbose:
+			print(datetime.now().strftime('%Y-%m-%d %H:%M:%S') + '  polling ' + str(len(feeds)) + ' feed(s)')
+
+		self.fetcher.feeds = feeds
+		self.fetcher.startTimer()
+		counts = {}							#  [feed] ==> new entries found this poll
+		docs = []
+		for feed, feedDocs in self.fetcher.fetchFeeds():
+			counts[feed] = len(feedDocs)
+			docs += feedDocs
+
+		polled = time.time()
+		resting = {}						#  [feed] ==> when a failing feed may be tried again
+		for feed, (failures, retryAfter) in self.fetcher.pendingHealth.items():
+			if retryAfter is not None:
+				resting[feed] = time.mktime(retryAfter.timetuple())
+
+		added = self.fetcher.save(docs)
+
+		for feed in feeds:
+			if feed in resting:				#  Not heard from: leave its rate alone
+				self.schedule(feed, resting[feed])
+			else:
+				self.observe(feed, counts.get(feed, 0), polled)
+				self.schedule(feed, polled + self.interval(feed))
+		self.saveSchedule(feeds)
+
+		return added
+
+	#  Fold one poll's count of new entries into the feed's estimated rate
+	def observe(self, feed, entries, polled):
+		if feed in self.lastPoll:
+			hours = max(polled - self.lastPoll[feed], 1.0) / 3600.0
+			rate = self.rate.get(feed, self.defaultRate)
+			self.rate[feed] = (1.0 - self.smoothing) * rate + self.smoothing * (entries / hours)
+		#  The first poll of a run only tells us entries since some unknown time: just start the clock
+		self.lastPoll[feed] = polled
+		return
+
+	#  Seconds until the feed should be polled again, given its estimated rate
+	def interval(self, feed):
+		rate = self.rate.get(feed, self.defaultRate)
+		if rate <= 0.0:
+			return self.maxInterval
+		return min(max(self.targetEntries / rate * 3600.0, self.minInterval), self.maxInterval)
+
+	#  Put the feed in the queue, due at 'dueTime' (epoch seconds). Any earlier entry for it becomes stale.
+	def schedule(self, feed, dueTime):
+		self.due[feed] = dueTime
+		heapq.heappush(self.queue, (dueTime, feed))
+		return
+
+	#  Seconds until the next feed is due (0 if one is due already)
+	def secondsUntilDue(self):
+		while len(self.queue) > 0 and self.due.get(self.queue[0][1]) != self.queue[0][0]:
+			heapq.heappop(self.queue)		#  Drop stale entries
+		wait = self.nextRefresh - time.time()
+		if len(self.queue) > 0:
+			wait = min(wait, self.queue[0][0] - time.time())
+		return max(wait, 0)
+
+	#  (Re-)read the list of enabled feeds with their rates and due times. New feeds are due at once;
+	#  feeds no longer enabled drop out of the queue. Feeds whose circuit is open are due at their retry time,
+	#  and feeds a hub is pushing to us (see websub.py) once their subscription runs out.
+	def loadFeeds(self):
+		cursor = self.fetcher.link.cursor(MySQLdb.cursors.DictCursor)
+		query = 'SELECT feed, entry_rate, next_poll, retry_after, push_until FROM rss WHERE enabled = TRUE;'
+		cursor.execute(query)
+		rows = cursor.fetchall()
+		cursor.close()
+
+		self.fetcher.feeds = []				#  Refresh the fetcher's validators, failure counts and language statistics
+		self.fetcher.getFeeds()
+
+		now = time.time()
+		enabled = set()
+		for row in rows:
+			feed = row['feed']
+			enabled.add(feed)
+			if row['entry_rate'] is not None and feed not in self.rate:
+				self.rate[feed] = row['entry_rate']
+			pushedUntil = 0
+			if row['push_until'] is not None and self.fetcher.skipPushed:
+				pushedUntil = time.mktime(row['push_until'].timetuple())
+			if feed not in self.due:
+				dueTime = now
+				if row['next_poll'] is not None:
+					dueTime = time.mktime(row['next_poll'].timetuple())
+				if row['retry_after'] is not None:
+					dueTime = max(dueTime, time.mktime(row['retry_after'].timetuple()))
+				self.schedule(feed, max(dueTime, pushedUntil))
+			elif pushedUntil > self.due[feed]:	#  Subscribed since we last looked
+				self.schedule(feed, pushedUntil)
+
+		for feed in list(self.due.keys()):
+			if feed not in enabled:
+				del self.due[feed]			#  Its queue entry is now stale
+
+		if self.verbose:
+			print(str(len(self.due)) + ' feeds scheduled')
+		return
+
+	#  Write the given feeds' rates and due times back to the 'rss' table
+	def saveSchedule(self, feeds):
+		cursor = self.fetcher.link.cursor(MySQLdb.cursors.DictCursor)
+		rows = []
+		for feed in feeds:
+			nextPoll = None
+			if feed in self.due:
+				nextPoll = datetime.fromtimestamp(int(self.due[feed]))
+			rows.append( (self.rate.get(feed), nextPoll, feed) )
+		database.executeBatch(cursor, 'UPDATE rss SET entry_rate = %s, next_poll = %s WHERE feed = %s', rows)
+		self.fetcher.link.commit()
+		cursor.close()
+		return
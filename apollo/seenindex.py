@@ -0,0 +1,74 @@
+import os									#  Replace the index file atomically
+import cPickle								#  On-disk format of the index
+
+#  A persistent record of which entries we have already read from each source.
+#  Collectors check it BEFORE doing any real work on an entry (markup parsing, language detection,
+#  clean-up), so that the entries we saw on the last poll cost almost nothing on this one.
+#
+#  Entries are identified by 64-bit fingerprints (e.g. of an RSS entry's GUID and link), grouped by
+#  source key (e.g. the feed URL). For each source we keep only the identifiers present in its most
+#  recent poll: a feed only ever lists its latest entries, so anything older cannot come back to
+#  bother us, and the index stays as small as the feeds themselves.
+#
+#  Identifiers found during a poll are staged with record() and only become part of the index when
+#  commit() is called, which collectors do once the entries are safely in the database.
+#
+#  idx = SeenIndex('rss-seen.idx')
+#  idx.load()
+#  if not idx.contains(feed, [1234, 5678]): ...
+#  idx.record(feed, [1234, 5678])
+#  idx.commit()
+#  idx.save()
+class SeenIndex:
+	def __init__(self, path=None):
+		self.path = path					#  File holding the index between runs
+		self.seen = {}						#  [source key] ==> set of entry fingerprints
+		self.pending = {}					#  [source key] ==> set of entry fingerprints found this run
+		return
+
+	#  Read the index from self.path, if there is one yet
+	def load(self):
+		if self.path is not None and os.path.exists(self.path):
+			fh = open(self.path, 'rb')
+			self.seen = cPickle.load(fh)
+			fh.close()
+		return
+
+	#  Write the index to self.path. The file is replaced in one step, so a run that dies
+	#  while saving leaves the previous index intact.
+	def save(self):
+		if self.path is not None:
+			fh = open(self.path + '.tmp', 'wb')
+			cPickle.dump(self.seen, fh, cPickle.HIGHEST_PROTOCOL)
+			fh.close()
+			os.rename(self.path + '.tmp', self.path)
+		return
+
+	#  Return True if any of the given fingerprints was seen in this source's last poll
+	def contains(self, key, ids):
+		if key in self.seen:
+			for i in ids:
+				if i in self.seen[key]:
+					return True
+		return False
+
+	#  The fingerprints this source showed in its last poll (empty if it has not been polled yet)
+	def previous(self, key):
+		return self.seen.get(key, set())
+
+	#  Stage the fingerprints found in this source during the current poll
+	def record(self, key, ids):
+		if key not in self.pending:
+			self.pending[key] = set()
+		self.pending[key].update(ids)
+		return
+
+	#  Make staged fingerprints part of the index. If 'keys' is given, only those sources are committed.
+	def commit(self, keys=None):
+		if keys is None:
+			keys = list(self.pending.keys())
+		for key in keys:
+			if key in self.pending:
+				self.seen[key] = self.pending[key]
+				del self.pending[key]
+		return
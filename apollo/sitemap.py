@@ -0,0 +1,290 @@
+import re									#  Pick apart W3C date-times
+import zlib									#  Sitemaps are often served as .xml.gz files
+import xml.etree.cElementTree as ET			#  Streaming XML parser (iterparse)
+import MySQLdb								#  Used for DB operations
+import httpclient							#  Shared, kept-alive HTTP session
+from rss import FeedFetcher					#  Article schema, clean-up, language detection and de-duplication
+from datetime import datetime, timedelta	#  lastmod values, normalized to UTC
+
+#  Collects articles from news sitemaps (https://www.google.com/schemas/sitemap-news/0.9/), for outlets that
+#  publish one but no useful RSS. A sitemap is either a urlset (one <url> per article, with the news:title,
+#  news:publication_date, news:keywords and news:language of a news sitemap) or a sitemap index listing child
+#  sitemaps, each with the lastmod of its last change.
+#
+#  Only what changed is read: a child sitemap whose lastmod is the one we read last time is skipped without
+#  downloading it, and within a sitemap, URLs no newer than the newest one we stored from it are passed over.
+#  What we know about each sitemap is kept in the 'sitemap_state' table, written only once the articles read
+#  from it are stored.
+#
+#  Sitemaps are parsed as they download (iterparse), one <url> at a time, and articles are written in batches
+#  of streamBatchSize, so memory stays flat however many tens of thousands of URLs a sitemap lists.
+#
+#  Sitemaps carry no article text, so articles are stored with their title, keywords and publication date,
+#  and recognized by URL and title, like title-only RSS entries. A plain (non-news) sitemap gives no title, and
+#  its URLs are recognized by URL alone. Everything else (storage, near-duplicates,
+#  article_source) is FeedFetcher's.
+#
+#  fetcher = SitemapFetcher('localhost', 'censor', 'blockme', 'corpora')
+#  fetcher.openDB()
+#  fetcher.getSitemaps()
+#  fetcher.crawl()
+#  fetcher.closeDB()
+class SitemapFetcher(FeedFetcher):
+	def __init__(self, dbHost=None, dbUser=None, dbPword=None, dbTable=None):
+		FeedFetcher.__init__(self, dbHost, dbUser, dbPword, dbTable)
+		self.sitemaps = []					#  URLs of the sitemaps and sitemap indexes to read
+		self.sitemapState = {}				#  [sitemap URL] ==> (lastmod as its index declared it, newest URL lastmod read)
+		self.pendingSitemapState = {}		#  Same, learned this run but not yet written back
+		self.maxDepth = 3					#  How deeply sitemap indexes may nest
+		return
+
+	#  Read the sitemaps to crawl from the 'sitemap' table, and what we know of them from 'sitemap_state'
+	def getSitemaps(self):
+		if self.link is not None:
+			cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+			cursor.execute('SELECT url FROM sitemap WHERE enabled = TRUE;')
+			self.sitemaps = [x['url'] for x in cursor.fetchall()]
+			cursor.execute('SELECT url, declared, newest FROM sitemap_state;')
+			for row in cursor.fetchall():
+				self.sitemapState[row['url']] = (row['declared'], row['newest'])
+			cursor.close()
+			if self.verbose:
+				print(str(len(self.sitemaps)) + ' sitemaps to read')
+		elif self.verbose:
+			print('No target sitemaps found.')
+		return
+
+	#  Read every sitemap and store what is new. Returns the number of UNIQUE records added.
+	def crawl(self):
+		added = 0
+		if self.link is None:
+			if self.verbose:
+				print("\n" + 'NO CONNECTION TO DATABASE! CANNOT SAVE SCRAPED CONTENT!')
+			return added
+
+		self.startTimer()
+		cursor = self.link.cursor(MySQLdb.cursors.DictCursor)
+		totalRecords = 0
+		read = 0							#  Sitemaps read so far: numbers each one, as the same URL can come up twice
+		waiting = {}						#  [number] ==> [index URL, lastmod declared for it, children left, all read so far, its index's number]
+
+		#  One child of sitemap index 'index' (a number) is done with. An index is noted only once every child has
+		#  been read in full, and a failure anywhere below it leaves it (and the indexes above it) to be read again.
+		def settle(index, ok):
+			while index is not None:
+				state = waiting[index]
+				state[2] -= 1
+				state[3] = state[3] and ok
+				if state[2] > 0:
+					break
+				del waiting[index]
+				if state[3]:
+					self.noteSitemap(state[0], state[1])
+				index, ok = state[4], state[3]
+			return
+
+		for source in self.sitemaps:
+			pending = [(source, None, 0, None)]	#  (sitemap, lastmod its index declared, depth, that index's number)
+			while len(pending) > 0:
+				url, declared, depth, parent = pending.pop(0)
+				read += 1
+				batch = []
+				children = 0
+				try:
+					for kind, fields in self.readSitemap(url):
+						if kind == 'sitemap':
+							child = fields.get('loc')
+							if child is None or depth >= self.maxDepth:
+								continue
+							if fields.get('lastmod') is not None and \
+							   fields['lastmod'] == self.sitemapState.get(child, (None, None))[0]:
+								continue	#  Unchanged since we read it
+							pending.append( (child, fields.get('lastmod'), depth + 1, read) )
+							children += 1
+						else:
+							doc = self.urlDoc(source, url, fields)
+							if doc is None:
+								continue
+							batch.append(doc)
+							if len(batch) >= self.streamBatchSize:
+								totalRecords += len(batch)
+								added += self.writeBatch(cursor, batch)
+								batch = []
+					if children > 0:		#  Noted once its children are read (see settle())
+						waiting[read] = [url, declared, children, True, parent]
+					else:
+						self.noteSitemap(url, declared)
+						settle(parent, True)
+				except IOError as e:		#  Keep what was read, but read this sitemap in full next time
+					self.pendingSitemapState.pop(url, None)
+					#  Children listed before the failure are still read, but on their own account
+					pending = [x[:3] + (None, ) if x[3] == read else x for x in pending]
+					settle(parent, False)
+					if self.verbose:
+						print("\t" + 'Unable to read ' + url + ': ' + str(e))
+				if len(batch) > 0:
+					totalRecords += len(batch)
+					added += self.writeBatch(cursor, batch)
+				self.saveSitemapState(cursor)	#  Only now is this sitemap safely read
+				if self.verbose:
+					print(str(added) + ' new articles of ' + str(totalRecords) + ' read so far')
+
+		self.stopTimer()
+		if self.stopTime is not None and self.startTime is not None:
+			query  = 'INSERT INTO performance_metrics(process, parameter, date_started, sec)'
+			query += ' VALUES("collect-sitemap", ' + str(totalRecords) + ', "'
+			query +=   datetime.fromtimestamp(int(self.startTime)).strftime('%Y-%m-%d %H:%M:%S') + '", '
+			query +=   str(self.stopTime - self.startTime) + ');'
+			cursor.execute(query)
+			self.link.commit()
+		cursor.close()
+		return added
+
+	#  Download a sitemap and yield its entries as they are parsed: ('sitemap', fields) for each child of a
+	#  sitemap index, ('url', fields) for each URL of a urlset. 'fields' maps tag names, without their
+	#  namespaces, to text: 'loc', 'lastmod', and for news sitemaps 'title', 'publication_date', 'keywords',
+	#  'language' and 'name'. Raises IOError if the sitemap cannot be downloaded or parsed in full.
+	def readSitemap(self, url):
+		if self.verbose:
+			print(url)
+		response = httpclient.session().get(url, stream=True, timeout=(self.connectTimeout, self.readTimeout))
+		if response.status_code != 200:
+			response.close()
+			raise IOError('HTTP ' + str(response.status_code))
+
+		response.raw.decode_content = True	#  Undo any Content-Encoding; a .gz file is still gzip inside
+		stream = response.raw
+		if url.endswith('.gz') or 'gzip' in response.headers.get('content-type', ''):
+			stream = GunzipStream(stream)
+
+		root = None
+		fields = {}
+		try:
+			for event, elem in ET.iterparse(stream, events=('start', 'end')):
+				if root is None:
+					root = elem
+				if event != 'end':
+					continue
+				tag = elem.tag.rsplit('}', 1)[-1]
+				if tag in ('url', 'sitemap'):
+					yield tag, fields
+					fields = {}
+					root.clear()			#  Drop everything parsed so far: memory stays flat
+				elif elem.text is not None and elem.text.strip() != '':
+					fields[tag] = elem.text.strip()
+		except Exception as e:				#  Malformed, cut short or stalled
+			raise IOError(str(e))
+		finally:
+			response.close()
+
+	#  Build an article record (the same dictionary fetchFeedArticles() builds) from one <url> of sitemap 'url'.
+	#  Returns None for URLs no newer than the newest we stored from this sitemap.
+	def urlDoc(self, source, url, fields):
+		if 'loc' not in fields:
+			return None
+		modified = parseW3CDate(fields.get('lastmod') or fields.get('publication_date'))
+		if modified is not None:
+			previous = self.sitemapState.get(url, (None, None))[1]
+			if previous is not None and modified <= previous:
+				return None					#  Read on an earlier run
+			newest = self.pendingSitemapState.get(url, (None, None))[1]
+			if newest is None or modified > newest:
+				self.pendingSitemapState[url] = (None, modified)
+
+		title = None
+		if 'title' in fields:
+			title = self.cleanText(fields['title'])
+		keywords = None
+		if 'keywords' in fields:
+			keywords = self.cleanText(fields['keywords'])
+
+		lang = 'UNKNOWN'
+		langConfidence = 0.0
+		if title is not None:
+			lang, langConfidence = self.determineLanguage(title)
+
+		if self.verbose:
+			print("\t" + fields['loc'])
+
+		doc = {}
+		doc['rss'] = source					#  Save source for reference
+		doc['native'] = self.nativeText		#  How the text fields below are rendered
+		doc['url'] = fields['loc']
+		doc['hash_url'] = self.fingerprint(doc['url'])
+		doc['title'] = self.storable(title) if title is not None else None
+		doc['body'] = None
+		doc['minhash'] = None
+		doc['text'] = None					#  Sitemaps carry no article text
+		if title is not None:
+			doc['hash_content'] = self.fingerprint(title)
+		else:								#  A plain sitemap: the URL is all we know of the article
+			doc['hash_content'] = self.fingerprint(doc['url'])
+		doc['summary'] = None
+		doc['keyword'] = self.storable(keywords) if keywords is not None else None
+		doc['lang-claimed'] = self.storable(self.cleanText(fields['language'])) if 'language' in fields else None
+		doc['lang-detected'] = None if lang == 'UNKNOWN' else lang
+		doc['lang-confidence'] = 0.0 if lang == 'UNKNOWN' else langConfidence
+		published = parseW3CDate(fields.get('publication_date'))
+		if published is not None and published.year >= 1900:	#  strftime() refuses earlier years
+			doc['pub-date'] = published.strftime('%Y-%m-%d %H:%M:%S')	#  UTC, as MySQL DATETIME reads it
+		else:
+			doc['pub-date'] = None
+		doc['date-retrieved'] = datetime.now()
+		return doc
+
+	#  Record the lastmod a sitemap index declared for sitemap 'url', once it has been read
+	def noteSitemap(self, url, declared):
+		newest = self.pendingSitemapState.get(url, self.sitemapState.get(url, (None, None)))[1]
+		self.pendingSitemapState[url] = (declared, newest)
+		return
+
+	#  Write what we learned about each sitemap back to 'sitemap_state'
+	def saveSitemapState(self, cursor):
+		for url, (declared, newest) in self.pendingSitemapState.items():
+			query  = 'INSERT INTO sitemap_state(url, declared, newest) VALUES (%s, %s, %s)'
+			query += ' ON DUPLICATE KEY UPDATE declared = VALUES(declared), newest = VALUES(newest);'
+			cursor.execute(query, (url, declared, newest))
+			self.sitemapState[url] = (declared, newest)
+		self.pendingSitemapState = {}
+		self.link.commit()
+		return
+
+#  Decompresses a gzip stream as it is read. (gzip.GzipFile wants to seek, which a download cannot.)
+class GunzipStream:
+	def __init__(self, raw):
+		self.raw = raw						#  File-like object giving the compressed bytes
+		self.inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+		self.buffer = ''					#  Decompressed bytes not yet read
+		return
+
+	def read(self, size=65536):
+		while len(self.buffer) < size:
+			chunk = self.raw.read(65536)
+			if not chunk:
+				self.buffer += self.inflater.flush()
+				break
+			self.buffer += self.inflater.decompress(chunk)
+		data = self.buffer[:size]
+		self.buffer = self.buffer[size:]
+		return data
+
+#  Parse a W3C date-time (2018-02-21, 2018-02-21T09:56:00+08:00, 2018-02-21T01:56:00.123Z, ...) into a UTC
+#  datetime. Returns None if 'text' is missing or not a date.
+def parseW3CDate(text):
+	if text is None:
+		return None
+	match = re.match(r'(\d{4})-(\d\d)-(\d\d)(?:T(\d\d):(\d\d)(?::(\d\d)(?:\.\d+)?)?\s*(Z|[+-]\d\d:?\d\d)?)?$', text.strip())
+	if match is None:
+		return None
+	year, month, day, hour, minute, second, zone = match.groups()
+	try:
+		when = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+	except ValueError:
+		return None
+	if zone is not None and zone != 'Z':
+		offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[-2:]))
+		if zone[0] == '+':
+			when -= offset
+		else:
+			when += offset
+	return when
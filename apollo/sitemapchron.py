@@ -0,0 +1,27 @@
+import sys
+from sitemap import SitemapFetcher
+
+#  Read news sitemaps
+#  and show your work
+#  python sitemapchron.py y
+
+#  argv[0] = sitemapchron.py
+#  argv[1] = verbosity {Y/N}
+def main():
+	verbosity = False
+
+	if len(sys.argv) > 1:
+		if sys.argv[1].upper()[0] == 'Y':
+			verbosity = True
+
+	fetcher = SitemapFetcher('localhost', 'censor', 'blockme', 'corpora')
+	fetcher.verbose = verbosity
+	fetcher.openDB()
+	fetcher.getSitemaps()
+	added = fetcher.crawl()
+	if verbosity:
+		print(str(added) + ' new articles')
+	fetcher.closeDB()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,41 @@
+import re									#  Escape the legacy rendering
+
+#  Text columns (articles, weibo and freeweibo: title, content, summary, keyword, bag_of_words...) are
+#  stored in one of two ways, recorded per row in the 'native_text' column:
+#
+#    native_text = FALSE  (legacy)  The repr() of the text with its \u escapes doubled, inside a double-quoted
+#                                   SQL literal: u'\u4f0a\u6717' is stored as the ASCII string '\u4f0a\u6717'.
+#                                   Every CJK character costs six bytes, and every read must decode it again.
+#    native_text = TRUE             The text itself, UTF-8 in a utf8mb4 column: three bytes per CJK character,
+#                                   nothing to decode beyond the UTF-8.
+#
+#  Collectors write native rows when their 'nativeText' switch is on; readers handle both kinds, so the
+#  migration (textmigrate.py) can convert old rows while everything keeps running.
+#  Connections must use the utf8mb4 character set for native rows to survive the trip (database.connect() does).
+
+#  Render text the legacy way, ready to sit between double quotes in a query
+def legacyText(text):
+	safe = repr(text)[2:-1]
+	safe = re.sub(r'\"', '\\\"', safe)
+	safe = re.sub(r'\u', '\\u', safe)
+	return safe
+
+#  The legacy rendering as it ends up stored, for passing as a query parameter rather than inside a literal
+def legacyValue(text):
+	return text.encode('unicode-escape')
+
+#  Turn a stored value back into a unicode string. 'native' is the row's native_text flag.
+def readText(value, native):
+	if value is None:
+		return None
+	if native:
+		if isinstance(value, unicode):
+			return value
+		return value.decode('utf-8')
+	return value.decode('unicode-escape')
+
+#  Render text the native way: a quoted, escaped SQL literal. It comes back as unicode, so that it can be
+#  concatenated with the other (often unicode) pieces of a query; MySQLdb encodes the finished query in the
+#  connection's character set.
+def nativeLiteral(link, text):
+	return link.literal(text).decode('utf-8')
@@ -0,0 +1,3 @@
+#  Unit tests for the pure logic of the collectors: no network and no database.
+#  Run them from the apollo directory:
+#  python -m unittest discover -s tests -t .
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import re
+import unittest
+import bodystore
+from bodystore import BodyStore, CODEC_ZLIB, CODEC_ZSTD
+
+TEXTS = [u'Fish & chips prices rise', u'国务院发布新规定。' * 40, u'']
+
+#  The 'article_body' and 'body_dictionary' tables in memory, and the statements BodyStore sends them
+class FakeLink:
+	def __init__(self):
+		self.bodies = {}					#  [hash_content] ==> (codec, dict_id, body)
+		self.dictionaries = {}				#  [kp] ==> dict
+		self.commits = 0
+		return
+
+	def cursor(self, cursorClass=None):
+		return FakeCursor(self)
+
+	def commit(self):
+		self.commits += 1
+		return
+
+class FakeCursor:
+	def __init__(self, link):
+		self.link = link
+		self.rows = []
+		self.rowcount = 0
+		return
+
+	def execute(self, query, args=None):
+		if query.startswith('SELECT hash_content, codec, dict_id, body FROM article_body'):
+			refs = [int(x) for x in re.findall(r'\d+', query[query.find(' IN (') + 5:])]
+			self.rows = [{'hash_content': x, 'codec': self.link.bodies[x][0], 'dict_id': self.link.bodies[x][1], \
+			              'body': self.link.bodies[x][2]} for x in refs if x in self.link.bodies]
+		elif query.startswith('SELECT kp FROM body_dictionary'):
+			self.rows = [{'kp': x} for x in sorted(self.link.dictionaries.keys(), reverse=True)[:1]]
+		elif query.startswith('SELECT dict FROM body_dictionary'):
+			self.rows = [{'dict': self.link.dictionaries[x]} for x in args if x in self.link.dictionaries]
+		elif query.startswith('INSERT INTO body_dictionary'):
+			self.link.dictionaries[len(self.link.dictionaries) + 1] = args[0]
+		return
+
+	def executemany(self, query, rows):
+		self.rowcount = 0
+		for ref, codec, dictId, body in rows:	#  INSERT IGNORE: bodies already stored are left alone
+			if ref not in self.link.bodies:
+				self.link.bodies[ref] = (codec, dictId, body)
+				self.rowcount += 1
+		return
+
+	def fetchall(self):
+		return self.rows
+
+	def close(self):
+		return
+
+#  Bodies round-trip through the store whichever codec wrote them (bodystore.py)
+class BodyStoreTest(unittest.TestCase):
+	def setUp(self):
+		self.link = FakeLink()
+		self.zstandard = bodystore.zstandard
+		return
+
+	def tearDown(self):
+		bodystore.zstandard = self.zstandard
+		return
+
+	def roundTrip(self, store):
+		cursor = self.link.cursor()
+		bodies = [(i + 1, text) for i, text in enumerate(TEXTS)]
+		self.assertEqual(store.store(cursor, bodies + bodies[:1]), len(TEXTS))	#  Each body compressed once
+		found = store.fetch(cursor, [x[0] for x in bodies] + [99, None])
+		self.assertEqual(found, dict(bodies))
+		self.assertTrue(all([isinstance(x, unicode) for x in found.values()]))
+		return
+
+	#  Without zstandard, bodies are zlib-compressed, and still come back
+	def testZlibFallback(self):
+		bodystore.zstandard = None
+		store = BodyStore(self.link)
+		self.assertFalse(store.useZstd)
+		self.roundTrip(store)
+		self.assertEqual(set([x[:2] for x in self.link.bodies.values()]), set([(CODEC_ZLIB, 0)]))
+		self.assertTrue(len(self.link.bodies[2][2]) < len(TEXTS[1].encode('utf-8')))
+		self.assertEqual(store.trainDictionary(TEXTS), 0)	#  Nothing to train without zstandard
+		return
+
+	#  A body written with zstd cannot be read without it, and says so
+	def testZstdMissing(self):
+		bodystore.zstandard = None
+		store = BodyStore(self.link)
+		self.link.bodies[1] = (CODEC_ZSTD, 0, 'not really zstd')
+		self.assertRaises(RuntimeError, store.fetch, self.link.cursor(), [1])
+		return
+
+	@unittest.skipIf(bodystore.zstandard is None, 'zstandard is not installed')
+	def testZstd(self):
+		store = BodyStore(self.link)
+		self.assertTrue(store.useZstd)
+		self.roundTrip(store)
+		self.assertEqual(set([x[:2] for x in self.link.bodies.values()]), set([(CODEC_ZSTD, 0)]))
+		return
+
+	#  Bodies written under an older dictionary, or with zlib, stay readable once a new dictionary is trained
+	@unittest.skipIf(bodystore.zstandard is None, 'zstandard is not installed')
+	def testZstdDictionary(self):
+		store = BodyStore(self.link)
+		cursor = self.link.cursor()
+		store.useZstd = False
+		store.store(cursor, [(1, TEXTS[0])])
+		store.useZstd = True
+		store.store(cursor, [(2, TEXTS[1])])
+		samples = [u'Story number %d: %s' % (i, TEXTS[i % 2]) for i in range(0, 2000)]
+		store.dictSize = 4096				#  Small enough for this handful of samples
+		self.assertEqual(store.trainDictionary(samples), 1)
+		store.store(cursor, [(3, samples[7])])
+		self.assertEqual(self.link.bodies[3][:2], (CODEC_ZSTD, 1))
+
+		fresh = BodyStore(self.link)		#  Another process, reading what this one wrote
+		self.assertEqual(fresh.dictId, 1)
+		self.assertEqual(fresh.fetch(self.link.cursor(), [1, 2, 3]), {1: TEXTS[0], 2: TEXTS[1], 3: samples[7]})
+		return
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import unittest
+from cleaner import TextCleaner
+from cleanbench import SAMPLES, legacyClean	#  The multi-pass clean-up TextCleaner replaced
+
+#  TextCleaner against the clean-up it replaced (cleanbench.legacyClean()), and its own rules
+class TextCleanerTest(unittest.TestCase):
+	def setUp(self):
+		self.cleaner = TextCleaner()
+		return
+
+	#  With no replacement table the two must agree. The only difference: a trailing line break becomes a
+	#  space, where the old splitlines() dropped it.
+	def testMatchesLegacy(self):
+		bare = TextCleaner({})
+		texts = SAMPLES + [u'a<!-- comment -->b', u'<![CDATA[x < y]]>', u'Tom\xa0&nbsp;Jerry', u'&#x4e2d;&#20013;', \
+		                   u'line\r\nbreak\nhere', u'<a href="x">link</a> &lt;tag&gt;', u'caf&eacute; &apos;']
+		for text in texts:
+			self.assertEqual(bare.clean(text).rstrip(u' '), legacyClean(text, {}))
+		return
+
+	#  The old clean-up applied the table after BeautifulSoup had decoded every entity, so entries keyed by
+	#  entities never matched. TextCleaner applies them, whichever entity the character is written as;
+	#  the character written out as itself is left alone.
+	def testReplacementTable(self):
+		self.assertEqual(self.cleaner.clean(u'Fish &amp; chips&#8212;again'), u'Fish & chips--again')
+		self.assertEqual(self.cleaner.clean(u'dash &mdash; dash &#x2014; dash —'), u'dash -- dash -- dash —')
+		self.assertEqual(self.cleaner.clean(u'no&nbsp;break'), u'nobreak')
+		self.assertEqual(TextCleaner({u'foo': u'bar'}).clean(u'<b>food</b>'), u'bard')
+		return
+
+	def testUnknownEntityKept(self):
+		self.assertEqual(self.cleaner.clean(u'&bogus; &#xZZ; &'), u'&bogus; &#xZZ; &')
+		return
+
+	def testKeepTags(self):
+		text = u'<p>Fish &amp; chips&#8212;again&nbsp;</p>\n'
+		self.assertEqual(self.cleaner.clean(text, False), u'<p>Fish & chips--again&nbsp;</p> ')
+		self.assertEqual(self.cleaner.clean(text, False, False, False), text)
+		return
+
+	def testLineBreaks(self):
+		self.assertEqual(self.cleaner.clean(u'one\ntwo\r\nthree four'), u'one two three four')
+		self.assertEqual(self.cleaner.clean(u'one\ntwo', True, False), u'one\ntwo')
+		return
+
+	def testByteStrings(self):
+		self.assertEqual(self.cleaner.clean('<p>\xe4\xb8\xad\xe6\x96\x87</p>'), u'中文')
+		self.assertIsNone(self.cleaner.clean(None))
+		return
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,150 @@
+import unittest
+import MySQLdb
+import database
+
+#  A connection that remembers what was done to it
+class FakeLink:
+	def __init__(self, alive=True):
+		self.alive = alive					#  Whether ping() succeeds
+		self.commits = 0
+		self.rollbacks = 0
+		self.closed = False
+		self.cursorClass = None
+		return
+
+	def ping(self):
+		if not self.alive:
+			raise MySQLdb.Error('MySQL server has gone away')
+		return
+
+	def commit(self):
+		self.commits += 1
+		return
+
+	def rollback(self):
+		self.rollbacks += 1
+		return
+
+	def close(self):
+		self.closed = True
+		return
+
+	def cursor(self, cursorClass=None):
+		self.cursorClass = cursorClass
+		return self
+
+#  Records each executemany(), and reports every row as affected
+class FakeCursor:
+	def __init__(self):
+		self.calls = []						#  (query, rows)
+		self.rowcount = -1
+		return
+
+	def executemany(self, query, rows):
+		self.calls.append( (query, list(rows)) )
+		self.rowcount = len(rows)
+		return
+
+#  Connection pooling, batched statements and batched commits (database.py)
+class DatabaseTest(unittest.TestCase):
+	def setUp(self):
+		self.opened = []
+		self.connect = MySQLdb.connect
+		def connect(*args, **kwargs):
+			self.opened.append(FakeLink())
+			return self.opened[-1]
+		MySQLdb.connect = connect
+		return
+
+	def tearDown(self):
+		MySQLdb.connect = self.connect
+		database.pools.clear()
+		database.owners.clear()
+		return
+
+	def testExecuteBatchChunks(self):
+		cursor = FakeCursor()
+		rows = [(i, 'http://news.example.org/') for i in range(0, 1201)]
+		query = 'INSERT INTO article_source(article_id, source) VALUES (%s, %s)'
+		self.assertEqual(database.executeBatch(cursor, query, rows), 1201)
+		self.assertEqual([len(x[1]) for x in cursor.calls], [500, 500, 201])
+		self.assertEqual(sum([x[1] for x in cursor.calls], []), rows)
+		self.assertEqual(set([x[0] for x in cursor.calls]), set([query]))
+
+		cursor = FakeCursor()
+		self.assertEqual(database.executeBatch(cursor, query, rows[:10], chunk=4), 10)
+		self.assertEqual([len(x[1]) for x in cursor.calls], [4, 4, 2])
+		self.assertEqual(database.executeBatch(FakeCursor(), query, []), 0)
+		return
+
+	#  Every chunk counts towards the next commit
+	def testExecuteBatchCommits(self):
+		link = FakeLink()
+		commits = database.CommitBatcher(link, 500)
+		database.executeBatch(FakeCursor(), 'DELETE FROM minhash WHERE kp = %s', [(i, ) for i in range(0, 1250)], commits, 250)
+		self.assertEqual(link.commits, 2)
+		self.assertEqual(commits.pending, 250)
+		commits.flush()
+		self.assertEqual(link.commits, 3)
+		return
+
+	def testCommitBatcher(self):
+		link = FakeLink()
+		commits = database.CommitBatcher(link, 3)
+		commits.wrote()
+		commits.wrote()
+		self.assertEqual(link.commits, 0)
+		commits.wrote()
+		self.assertEqual(link.commits, 1)
+		self.assertEqual(commits.pending, 0)
+		commits.wrote(7)					#  A large write commits at once
+		self.assertEqual(link.commits, 2)
+		commits.flush()
+		commits.flush()						#  Nothing outstanding: no empty commits
+		self.assertEqual(link.commits, 2)
+		commits.wrote()
+		commits.flush()
+		self.assertEqual(link.commits, 3)
+
+		every = database.CommitBatcher(link, 1)
+		every.wrote()
+		every.wrote()
+		self.assertEqual(link.commits, 5)
+		return
+
+	#  Released connections are re-used (after a rollback), dead ones replaced, and at most 'size' kept idle
+	def testConnectionPool(self):
+		first = database.connect('localhost', 'censor', 'blockme', 'corpora')
+		database.release(first)
+		self.assertEqual(first.rollbacks, 1)
+		self.assertIs(database.connect('localhost', 'censor', 'blockme', 'corpora'), first)
+		self.assertEqual(len(self.opened), 1)
+
+		first.alive = False					#  Dropped while idle
+		database.release(first)
+		second = database.connect('localhost', 'censor', 'blockme', 'corpora')
+		self.assertIsNot(second, first)
+		self.assertTrue(first.closed)
+		self.assertEqual(len(self.opened), 2)
+
+		other = database.connect('localhost', 'censor', 'blockme', 'news')
+		self.assertIsNot(other, second)		#  One pool per database
+
+		links = [second] + [database.connect('localhost', 'censor', 'blockme', 'corpora') for i in range(0, 5)]
+		for link in links:
+			database.release(link)
+		self.assertEqual([x.closed for x in links], [False] * 4 + [True] * 2)
+
+		stranger = FakeLink()				#  Not from a pool: just closed
+		database.release(stranger)
+		self.assertTrue(stranger.closed)
+		return
+
+	def testStreamingCursor(self):
+		link = FakeLink()
+		database.streamingCursor(link)
+		self.assertIs(link.cursorClass, MySQLdb.cursors.SSDictCursor)
+		return
+
+if __name__ == '__main__':
+	unittest.main()
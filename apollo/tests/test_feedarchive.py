@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+import rss									#  parseFeed() and initParser(), as the parse workers run them
+from rss import FeedFetcher
+from feedarchive import FeedArchive
+
+FEED = 'http://news.example.org/rss.xml'
+
+#  A small RSS 2.0 body, in the shape our feeds deliver: HTML summaries, one story in Chinese
+BODY = '''<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel>
+<title>Example News</title>
+<link>http://news.example.org/</link>
+<item>
+<title>Fish &amp; chips prices rise</title>
+<link>http://news.example.org/fish-and-chips</link>
+<guid>http://news.example.org/fish-and-chips</guid>
+<description>&lt;p&gt;The price of fish and chips rose again this week, officials said on Tuesday.&lt;/p&gt;</description>
+</item>
+<item>
+<title>国务院发布新规定</title>
+<link>http://news.example.org/guowuyuan</link>
+<guid>http://news.example.org/guowuyuan</guid>
+<description>中华人民共和国国务院今天发布了新的规定。</description>
+</item>
+</channel></rss>'''
+
+#  Archiving raw feed bodies (feedarchive.py) and replaying them through the parser, as rssreplay.py does
+class FeedArchiveTest(unittest.TestCase):
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.archive = FeedArchive(self.path)
+		return
+
+	def tearDown(self):
+		shutil.rmtree(self.path)
+		return
+
+	def testReplayInOrder(self):
+		self.archive.store(FEED, BODY, {'etag': '"abc"'})
+		self.archive.store('http://other.example.org/feed', 'other body', None)
+		self.archive.store(FEED, BODY, {'etag': '"abc"'})
+		replayed = list(self.archive.replay())
+		self.assertEqual([x[0] for x in replayed], [FEED, 'http://other.example.org/feed', FEED])
+		self.assertEqual(replayed[0][1], BODY)
+		self.assertEqual(replayed[0][2], {'etag': '"abc"'})
+		self.assertEqual(replayed[1][2], {})
+		return
+
+	#  A body returned by several polls is stored once
+	def testBodiesStoredOnce(self):
+		first = self.archive.store(FEED, BODY, {})
+		second = self.archive.store(FEED, BODY, {})
+		self.assertEqual(first, second)
+		self.assertEqual(len(os.listdir(os.path.join(self.path, 'bodies', first[:2]))), 1)
+		self.assertEqual(self.archive.load(first), BODY)
+		return
+
+	def testReplayMissingDay(self):
+		self.assertEqual(list(self.archive.replay('2018-02-21')), [])
+		self.assertEqual(self.archive.days(), [])
+		return
+
+	#  An archived body parses to the same docs in a parse worker (parseFeed()) as in the fetcher itself
+	def testReplayThroughParseFeed(self):
+		self.archive.store(FEED, BODY, {'content-type': 'application/rss+xml; charset=utf-8'})
+		fetcher = FeedFetcher()
+		settings = {}
+		for k in rss.PARSER_SETTINGS:
+			settings[k] = getattr(fetcher, k)
+		rss.initParser(settings)
+
+		for feed, body, headers in self.archive.replay():
+			result = rss.parseFeed( (feed, body, headers, None, None, None, None) )
+			feed, docs, entryIds, stats, mark, hub, error = result
+			self.assertIsNone(error)
+			self.assertEqual(feed, FEED)
+			self.assertEqual([x['url'] for x in docs], ['http://news.example.org/fish-and-chips', \
+			                                            'http://news.example.org/guowuyuan'])
+			self.assertEqual(docs[0]['hash_url'], fetcher.fingerprint(docs[0]['url']))
+			self.assertEqual(docs[0]['title'], fetcher.storable(u'Fish & chips prices rise'))
+			self.assertEqual(docs[1]['title'], fetcher.storable(u'国务院发布新规定'))
+
+			direct = fetcher.fetchFeedArticles(feed, body, headers)
+			self.assertEqual([(x['url'], x['hash_content'], x['title']) for x in docs], \
+			                 [(x['url'], x['hash_content'], x['title']) for x in direct])
+
+			#  Replayed again with what that parse saw: nothing new
+			again = rss.parseFeed( (feed, body, headers, entryIds, stats, mark, hub) )
+			self.assertEqual(again[1], [])
+		return
+
+if __name__ == '__main__':
+	unittest.main()
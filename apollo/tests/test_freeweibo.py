@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+import httpclient
+import freeweibo
+from freeweibo import FreeWeiboFetcher, FREEWEIBO_URL
+
+TOPIC = 'weibo/%E8%96%84'
+WHEN = datetime(2018, 2, 21, 9, 56)
+
+#  [page body] ==> (posts, hot topics) as readPage() would return them
+PAGES = {'front':  ([(1, u'<p>一</p>', 11, WHEN), (2, u'<p>二</p>', 12, WHEN)], [(u'薄', TOPIC)]),
+         'front2': ([(1, u'<p>一</p>', 11, WHEN), (6, u'<p>六</p>', 16, WHEN)], [(u'薄', TOPIC)]),
+         'topic1': ([(3, u'<p>三</p>', 13, WHEN), (4, u'<p>四</p>', 14, WHEN)], []),
+         'topic2': ([(3, u'<p>三</p>', 13, WHEN), (5, u'<p>五</p>', 15, WHEN)], [])}
+
+class Response:
+	def __init__(self, body):
+		self.content = body
+		self.status_code = 200
+		self.encoding = 'utf-8'
+
+class Session:
+	def __init__(self, served):
+		self.served = served				#  [URL] ==> page body
+
+	def get(self, url, timeout=None):
+		return Response(self.served[url])
+
+#  Which FreeWeibo pages and posts are read from one poll to the next (the seen index), and how posts are hashed
+class FreeWeiboFetcherTest(unittest.TestCase):
+	def setUp(self):
+		self.path = tempfile.mkdtemp()
+		self.served = {FREEWEIBO_URL: 'front', FREEWEIBO_URL + TOPIC: 'topic1'}
+		self.session = httpclient.session
+		httpclient.session = lambda: Session(self.served)
+		return
+
+	def tearDown(self):
+		httpclient.session = self.session
+		shutil.rmtree(self.path)
+		return
+
+	#  One poll, as freeweibochron.py runs it, without the database. Returns the fetcher.
+	def poll(self):
+		fetcher = FreeWeiboFetcher()
+		fetcher.crawlTopics = True
+		fetcher.openSeenIndex(os.path.join(self.path, 'seen.idx'))
+		fetcher.readPage = lambda page: PAGES[page.content]
+		fetcher.downloadPages = lambda urls: [(x, Response(self.served[x])) for x in urls]
+		fetcher.fetch()
+		fetcher.seenIndex.commit()			#  As finishSave() does once the posts are stored
+		fetcher.seenIndex.save()
+		return fetcher
+
+	def testUnchangedPagesKeepTheirPosts(self):
+		fetcher = self.poll()
+		self.assertEqual([x['data-id'] for x in fetcher.posts], [1, 2, 3, 4])
+		self.assertEqual(len(fetcher.topics), 1)
+
+		fetcher = self.poll()				#  Nothing changed: nothing read, nothing forgotten
+		self.assertTrue(fetcher.pageUnchanged)
+		self.assertEqual(fetcher.posts, [])
+		self.assertEqual(fetcher.topics, [])
+		self.assertEqual(fetcher.seenIndex.seen[freeweibo.POSTS_KEY], set([1, 2, 3, 4]))
+
+		fetcher = self.poll()
+		self.assertEqual(fetcher.seenIndex.seen[freeweibo.POSTS_KEY], set([1, 2, 3, 4]))
+		return
+
+	#  A topic page skipped as unchanged still lists its posts: they stay seen when the front page moves on
+	def testSkippedPageCarriesPosts(self):
+		self.poll()
+		self.served[FREEWEIBO_URL] = 'front2'
+		fetcher = self.poll()
+		self.assertFalse(fetcher.pageUnchanged)
+		self.assertEqual([x['data-id'] for x in fetcher.posts], [6])
+		self.assertEqual(fetcher.seenIndex.seen[freeweibo.POSTS_KEY], set([1, 3, 4, 6]))
+
+		fetcher = self.poll()
+		self.assertEqual(fetcher.posts, [])
+		return
+
+	#  Topic pages change on their own: they are read even when the front page has not changed
+	def testTopicPagesReadOnUnchangedFrontPage(self):
+		self.poll()
+		self.served[FREEWEIBO_URL + TOPIC] = 'topic2'
+		fetcher = self.poll()
+		self.assertTrue(fetcher.pageUnchanged)
+		self.assertEqual([x['data-id'] for x in fetcher.posts], [5])
+		self.assertEqual(fetcher.seenIndex.seen[freeweibo.POSTS_KEY], set([1, 2, 3, 5]))
+		return
+
+	#  The post hash is a stable digest of the text, whichever way the text is stored
+	def testPostHash(self):
+		fetcher = self.poll()
+		post = fetcher.posts[0]
+		self.assertEqual(post['hash'], fetcher.fingerprint(post['text']))
+		self.assertEqual(fetcher.fingerprint('abc'), 0x900150983cd24fb0)
+		return
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,115 @@
+import socket
+import threading
+import unittest
+import BaseHTTPServer
+import requests
+import httpclient
+
+HOST = 'news.example.test'					#  Resolves to 127.0.0.1, but only through the stand-in getaddrinfo()
+
+#  Answers every GET with 'ok', and remembers the Host header each one sent
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+	def do_GET(self):
+		self.server.hosts.append(self.headers.getheader('host'))
+		self.send_response(200)
+		self.send_header('Content-Length', '2')
+		self.end_headers()
+		self.wfile.write('ok')
+
+	def log_message(self, format, *args):
+		return
+
+#  The shared session's DNS cache (httpclient.py)
+class HTTPClientTest(unittest.TestCase):
+	def setUp(self):
+		self.getaddrinfo = socket.getaddrinfo
+		self.looked = []					#  Look-ups of HOST
+		def getaddrinfo(host, port, *args, **kwargs):
+			if host != HOST:
+				return self.getaddrinfo(host, port, *args, **kwargs)
+			self.looked.append(port)
+			return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', ('127.0.0.1', port))]
+		socket.getaddrinfo = getaddrinfo
+		self.dnsTTL = httpclient.dnsTTL
+		self.dnsHosts = httpclient.dnsHosts
+		httpclient.flushDNS()
+		return
+
+	def tearDown(self):
+		socket.getaddrinfo = self.getaddrinfo
+		httpclient.dnsTTL = self.dnsTTL
+		httpclient.dnsHosts = self.dnsHosts
+		httpclient.flushDNS()
+		return
+
+	#  A look-up is re-used until it expires
+	def testLookup(self):
+		self.assertEqual(httpclient.lookup(HOST, 80), '127.0.0.1')
+		self.assertEqual(httpclient.lookup(HOST, 80), '127.0.0.1')
+		self.assertEqual(self.looked, [80])
+		self.assertEqual(httpclient.lookup(HOST, 8080), '127.0.0.1')	#  Cached per port
+		self.assertEqual(self.looked, [80, 8080])
+
+		httpclient.dnsTTL = -1				#  Expired as soon as stored
+		httpclient.flushDNS()
+		httpclient.lookup(HOST, 80)
+		httpclient.lookup(HOST, 80)
+		self.assertEqual(self.looked, [80, 8080, 80, 80])
+		return
+
+	#  Names that do not resolve are handed back as they are, and not cached
+	def testFailedLookup(self):
+		self.assertEqual(httpclient.lookup('nowhere.invalid', 80), 'nowhere.invalid')
+		self.assertEqual(httpclient.resolved, {})
+		return
+
+	#  Once full, the cache drops the entry closest to expiry
+	def testEviction(self):
+		httpclient.dnsHosts = 2
+		httpclient.lookup(HOST, 1)
+		httpclient.lookup('127.0.0.1', 2)
+		httpclient.lookup(HOST, 3)
+		self.assertEqual(sorted(httpclient.resolved.keys()), [('127.0.0.1', 2), (HOST, 3)])
+		return
+
+	#  New connections of a session go to the cached address; the request itself still names the host
+	def testSession(self):
+		server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+		server.hosts = []
+		t = threading.Thread(target=server.serve_forever)
+		t.daemon = True
+		t.start()
+		port = server.server_address[1]
+		url = 'http://%s:%d/feed.xml' % (HOST, port)
+		try:
+			for i in range(0, 3):			#  A new session each time: a new connection each time
+				response = httpclient.newSession().get(url, timeout=(10, 10))
+				self.assertEqual(response.status_code, 200)
+				self.assertEqual(response.text, 'ok')
+		finally:
+			server.shutdown()
+			server.server_close()
+		self.assertEqual(self.looked, [port])
+		self.assertIn((HOST, port), httpclient.resolved)
+		self.assertEqual(server.hosts, ['%s:%d' % (HOST, port)] * 3)
+		return
+
+	#  A connection that fails drops its host from the cache, and fails the way urllib3 would have
+	def testConnectionFailure(self):
+		s = socket.socket()
+		s.bind(('127.0.0.1', 0))
+		port = s.getsockname()[1]
+		s.close()							#  Nothing listens there now
+		self.assertRaises(requests.exceptions.ConnectionError, httpclient.newSession().get, \
+		                  'http://%s:%d/' % (HOST, port), timeout=(10, 10))
+		self.assertNotIn((HOST, port), httpclient.resolved)
+		self.assertEqual(self.looked, [port])
+		return
+
+	def testAcceptEncoding(self):
+		self.assertIn('gzip', httpclient.newSession().headers['Accept-Encoding'])
+		self.assertEqual('br' in httpclient.acceptEncoding(), httpclient.brotli is not None)
+		return
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import unittest
+import minhash
+
+ARTICLE = u'Officials said on Tuesday that talks between the two governments would resume soon, though no date ' \
+          u'has been set and neither side would say where the meeting might take place or who would attend it'
+
+#  MinHash signatures and their bands (minhash.py)
+class MinHashTest(unittest.TestCase):
+	def testTokenize(self):
+		self.assertEqual(minhash.tokenize(u'The quick, brown fox!'), [u'the', u'quick', u'brown', u'fox'])
+		self.assertEqual(minhash.tokenize(u'国务院 said'), [u'国', u'务', u'院', u'said'])
+		return
+
+	def testSignature(self):
+		sig = minhash.signature(ARTICLE)
+		self.assertEqual(len(sig), minhash.PERMUTATIONS)
+		self.assertEqual(list(sig), list(minhash.signature(ARTICLE.encode('utf-8'))))
+		self.assertIsNone(minhash.signature(u' ... '))
+		self.assertEqual(list(minhash.unpack(minhash.pack(sig))), list(sig))
+		self.assertEqual(len(minhash.pack(sig)), 4 * minhash.PERMUTATIONS)
+		return
+
+	#  A copy with a byline added shares at least one band with the original; an unrelated text shares none
+	def testBands(self):
+		sig = minhash.signature(ARTICLE)
+		copy = minhash.signature(u'By our correspondent. ' + ARTICLE)
+		other = minhash.signature(u'The price of fish and chips rose again this week across the north of England, ' \
+		                          u'where a poor catch and the cost of cooking oil have pushed up what shops pay')
+		bands = minhash.bands(sig)
+		self.assertEqual([x[0] for x in bands], range(0, minhash.BANDS))
+		self.assertEqual(bands, minhash.bands(minhash.signature(ARTICLE)))
+		self.assertTrue(len(set(bands) & set(minhash.bands(copy))) > 0)
+		self.assertEqual(len(set(bands) & set(minhash.bands(other))), 0)
+		return
+
+	def testSimilarity(self):
+		sig = minhash.signature(ARTICLE)
+		self.assertEqual(minhash.similarity(sig, sig), 1.0)
+		self.assertTrue(minhash.similarity(sig, minhash.signature(u'By our correspondent. ' + ARTICLE)) > 0.6)
+		self.assertTrue(minhash.similarity(sig, minhash.signature(u'Something else entirely, about the weather')) < 0.2)
+		return
+
+if __name__ == '__main__':
+	unittest.main()
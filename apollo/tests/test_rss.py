@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import hashlib
+import threading
+import unittest
+from datetime import datetime
+import httpclient
+import rss
+from rss import FeedFetcher
+
+#  Just enough of a MySQL link to run FeedFetcher.writeBatch(): the 'articles' and 'article_source' tables
+#  in memory, and the handful of statements writeBatch() sends them
+class FakeLink:
+	def __init__(self):
+		self.articles = []					#  (kp, hash_url, hash_content)
+		self.sources = set()				#  (article_id, source)
+		self.inserts = 0					#  INSERT INTO articles statements run
+		self.commits = 0
+		return
+
+	def cursor(self, cursorClass=None):
+		return FakeCursor(self)
+
+	def commit(self):
+		self.commits += 1
+		return
+
+class FakeCursor:
+	def __init__(self, link):
+		self.link = link
+		self.rows = []
+		self.rowcount = 0
+		return
+
+	def execute(self, query, args=None):
+		ids = [int(x) for x in re.findall(r'\d+', query[query.find(' IN (') + 5:])] if ' IN (' in query else []
+		if query.startswith('SELECT kp, hash_url, hash_content FROM articles'):
+			self.rows = [{'kp': x[0], 'hash_url': x[1], 'hash_content': x[2]} for x in self.link.articles if x[1] in ids]
+		elif query.startswith('SELECT article_id, source FROM article_source'):
+			self.rows = [{'article_id': x[0], 'source': x[1]} for x in self.link.sources if x[0] in ids]
+		elif query.startswith('INSERT INTO articles('):
+			self.link.inserts += 1
+			for hashUrl, hashContent in re.findall(r'\("[^"]*", (\d+), (\d+),', query):
+				self.link.articles.append( (len(self.link.articles) + 1, int(hashUrl), int(hashContent)) )
+		return
+
+	def executemany(self, query, rows):
+		if query.startswith('INSERT INTO article_source'):
+			self.link.sources.update(rows)
+		self.rowcount = len(rows)
+		return
+
+	def fetchall(self):
+		return self.rows
+
+	def close(self):
+		return
+
+#  A streamed requests response, as downloadFeed() reads it
+class FakeResponse:
+	def __init__(self, status, body='', headers=None):
+		self.status_code = status
+		self.body = body
+		self.headers = headers or {}
+		return
+
+	def iter_content(self, size):
+		return [self.body[i:i + size] for i in range(0, len(self.body), size)]
+
+	def close(self):
+		return
+
+#  Serves the same response to every request, and remembers the headers each request sent
+class FakeSession:
+	def __init__(self, response):
+		self.response = response
+		self.sent = []
+		return
+
+	def get(self, url, headers=None, **kwargs):
+		self.sent.append(headers)
+		return self.response
+
+#  An archive on a full disk
+class FullArchive:
+	def store(self, feed, body, headers, bodyHash=None):
+		raise IOError('No space left on device')
+
+RSS = '<rss version="2.0"><channel><item><title>Headline</title><link>http://a.example.org/1</link></item></channel></rss>'
+
+#  Stands in for parseFeed() in the parse pool, failing in every way a worker can fail to report back
+def brokenParse(job):
+	feed = job[0]
+	if feed.endswith('/raise'):
+		raise RuntimeError('escaped parseFeed()')
+	if feed.endswith('/unpicklable'):
+		return lambda: None
+	if feed.endswith('/killed'):
+		os._exit(1)
+	return realParse(job)
+realParse = rss.parseFeed
+
+#  Fingerprints and the set-based save path of FeedFetcher
+class FeedFetcherTest(unittest.TestCase):
+	def setUp(self):
+		self.fetcher = FeedFetcher()
+		self.fetcher.collapseNear = False
+		self.fetcher.link = FakeLink()
+		self.session = httpclient.session
+		return
+
+	def tearDown(self):
+		httpclient.session = self.session
+		return
+
+	#  Make downloadFeed() get 'response'. Returns the session, to see what was sent.
+	def serve(self, response):
+		session = FakeSession(response)
+		httpclient.session = lambda: session
+		return session
+
+	#  A doc as fetchFeedArticles() builds it
+	def doc(self, feed, url, text):
+		return {'rss': feed, 'native': False, 'url': url, 'hash_url': self.fetcher.fingerprint(url), \
+		        'title': self.fetcher.storable(u'Title'), 'text': self.fetcher.storable(text), \
+		        'hash_content': self.fetcher.fingerprint(text), 'body': None, 'minhash': None, 'summary': None, \
+		        'keyword': None, 'lang-claimed': None, 'lang-detected': 'en', 'lang-confidence': 0.9, \
+		        'pub-date': None, 'date-retrieved': datetime(2018, 2, 21, 9, 56)}
+
+	#  The first 8 bytes of the MD5, the same in every process: stored rows depend on it
+	def testFingerprint(self):
+		self.assertEqual(self.fetcher.fingerprint('abc'), 0x900150983cd24fb0)
+		self.assertEqual(self.fetcher.fingerprint(u'国务院'), self.fetcher.fingerprint(u'国务院'.encode('utf-8')))
+		self.assertTrue(0 <= self.fetcher.fingerprint(u'国务院') < 2 ** 64)
+		return
+
+	def testMultiRowInserts(self):
+		rows = ['(' + str(i) * 20 + ')' for i in range(0, 10)]
+		self.fetcher.maxStatementBytes = 100
+		queries = self.fetcher.multiRowInserts('INSERT INTO t VALUES', rows)
+		self.assertTrue(len(queries) > 1)
+		for query in queries:
+			self.assertTrue(len(query) <= 100)
+			self.assertTrue(query.startswith('INSERT INTO t VALUES (') and query.endswith(');'))
+		self.assertEqual(re.findall(r'\(\d+\)', ' '.join(queries)), rows)
+		self.assertEqual(self.fetcher.multiRowInserts('INSERT INTO t VALUES', []), [])
+		return
+
+	def testArticleValues(self):
+		values = self.fetcher.articleValues(self.doc('feed', 'http://a/', u'text'))
+		self.assertTrue(values.startswith('("http://a/", ' + str(self.fetcher.fingerprint('http://a/')) + ', '))
+		self.assertEqual(values.count('DEFAULT'), 5)	#  summary, keyword, lang_claimed, pub_date, body_ref
+		self.assertTrue(values.endswith(', FALSE)'))
+		return
+
+	#  Known articles are not inserted again, an article several feeds carry is inserted once,
+	#  and every (article, feed) pair is recorded once
+	def testWriteBatch(self):
+		link = self.fetcher.link
+		known = self.doc('feed1', 'http://a/', u'Known article')
+		link.articles.append( (1, known['hash_url'], known['hash_content']) )
+		link.sources.add( (1, 'feed1') )
+
+		incomplete = self.doc('feed1', 'http://c/', u'No digest')
+		incomplete['hash_content'] = None
+		docs = [self.doc('feed2', 'http://a/', u'Known article'), self.doc('feed1', 'http://b/', u'New article'), \
+		        self.doc('feed2', 'http://b/', u'New article'), incomplete]
+		cursor = link.cursor()
+		self.assertEqual(self.fetcher.writeBatch(cursor, docs), 1)
+		self.assertEqual(len(link.articles), 2)
+		self.assertEqual(link.inserts, 1)
+		self.assertEqual(link.sources, set([(1, 'feed1'), (1, 'feed2'), (2, 'feed1'), (2, 'feed2')]))
+		self.assertEqual(link.commits, 1)
+
+		self.assertEqual(self.fetcher.writeBatch(cursor, docs), 0)	#  The same batch again: nothing new
+		self.assertEqual(len(link.articles), 2)
+		self.assertEqual(len(link.sources), 4)
+		return
+
+	#  Jobs that never come back from the parse pool are given up on; the rest still arrive
+	def testParseInPoolSurvivesLostJobs(self):
+		feeds = ['http://a.example.org/' + x for x in ['good1', 'raise', 'unpicklable', 'killed', 'good2']]
+		self.fetcher.replaySource = [(x, RSS, {}) for x in feeds]
+		self.fetcher.parseProcesses = 2
+		self.fetcher.parseTimeout = 5
+		rss.parseFeed = brokenParse
+		try:
+			parsed = []
+			t = threading.Thread(target=lambda: parsed.extend(self.fetcher.parseInPool()))
+			t.daemon = True
+			t.start()
+			t.join(30)
+		finally:
+			rss.parseFeed = realParse
+		self.assertFalse(t.is_alive())
+		self.assertEqual(sorted([x[0] for x in parsed]), [feeds[0], feeds[4]])
+		self.assertEqual(len(parsed[0][1]), 1)
+		return
+
+	#  A download that raises still yields its feed, with no body, and counts against it: the caller never waits
+	def testDownloadFeedsSurvivesErrors(self):
+		feeds = ['http://a.example.org/' + str(i) for i in range(0, 6)] + ['http://b.example.org/0']
+		broken = set([feeds[2], feeds[6]])
+		def download(feed):
+			if feed in broken:
+				raise IOError('No space left on device')
+			return 'body of ' + feed, {}
+		self.fetcher.downloadFeed = download
+
+		results = []
+		t = threading.Thread(target=lambda: results.extend(self.fetcher.downloadFeeds(feeds)))
+		t.daemon = True
+		t.start()
+		t.join(10)
+		self.assertFalse(t.is_alive())
+		self.assertEqual(sorted([x[0] for x in results]), sorted(feeds))
+		for feed, body, headers in results:
+			if feed in broken:
+				self.assertEqual((body, headers), (None, None))
+				self.assertEqual(self.fetcher.pendingHealth[feed][0], 1)
+			else:
+				self.assertEqual(body, 'body of ' + feed)
+		return
+
+	#  A server that rotates its validators but sends the same body: nothing to parse, but the next poll
+	#  must send the new validators, or it downloads the whole body every time
+	def testRotatedValidators(self):
+		feed = 'http://a.example.org/rss'
+		body = '<rss/>'
+		self.fetcher.feedState[feed] = {'etag': '"1"', 'last-modified': None, 'body-hash': hashlib.sha1(body).hexdigest()}
+		session = self.serve(FakeResponse(200, body, {'ETag': '"2"', 'Last-Modified': 'Wed, 21 Feb 2018 01:56:00 GMT'}))
+		self.assertEqual(self.fetcher.downloadFeed(feed)[0], None)
+		self.assertEqual(session.sent[0], {'If-None-Match': '"1"'})
+		self.assertEqual(self.fetcher.pendingState[feed]['etag'], '"2"')
+		self.assertEqual(self.fetcher.pendingState[feed]['last-modified'], 'Wed, 21 Feb 2018 01:56:00 GMT')
+		return
+
+	#  Archiving is a side-effect: a body that cannot be archived is still parsed
+	def testArchiveFailure(self):
+		self.serve(FakeResponse(200, '<rss/>', {'ETag': '"1"'}))
+		self.fetcher.archive = FullArchive()
+		body, headers = self.fetcher.downloadFeed('http://a.example.org/rss')
+		self.assertEqual(body, '<rss/>')
+		self.assertEqual(headers['etag'], '"1"')
+		return
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,159 @@
+import time
+import unittest
+from datetime import datetime
+from rssscheduler import FeedScheduler
+
+#  Answers the scheduler's one SELECT with 'rows', and remembers the rows each UPDATE was given
+class FakeLink:
+	def __init__(self, rows=None):
+		self.rows = rows or []
+		self.updates = []
+		self.commits = 0
+		return
+
+	def cursor(self, cursorClass=None):
+		return self
+
+	def execute(self, query, args=None):
+		return
+
+	def executemany(self, query, rows):
+		self.updates += rows
+		self.rowcount = len(rows)
+		return
+
+	def fetchall(self):
+		return self.rows
+
+	def commit(self):
+		self.commits += 1
+		return
+
+	def close(self):
+		return
+
+#  Polls whatever feeds it is given, finding 'found[feed]' new entries in each, and remembers the order
+class FakeFetcher:
+	def __init__(self, rows=None):
+		self.link = FakeLink(rows)
+		self.feeds = []
+		self.found = {}						#  [feed] ==> new entries its next poll finds
+		self.pendingHealth = {}				#  [feed] ==> (failures, retry time), as FeedFetcher.feedFailed() leaves it
+		self.skipPushed = True
+		self.polled = []					#  Feed lists, one per poll
+		return
+
+	def getFeeds(self):
+		return
+
+	def startTimer(self):
+		return
+
+	def fetchFeeds(self):
+		self.polled.append(list(self.feeds))
+		for feed in self.feeds:
+			yield feed, [{}] * self.found.get(feed, 0)
+
+	def save(self, docs):
+		return len(docs)
+
+#  Rate estimates, poll intervals and due-time ordering of the adaptive scheduler (rssscheduler.py)
+class FeedSchedulerTest(unittest.TestCase):
+	def setUp(self):
+		self.fetcher = FakeFetcher()
+		self.scheduler = FeedScheduler(self.fetcher)
+		self.scheduler.nextRefresh = time.time() + 3600	#  No database to load feeds from
+		return
+
+	#  The first poll only starts the clock; later ones move the rate by 'smoothing' towards what they saw
+	def testObserve(self):
+		self.scheduler.observe('a', 10, 1000.0)
+		self.assertNotIn('a', self.scheduler.rate)
+		self.scheduler.observe('a', 4, 1000.0 + 7200)		#  2 an hour
+		self.assertAlmostEqual(self.scheduler.rate['a'], 0.7 * 1.0 + 0.3 * 2.0)
+		self.scheduler.observe('a', 0, 1000.0 + 7200 + 3600)
+		self.assertAlmostEqual(self.scheduler.rate['a'], 0.7 * 1.3)
+		self.scheduler.observe('a', 1, 1000.0 + 7200 + 3600)	#  Polled twice in the same second: counts as one
+		self.assertAlmostEqual(self.scheduler.rate['a'], 0.7 * 0.91 + 0.3 * 3600.0)
+		return
+
+	def testInterval(self):
+		self.assertEqual(self.scheduler.interval('new'), 7200.0)	#  defaultRate: two entries in two hours
+		self.scheduler.rate['busy'] = 600.0
+		self.assertEqual(self.scheduler.interval('busy'), self.scheduler.minInterval)
+		self.scheduler.rate['quiet'] = 0.01
+		self.assertEqual(self.scheduler.interval('quiet'), self.scheduler.maxInterval)
+		self.scheduler.rate['dead'] = 0.0
+		self.assertEqual(self.scheduler.interval('dead'), self.scheduler.maxInterval)
+		self.scheduler.rate['daily'] = 0.5
+		self.assertEqual(self.scheduler.interval('daily'), 14400.0)
+		return
+
+	#  Due feeds are polled earliest first, at most maxBatch at a time; rescheduled feeds leave stale entries behind
+	def testDueOrder(self):
+		now = time.time()
+		self.scheduler.schedule('c', now - 10)
+		self.scheduler.schedule('a', now - 30)
+		self.scheduler.schedule('b', now - 20)
+		self.scheduler.schedule('later', now + 600)
+		self.scheduler.schedule('c', now + 300)			#  Moved: its old entry is stale
+		self.scheduler.maxBatch = 1
+		self.fetcher.found = {'a': 3}
+		self.assertEqual(self.scheduler.runOnce(), 3)
+		self.scheduler.maxBatch = 200
+		self.scheduler.runOnce()
+		self.assertEqual(self.fetcher.polled, [['a'], ['b']])
+		self.assertEqual(self.scheduler.runOnce(), 0)	#  Nothing else due yet
+
+		self.assertTrue(0 < self.scheduler.secondsUntilDue() <= 300)
+		self.assertEqual(self.scheduler.queue[0][1], 'c')
+		self.assertEqual(sorted(self.scheduler.due.keys()), ['a', 'b', 'c', 'later'])
+		return
+
+	#  A polled feed is due again one interval later, and its rate and due time are saved
+	def testReschedule(self):
+		self.scheduler.schedule('a', time.time() - 1)
+		self.scheduler.lastPoll['a'] = time.time() - 3600
+		self.fetcher.found = {'a': 11}
+		self.scheduler.runOnce()
+		rate = self.scheduler.rate['a']
+		self.assertAlmostEqual(rate, 0.7 * 1.0 + 0.3 * 11.0, 2)
+		self.assertAlmostEqual(self.scheduler.due['a'] - self.scheduler.lastPoll['a'], 2.0 / rate * 3600.0, 3)
+		self.assertEqual(len(self.fetcher.link.updates), 1)
+		self.assertEqual(self.fetcher.link.updates[0][0], rate)
+		self.assertEqual(self.fetcher.link.updates[0][2], 'a')
+		self.assertEqual(self.fetcher.link.commits, 1)
+		return
+
+	#  A feed whose circuit opened waits for its retry time, and keeps its rate
+	def testFailingFeed(self):
+		retry = datetime.fromtimestamp(int(time.time() + 5000))
+		self.scheduler.schedule('a', time.time() - 1)
+		self.scheduler.rate['a'] = 4.0
+		self.fetcher.pendingHealth = {'a': (3, retry)}
+		self.scheduler.runOnce()
+		self.assertEqual(self.scheduler.due['a'], time.mktime(retry.timetuple()))
+		self.assertEqual(self.scheduler.rate['a'], 4.0)
+		return
+
+	#  New feeds are due at once (or at their saved due time), pushed ones when their subscription runs out,
+	#  and disabled ones drop out
+	def testLoadFeeds(self):
+		now = time.time()
+		later = datetime.fromtimestamp(int(now + 900))
+		pushed = datetime.fromtimestamp(int(now + 7200))
+		self.fetcher.link.rows = [ \
+			{'feed': 'new', 'entry_rate': None, 'next_poll': None, 'retry_after': None, 'push_until': None}, \
+			{'feed': 'saved', 'entry_rate': 6.0, 'next_poll': later, 'retry_after': None, 'push_until': None}, \
+			{'feed': 'pushed', 'entry_rate': None, 'next_poll': later, 'retry_after': None, 'push_until': pushed}]
+		self.scheduler.schedule('gone', now + 60)
+		self.scheduler.loadFeeds()
+		self.assertTrue(now <= self.scheduler.due['new'] <= time.time())
+		self.assertEqual(self.scheduler.due['saved'], time.mktime(later.timetuple()))
+		self.assertEqual(self.scheduler.rate['saved'], 6.0)
+		self.assertEqual(self.scheduler.due['pushed'], time.mktime(pushed.timetuple()))
+		self.assertNotIn('gone', self.scheduler.due)
+		return
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,131 @@
+import gzip
+import unittest
+from StringIO import StringIO
+from datetime import datetime
+from sitemap import SitemapFetcher, GunzipStream, parseW3CDate
+
+SITEMAP = 'http://news.example.org/sitemap.xml'
+INDEX = 'http://news.example.org/sitemap-index.xml'
+SECTION = 'http://news.example.org/sitemap-section.xml'
+DAY = 'http://news.example.org/sitemap-day.xml'
+
+#  Takes every statement crawl() sends, and answers none
+class FakeLink:
+	def cursor(self, cursorClass=None):
+		return self
+
+	def execute(self, query, args=None):
+		return
+
+	def commit(self):
+		return
+
+	def close(self):
+		return
+
+#  Dates, gzip streams and article records of the sitemap collector (sitemap.py)
+class SitemapTest(unittest.TestCase):
+	def testParseW3CDate(self):
+		self.assertEqual(parseW3CDate('2018-02-21'), datetime(2018, 2, 21))
+		self.assertEqual(parseW3CDate('2018-02-21T09:56'), datetime(2018, 2, 21, 9, 56))
+		self.assertEqual(parseW3CDate('2018-02-21T09:56:00+08:00'), datetime(2018, 2, 21, 1, 56))
+		self.assertEqual(parseW3CDate(' 2018-02-21T01:56:00.123Z '), datetime(2018, 2, 21, 1, 56))
+		self.assertEqual(parseW3CDate('2018-02-20T20:56:00-0500'), datetime(2018, 2, 21, 1, 56))
+		self.assertEqual(parseW3CDate('2018-12-31T23:30:00-01:00'), datetime(2019, 1, 1, 0, 30))
+		for text in [None, '', 'yesterday', '2018-02-30', '2018-2-21', '21/02/2018']:
+			self.assertIsNone(parseW3CDate(text))
+		return
+
+	def testGunzipStream(self):
+		data = ''.join(['<url><loc>http://news.example.org/' + str(i) + '</loc></url>' for i in range(0, 5000)])
+		packed = StringIO()
+		fh = gzip.GzipFile(fileobj=packed, mode='wb')
+		fh.write(data)
+		fh.close()
+		stream = GunzipStream(StringIO(packed.getvalue()))
+		pieces = []
+		while True:
+			piece = stream.read(1000)
+			if not piece:
+				break
+			pieces.append(piece)
+		self.assertEqual(''.join(pieces), data)
+		return
+
+	def testUrlDoc(self):
+		fetcher = SitemapFetcher()
+		doc = fetcher.urlDoc(SITEMAP, SITEMAP, {'loc': 'http://news.example.org/a', 'title': u'A headline', \
+		                                        'lastmod': '2018-02-21T09:56:00+08:00', \
+		                                        'publication_date': '2018-02-21T09:50:00+08:00'})
+		self.assertEqual(doc['hash_url'], fetcher.fingerprint('http://news.example.org/a'))
+		self.assertEqual(doc['pub-date'], '2018-02-21 01:50:00')
+		self.assertEqual(doc['hash_content'], fetcher.fingerprint(u'A headline'))
+		self.assertEqual(fetcher.pendingSitemapState[SITEMAP], (None, datetime(2018, 2, 21, 1, 56)))
+
+		#  A plain sitemap (no news: fields) is fingerprinted by its URL
+		plain = fetcher.urlDoc(SITEMAP, SITEMAP, {'loc': 'http://news.example.org/b'})
+		self.assertEqual(plain['hash_content'], fetcher.fingerprint('http://news.example.org/b'))
+		self.assertIsNone(plain['title'])
+		self.assertIsNone(plain['pub-date'])
+
+		#  A publication date that does not parse is left out rather than handed to MySQL as is
+		odd = fetcher.urlDoc(SITEMAP, SITEMAP, {'loc': 'http://news.example.org/e', 'publication_date': 'yesterday'})
+		self.assertIsNone(odd['pub-date'])
+
+		self.assertIsNone(fetcher.urlDoc(SITEMAP, SITEMAP, {'title': u'No location'}))
+		return
+
+	#  URLs no newer than the newest stored from their sitemap were read on an earlier run
+	def testUrlDocIncremental(self):
+		fetcher = SitemapFetcher()
+		fetcher.sitemapState[SITEMAP] = (None, datetime(2018, 2, 21, 1, 56))
+		self.assertIsNone(fetcher.urlDoc(SITEMAP, SITEMAP, {'loc': 'http://news.example.org/a', \
+		                                                    'lastmod': '2018-02-21T01:56:00Z'}))
+		self.assertIsNotNone(fetcher.urlDoc(SITEMAP, SITEMAP, {'loc': 'http://news.example.org/c', \
+		                                                       'lastmod': '2018-02-21T01:57:00Z'}))
+		self.assertIsNotNone(fetcher.urlDoc(SITEMAP, SITEMAP, {'loc': 'http://news.example.org/d'}))
+		return
+
+	#  A sitemap index is noted (and so skipped next time its lastmod is unchanged) only once every sitemap
+	#  under it was read in full
+	def testNestedIndex(self):
+		fetcher = SitemapFetcher()
+		fetcher.link = FakeLink()
+		fetcher.writeBatch = lambda cursor, batch: len(batch)
+		fetcher.sitemaps = [INDEX]
+		failing = [True]
+		asked = []
+		def readSitemap(url):
+			asked.append(url)
+			if url == INDEX:
+				yield 'sitemap', {'loc': SITEMAP, 'lastmod': '2018-02-21'}
+				yield 'sitemap', {'loc': SECTION, 'lastmod': '2018-02-22'}
+			elif url == SECTION:
+				yield 'sitemap', {'loc': DAY, 'lastmod': '2018-02-23'}
+			else:
+				yield 'url', {'loc': url + '#1'}
+				if url == DAY and failing[0]:
+					raise IOError('connection reset')
+		fetcher.readSitemap = readSitemap
+
+		fetcher.crawl()
+		self.assertEqual(asked, [INDEX, SITEMAP, SECTION, DAY])
+		self.assertEqual(fetcher.sitemapState[SITEMAP][0], '2018-02-21')
+		for url in [SECTION, DAY, INDEX]:
+			self.assertNotIn(url, fetcher.sitemapState)
+
+		failing[0] = False
+		asked = []
+		fetcher.crawl()
+		self.assertEqual(asked, [INDEX, SECTION, DAY])
+		self.assertEqual(fetcher.sitemapState[SECTION][0], '2018-02-22')
+		self.assertEqual(fetcher.sitemapState[DAY][0], '2018-02-23')
+		self.assertIn(INDEX, fetcher.sitemapState)
+
+		asked = []
+		fetcher.crawl()
+		self.assertEqual(asked, [INDEX])
+		return
+
+if __name__ == '__main__':
+	unittest.main()
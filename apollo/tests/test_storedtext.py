@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import unittest
+import storedtext
+
+TEXTS = [u'plain ASCII', u'中华人民共和国', u'He said "soon"', u'back\\slash \\u4e2d', u'tab\tand\nnewline', u'']
+
+#  Both renderings of stored text come back as the text itself
+class StoredTextTest(unittest.TestCase):
+	def testLegacyValueRoundTrip(self):
+		for text in TEXTS:
+			self.assertEqual(storedtext.readText(storedtext.legacyValue(text), False), text)
+		return
+
+	#  legacyText() is what sits between double quotes in a query: once the server strips a level of escapes,
+	#  the stored value is exactly legacyValue()
+	def testLegacyTextMatchesValue(self):
+		literal = storedtext.legacyText(u'伊朗 "x"')
+		self.assertEqual(literal, '\\\\u4f0a\\\\u6717 \\"x\\"')
+		self.assertEqual(literal.replace('\\\\', '\\').replace('\\"', '"'), storedtext.legacyValue(u'伊朗 "x"'))
+		return
+
+	def testLegacyIsAscii(self):
+		self.assertEqual(storedtext.legacyValue(u'伊朗'), '\\u4f0a\\u6717')
+		return
+
+	def testNative(self):
+		self.assertEqual(storedtext.readText(u'中文'.encode('utf-8'), True), u'中文')
+		self.assertEqual(storedtext.readText(u'中文', True), u'中文')
+		self.assertIsNone(storedtext.readText(None, True))
+		self.assertIsNone(storedtext.readText(None, False))
+		return
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import unittest
+from datetime import datetime
+from topicseries import topicLink, packIds, unpackIds, spanSeconds
+
+#  The storage helpers of the hot-topic time series (topicseries.py)
+class TopicSeriesTest(unittest.TestCase):
+	def testPackIds(self):
+		ids = [1, 42, 70000, 4294967295, 42]
+		data = packIds(ids)
+		self.assertEqual(len(data), 4 * len(ids))
+		self.assertEqual(data[:8], '\x00\x00\x00\x01\x00\x00\x00\x2a')	#  Big-endian, best first
+		self.assertEqual(unpackIds(data), ids)
+		self.assertEqual(unpackIds(bytearray(data)), ids)	#  As MySQLdb may return a BLOB
+		self.assertEqual(unpackIds(packIds([])), [])
+		return
+
+	def testTopicLink(self):
+		self.assertEqual(topicLink(u'薄熙来'), 'weibo/%E8%96%84%E7%86%99%E6%9D%A5')
+		self.assertEqual(topicLink(u'薄熙来'.encode('utf-8')), topicLink(u'薄熙来'))
+		return
+
+	def testSpanSeconds(self):
+		start = datetime(2018, 2, 21, 9, 0)
+		end = datetime(2018, 2, 22, 10, 0)
+		self.assertEqual(spanSeconds(start, end), 25 * 3600)
+		self.assertEqual(spanSeconds(start, end, datetime(2018, 2, 22, 9, 0)), 3600)
+		self.assertEqual(spanSeconds(start, end, None, datetime(2018, 2, 21, 9, 30)), 1800)
+		self.assertEqual(spanSeconds(start, end, datetime(2018, 2, 23)), 0)
+		self.assertEqual(spanSeconds(start, start), 0)
+		return
+
+if __name__ == '__main__':
+	unittest.main()
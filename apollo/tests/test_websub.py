@@ -0,0 +1,259 @@
+import hmac
+import hashlib
+import Queue
+import time
+import socket
+import urllib
+import urllib2
+import urlparse
+import threading
+import unittest
+import BaseHTTPServer
+import httpclient
+from rss import FeedFetcher
+from websub import WebSubReceiver
+
+FEED = 'http://news.example.org/rss.xml'
+HUB = 'http://hub.example.org/'
+RSS = '<rss version="2.0"><channel><item><title>Pushed headline</title><link>http://news.example.org/1</link></item></channel></rss>'
+
+#  A stand-in hub: accepts every (un)subscription request, checks it back with the subscriber the way a hub
+#  does, and once a subscription is confirmed pushes RSS to it, signed with the secret it was given
+class StandInHub(BaseHTTPServer.BaseHTTPRequestHandler):
+	def do_POST(self):
+		form = urlparse.parse_qs(self.rfile.read(int(self.headers.getheader('content-length'))))
+		request = dict([(k, v[0]) for k, v in form.items()])
+		self.send_response(202)
+		self.send_header('Content-Length', '0')
+		self.end_headers()
+		self.server.requests.append(request)
+		t = threading.Thread(target=self.server.checkBack, args=(request, ))
+		t.daemon = True
+		t.start()
+
+	def log_message(self, format, *args):
+		return
+
+class StandInHubServer(BaseHTTPServer.HTTPServer):
+	def __init__(self):
+		BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHub)
+		self.requests = []					#  Form of every request received
+		self.confirmed = []					#  (mode, whether the subscriber echoed the challenge)
+		self.pushed = threading.Event()
+		return
+
+	def checkBack(self, request):
+		query = urllib.urlencode({'hub.mode': request['hub.mode'], 'hub.topic': request['hub.topic'], \
+		                          'hub.challenge': 'xyzzy', 'hub.lease_seconds': request['hub.lease_seconds']})
+		try:
+			echo = urllib2.urlopen(request['hub.callback'] + '?' + query, timeout=10).read()
+		except urllib2.HTTPError:
+			echo = None
+		self.confirmed.append( (request['hub.mode'], echo == 'xyzzy') )
+		if request['hub.mode'] == 'subscribe' and echo == 'xyzzy':
+			signature = 'sha256=' + hmac.new(request['hub.secret'], RSS, hashlib.sha256).hexdigest()
+			push = urllib2.Request(request['hub.callback'], RSS, {'Content-Type': 'application/rss+xml', \
+			                                                       'X-Hub-Signature': signature})
+			urllib2.urlopen(push, timeout=10).read()
+			self.pushed.set()
+		return
+
+#  Records what the receiver's saving loop does with the database
+class FakeLink:
+	def __init__(self):
+		self.statements = []
+		self.commits = 0
+		self.rollbacks = 0
+		return
+
+	def cursor(self, cursorClass=None):
+		return self
+
+	def execute(self, query, args=None):
+		self.statements.append( (query, args) )
+		return
+
+	def commit(self):
+		self.commits += 1
+		return
+
+	def rollback(self):
+		self.rollbacks += 1
+		return
+
+	def close(self):
+		return
+
+#  A port nothing is listening on
+def freePort():
+	s = socket.socket()
+	s.bind(('127.0.0.1', 0))
+	port = s.getsockname()[1]
+	s.close()
+	return port
+
+#  The parts of the WebSub receiver that hubs talk to: signature checks, verification and delivery
+class WebSubReceiverTest(unittest.TestCase):
+	def setUp(self):
+		self.receiver = WebSubReceiver(FeedFetcher(), 'http://collector.example.org:8080/websub/', 8080, 'sekrit')
+		self.receiver.work = Queue.Queue()
+		self.token = self.receiver.token(FEED)
+		self.receiver.topics[self.token] = (FEED, HUB, FEED)
+		return
+
+	def sign(self, body, method='sha256', secret='sekrit'):
+		return method + '=' + hmac.new(secret, body, getattr(hashlib, method)).hexdigest()
+
+	def testSignatureValid(self):
+		body = '<rss>pushed</rss>'
+		for method in ('sha1', 'sha256', 'sha384', 'sha512'):
+			self.assertTrue(self.receiver.signatureValid(body, self.sign(body, method)))
+		self.assertTrue(self.receiver.signatureValid(body, self.sign(body).upper().replace('SHA256', 'sha256')))
+		self.assertFalse(self.receiver.signatureValid(body, self.sign(body, secret='wrong')))
+		self.assertFalse(self.receiver.signatureValid(body + ' ', self.sign(body)))
+		self.assertFalse(self.receiver.signatureValid(body, 'md5=' + hashlib.md5(body).hexdigest()))
+		self.assertFalse(self.receiver.signatureValid(body, ''))
+		return
+
+	#  Badly signed pushes are acknowledged but dropped
+	def testDeliver(self):
+		body = '<rss>pushed</rss>'
+		self.assertEqual(self.receiver.deliver(self.token, body, {'x-hub-signature': self.sign(body)}), 202)
+		self.assertEqual(self.receiver.work.get_nowait(), ('push', FEED, body, {'x-hub-signature': self.sign(body)}))
+		self.assertEqual(self.receiver.deliver(self.token, body, {'x-hub-signature': self.sign('other')}), 202)
+		self.assertEqual(self.receiver.deliver(self.token, body, {}), 202)
+		self.assertTrue(self.receiver.work.empty())
+		self.assertEqual(self.receiver.deliver('0' * 16, body, {'x-hub-signature': self.sign(body)}), 404)
+		return
+
+	#  A hub's check is confirmed only for the mode we asked for, and only once
+	def testVerify(self):
+		query = {'hub.mode': ['subscribe'], 'hub.topic': [FEED], 'hub.challenge': ['xyzzy'], 'hub.lease_seconds': ['7200']}
+		self.assertEqual(self.receiver.verify(self.token, query), (404, ''))
+		self.receiver.requested[self.token] = ('subscribe', time.time())
+		self.assertEqual(self.receiver.verify(self.token, dict(query, **{'hub.topic': ['http://elsewhere/']})), (404, ''))
+		self.assertEqual(self.receiver.verify(self.token, query), (200, 'xyzzy'))
+		self.assertIn(self.token, self.receiver.leases)
+		item = self.receiver.work.get_nowait()
+		self.assertEqual(item[:2], ('lease', FEED))
+		self.assertEqual(self.receiver.verify(self.token, query), (404, ''))
+		return
+
+	#  A renewal the hub accepted but never checked back on is sent again; a refused one waits out its back-off
+	def testRenewLeases(self):
+		sent = []
+		accept = [True]
+		def subscribe(token, mode='subscribe'):
+			sent.append(token)
+			self.receiver.requested[token] = (mode, time.time())
+			return accept[0]
+		self.receiver.subscribe = subscribe
+		self.receiver.leases[self.token] = time.time() - 1
+
+		self.receiver.renewLeases()
+		self.receiver.renewLeases()			#  Still waiting for the hub to check back
+		self.assertEqual(len(sent), 1)
+		self.receiver.requested[self.token] = ('subscribe', time.time() - self.receiver.verifyWait - 1)
+		self.receiver.renewLeases()
+		self.assertEqual(len(sent), 2)
+
+		del self.receiver.requested[self.token]
+		self.receiver.refusals[self.token] = (1, time.time() + 60)
+		self.receiver.renewLeases()
+		self.assertEqual(len(sent), 2)
+		self.receiver.refusals[self.token] = (1, time.time() - 1)
+		self.receiver.renewLeases()
+		self.assertEqual(len(sent), 3)
+		return
+
+	#  Refusals back off, doubling each time; an accepted request clears them
+	def testRefusalBackoff(self):
+		statuses = [500, 500, 202]
+		class Answer:
+			def __init__(self, status):
+				self.status_code = status
+		class Hub:
+			def post(self, url, data=None, timeout=None):
+				return Answer(statuses.pop(0))
+		session = httpclient.session
+		httpclient.session = lambda: Hub()
+		try:
+			start = time.time()
+			self.assertFalse(self.receiver.subscribe(self.token))
+			self.assertNotIn(self.token, self.receiver.requested)
+			first = self.receiver.refusals[self.token]
+			self.assertFalse(self.receiver.subscribe(self.token))
+			second = self.receiver.refusals[self.token]
+			self.assertTrue(self.receiver.subscribe(self.token))
+		finally:
+			httpclient.session = session
+		self.assertEqual(first[0], 1)
+		self.assertTrue(first[1] >= start + self.receiver.retryBackoff)
+		self.assertEqual(second[0], 2)
+		self.assertTrue(second[1] >= start + 2 * self.receiver.retryBackoff)
+		self.assertNotIn(self.token, self.receiver.refusals)
+		return
+
+	def testCallbackURL(self):
+		self.assertEqual(self.receiver.callback, 'http://collector.example.org:8080/websub')
+		self.assertEqual(self.token, '%016x' % self.receiver.fetcher.fingerprint(FEED))
+		return
+
+#  The whole exchange over HTTP on localhost: subscribe, verification, a signed push saved through the
+#  usual parse path, then unsubscribing on the way out
+class WebSubEndToEndTest(unittest.TestCase):
+	def setUp(self):
+		self.hub = StandInHubServer()
+		t = threading.Thread(target=self.hub.serve_forever)
+		t.daemon = True
+		t.start()
+		hubURL = 'http://127.0.0.1:%d/' % self.hub.server_address[1]
+
+		port = freePort()
+		fetcher = FeedFetcher()
+		fetcher.link = FakeLink()
+		fetcher.hubs = {FEED: (hubURL, FEED)}
+		self.saved = []
+		fetcher.writeBatch = lambda cursor, docs: self.saved.extend(docs) or len(docs)
+		fetcher.saveFeedState = lambda cursor, feeds=None: None
+		self.receiver = WebSubReceiver(fetcher, 'http://127.0.0.1:%d/websub/' % port, port, 'sekrit')
+		self.receiver.stopGrace = 0
+		return
+
+	def tearDown(self):
+		if self.receiver.server is not None:
+			self.receiver.server.shutdown()
+		self.hub.shutdown()
+		self.hub.server_close()
+		return
+
+	def testPush(self):
+		self.receiver.start()
+		self.assertTrue(self.hub.pushed.wait(10))
+		deadline = time.time() + 10
+		while len(self.saved) == 0 and time.time() < deadline:
+			self.receiver.step(1)
+
+		request = self.hub.requests[0]
+		self.assertEqual(request['hub.mode'], 'subscribe')
+		self.assertEqual(request['hub.topic'], FEED)
+		self.assertEqual(request['hub.secret'], 'sekrit')
+		self.assertEqual(self.hub.confirmed, [('subscribe', True)])
+		token = self.receiver.token(FEED)
+		self.assertIn(token, self.receiver.leases)
+		self.assertEqual(self.receiver.fetcher.link.statements[0][0], 'UPDATE rss SET push_until = %s WHERE feed = %s;')
+		self.assertEqual(self.receiver.fetcher.link.statements[0][1][1], FEED)
+		self.assertIsNotNone(self.receiver.fetcher.link.statements[0][1][0])
+
+		self.assertEqual([x['url'] for x in self.saved], ['http://news.example.org/1'])
+		self.assertEqual(self.saved[0]['title'], self.receiver.fetcher.storable(u'Pushed headline'))
+		self.assertEqual(self.receiver.fetcher.link.rollbacks, 0)
+
+		self.receiver.stop()
+		self.assertEqual(self.hub.requests[-1]['hub.mode'], 'unsubscribe')
+		self.assertEqual(self.receiver.fetcher.link.statements[-1], ('UPDATE rss SET push_until = NULL WHERE feed = %s;', (FEED, )))
+		self.assertEqual(self.receiver.leases, {})
+		return
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,106 @@
+import sys
+import time
+import MySQLdb								#  Used for DB operations
+import database								#  Pooled connections and batched statements
+import storedtext							#  Legacy and native text renderings
+
+#  Convert legacy-escaped text rows (native_text = FALSE) to native UTF-8 (native_text = TRUE), a batch at a time,
+#  while the collectors and readers keep running. See storedtext.py for the two renderings.
+#
+#  Each batch is read, converted and written back in one short transaction. A row is only rewritten if it still
+#  holds exactly what was read (compare-and-set), so a row changed by someone else in the meantime is left for
+#  the next pass rather than overwritten. Re-running the script picks up wherever the last run stopped.
+
+#  Convert both tables, 500 rows per batch, resting half a second between batches,
+#  and show your work
+#  python textmigrate.py * 500 0.5 y
+
+#  argv[0] = textmigrate.py
+#  argv[1] = table to convert {articles/freeweibo}, or * for both
+#  argv[2] = rows per batch (default 500)
+#  argv[3] = seconds to rest between batches (default 0.5)
+#  argv[4] = verbosity {Y/N}
+
+#  [table] ==> its text columns. Only tables whose collector can write native rows (its 'nativeText' switch) belong
+#  here: 'weibo' will join them once WeiboFetcher has a write path that records native_text. Every column the
+#  collector renders through storable()/sqlText() must be listed, or a converted row is left half legacy.
+TEXT_COLUMNS = {'articles':  ['title', 'content', 'summary', 'keyword', 'lang_claimed', 'bag_of_words'], \
+                'freeweibo': ['content', 'bag_of_words']}
+
+def main():
+	tables = sorted(TEXT_COLUMNS.keys())
+	batchSize = 500
+	pause = 0.5
+	verbosity = False
+
+	if len(sys.argv) > 1 and sys.argv[1] != '*':
+		if sys.argv[1] not in TEXT_COLUMNS:
+			print('Usage: python textmigrate.py <articles/freeweibo/*> [batch size] [pause] [verbose Y/N]')
+			return
+		tables = [sys.argv[1]]
+
+	if len(sys.argv) > 2:
+		batchSize = int(sys.argv[2])
+
+	if len(sys.argv) > 3:
+		pause = float(sys.argv[3])
+
+	if len(sys.argv) > 4:
+		if sys.argv[4].upper()[0] == 'Y':
+			verbosity = True
+
+	link = database.connect('localhost', 'censor', 'blockme', 'corpora')
+	for table in tables:
+		converted, skipped = migrateTable(link, table, TEXT_COLUMNS[table], batchSize, pause, verbosity)
+		print(table + ': ' + str(converted) + ' rows converted, ' + str(skipped) + ' changed underneath us (re-run to retry)')
+	database.release(link)
+
+#  Convert every legacy row of one table. Returns (rows converted, rows skipped because they changed meanwhile).
+def migrateTable(link, table, columns, batchSize, pause, verbosity):
+	converted = 0
+	skipped = 0
+	lastKey = 0								#  Walk the primary key, so each batch is an index range scan
+
+	select  = 'SELECT kp, ' + ', '.join(columns) + ' FROM ' + table
+	select += ' WHERE native_text = FALSE AND kp > %s ORDER BY kp LIMIT %s;'
+
+	update  = 'UPDATE ' + table + ' SET ' + ', '.join([x + ' = %s' for x in columns]) + ', native_text = TRUE'
+	update += ' WHERE kp = %s AND native_text = FALSE AND ' + ' AND '.join([x + ' <=> %s' for x in columns]) + ';'
+
+	cursor = link.cursor(MySQLdb.cursors.DictCursor)
+	while True:
+		cursor.execute(select, (lastKey, batchSize))
+		rows = cursor.fetchall()
+		if len(rows) == 0:
+			break
+
+		for row in rows:
+			newValues = []
+			for column in columns:
+				text = storedtext.readText(row[column], False)
+				if text is not None:
+					text = text.encode('utf-8')
+				newValues.append(text)
+			oldValues = [row[x] for x in columns]
+			cursor.execute(update, tuple(newValues + [row['kp']] + oldValues))
+			if cursor.rowcount == 1:
+				converted += 1
+			else:
+				skipped += 1
+			lastKey = row['kp']
+		link.commit()						#  One short transaction per batch
+
+		if verbosity:
+			sys.stdout.write(table + ': ' + str(converted) + ' rows converted, up to kp ' + str(lastKey) + "\r")
+			sys.stdout.flush()
+
+		if pause > 0:
+			time.sleep(pause)
+
+	cursor.close()
+	if verbosity:
+		print('')
+	return converted, skipped
+
+if __name__ == '__main__':
+	main()
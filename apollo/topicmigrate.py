@@ -0,0 +1,96 @@
+import sys
+import MySQLdb								#  Used for DB operations
+import database								#  Pooled connections and streaming cursors
+import storedtext							#  freeweibo_topics holds topic text in its legacy rendering
+from datetime import datetime				#  Older samplings may have their time as a string
+from topicseries import TopicSeries			#  Where the samplings are going
+
+#  Move the hot-topic samplings FreeWeiboFetcher used to write to 'freeweibo_topics' (ten rows per poll) into the
+#  compact time series of topicseries.py, so rank-history and dwell-time queries cover them too.
+#
+#  The old table is read once, in time order, as a stream on one connection, and each sampling is recorded on another,
+#  one short transaction per batch of samplings. Only samplings newer than the latest ranking already in the series are
+#  read, so re-running the script picks up wherever the last run stopped. Once it is done (and freeweibochron.py is
+#  recording into the series), 'freeweibo_topics' can be dropped.
+
+#  Move everything, committing every 1000 samplings, and show your work
+#  python topicmigrate.py 1000 y
+
+#  argv[0] = topicmigrate.py
+#  argv[1] = samplings per transaction (default 1000)
+#  argv[2] = verbosity {Y/N}
+def main():
+	batchSize = 1000
+	verbosity = False
+
+	if len(sys.argv) > 1:
+		batchSize = int(sys.argv[1])
+
+	if len(sys.argv) > 2:
+		if sys.argv[2].upper()[0] == 'Y':
+			verbosity = True
+
+	reader = database.connect('localhost', 'censor', 'blockme', 'corpora')
+	writer = database.connect('localhost', 'censor', 'blockme', 'corpora')
+	samplings, rankings = migrateTopics(reader, writer, batchSize, verbosity)
+	print(str(samplings) + ' samplings moved, ' + str(rankings) + ' distinct rankings among them')
+	database.release(reader)
+	database.release(writer)
+
+#  Record every sampling in 'freeweibo_topics' newer than the series. Returns (samplings read, rankings added).
+def migrateTopics(reader, writer, batchSize, verbosity):
+	cursor = writer.cursor(MySQLdb.cursors.DictCursor)
+	series = TopicSeries(writer)
+	series.load(cursor)
+
+	query = 'SELECT date_sampled, topic, link, n FROM freeweibo_topics'
+	args = ()
+	if series.lastSeen is not None:
+		query += ' WHERE date_sampled > %s'
+		args = (series.lastSeen, )
+	stream = database.streamingCursor(reader)
+	stream.execute(query + ' ORDER BY date_sampled, n;', args)
+
+	samplings = 0
+	rankings = 0
+	sampled = None							#  Time of the sampling being gathered
+	topics = []								#  Its (topic text, link), best first
+	for row in stream:
+		when = sampleTime(row['date_sampled'])
+		if when != sampled and len(topics) > 0:
+			key = series.rankingKey
+			series.record(cursor, sampled, topics)
+			if series.rankingKey != key:
+				rankings += 1
+			samplings += 1
+			topics = []
+			if samplings % batchSize == 0:
+				writer.commit()				#  One short transaction per batch
+				if verbosity:
+					sys.stdout.write(str(samplings) + ' samplings moved, up to ' + str(sampled) + "\r")
+					sys.stdout.flush()
+		sampled = when
+		topics.append( (storedtext.readText(row['topic'], False), row['link']) )
+	stream.close()
+
+	if len(topics) > 0:
+		key = series.rankingKey
+		series.record(cursor, sampled, topics)
+		if series.rankingKey != key:
+			rankings += 1
+		samplings += 1
+	writer.commit()
+	cursor.close()
+
+	if verbosity:
+		print('')
+	return samplings, rankings
+
+#  A sampling time as a datetime: freeweibo_topics.date_sampled was written as a formatted string
+def sampleTime(value):
+	if isinstance(value, datetime):
+		return value
+	return datetime.strptime(str(value), '%Y-%m-%d %H:%M:%S')
+
+if __name__ == '__main__':
+	main()
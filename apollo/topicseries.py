@@ -0,0 +1,235 @@
+import struct								#  Rankings are stored as packed arrays of topic ids
+import urllib								#  Topic links are the topic, URL-quoted
+import storedtext							#  Topic text is stored in its legacy rendering, as in freeweibo_topics
+from datetime import datetime				#  Default end of a query window
+
+#  A compact time series of FreeWeibo's hot-topic rankings (the ten topics in its side-bar), kept in three tables:
+#    freeweibo_topic       each topic once: an id, its link (which identifies it) and its text.
+#    freeweibo_ranking     one row per DISTINCT ranking: its topic ids, packed in rank order, and the first and last
+#                          time a poll saw it. A poll that finds the same ranking as the one before only moves that
+#                          row's date_to, so a ranking that holds for a day costs one row, not ten per poll.
+#    freeweibo_topic_rank  one row per stretch a topic held one rank: the index that rank-history and dwell-time
+#                          questions are answered from, by primary key (topic) or by date_to (time window).
+#
+#  This replaces the ten rows per poll that FreeWeiboFetcher used to add to 'freeweibo_topics' (topicmigrate.py
+#  moves those over). Times are when a poll saw something. A stretch runs from the first poll that showed the topic at
+#  that rank to the last one, or to the poll that found it at another rank, where its next stretch starts: a topic
+#  that moves up or down is in the top ten all along. A topic seen by a single poll has a dwell time of zero.
+#
+#  series = TopicSeries(link)
+#  series.load(cursor)
+#  series.record(cursor, datetime.now(), [(topic text, link), ...])		#  Best first, once per poll
+#  series.rankHistory(cursor, topicLink(u'...'))		==>  [(rank, from, to), ...]
+#  series.dwellTime(cursor, topicLink(u'...'))			==>  seconds in the top ten
+#  series.rankingAt(cursor, datetime(2018, 2, 21, 9, 56))	==>  [(topic text, link), ...]
+#  series.longestDwelling(cursor, since, until)		==>  [(topic text, link, seconds), ...]
+class TopicSeries:
+	def __init__(self, link):
+		self.link = link					#  Open MySQL link (see database.connect())
+		self.topicIds = {}					#  [topic link] ==> topic_id, for the topics met so far
+		self.rankingKey = None				#  freeweibo_ranking.kp of the latest ranking
+		self.ranking = []					#  Its topic ids, best first
+		self.lastSeen = None				#  When a poll last saw it
+		self.runs = {}						#  [topic_id] ==> (rank, date_from) of each topic's current stretch in it
+		return
+
+	#  Pick up where the last run left off: the latest ranking and each of its topics' current stretch
+	def load(self, cursor):
+		cursor.execute('SELECT kp, date_to, topic_ids FROM freeweibo_ranking ORDER BY date_from DESC LIMIT 1;')
+		result = cursor.fetchall()
+		if len(result) == 0:
+			return
+		self.rankingKey = int(result[0]['kp'])
+		self.ranking = unpackIds(result[0]['topic_ids'])
+		self.lastSeen = result[0]['date_to']
+		self.runs = {}
+		if len(self.ranking) > 0:
+			query  = 'SELECT topic_id, n, date_from FROM freeweibo_topic_rank'
+			query += ' WHERE topic_id IN (' + ', '.join([str(x) for x in self.ranking]) + ') AND date_to = %s;'
+			cursor.execute(query, (self.lastSeen, ))
+			ranks = {}
+			for i, topicId in enumerate(self.ranking):
+				ranks.setdefault(topicId, i + 1)
+			for row in cursor.fetchall():	#  A topic that just moved also has the stretch it left, ending here
+				if int(row['n']) == ranks[int(row['topic_id'])]:
+					self.runs[int(row['topic_id'])] = (int(row['n']), row['date_from'])
+		return
+
+	#  Record one poll's ranking: 'topics' is a list of (topic text, link), best first, seen at time 'when'.
+	#  Only changes are written: a ranking identical to the last one just extends it.
+	def record(self, cursor, when, topics):
+		ids = self.lookupTopics(cursor, topics)
+		if self.rankingKey is not None and ids == self.ranking:
+			self.touch(cursor, when)
+			return
+
+		cursor.execute('INSERT INTO freeweibo_ranking(date_from, date_to, samples, topic_ids) VALUES (%s, %s, 1, %s);', \
+		               (when, when, packIds(ids)))
+		self.rankingKey = cursor.lastrowid
+
+		extended = []						#  Topics still in the top ten: their stretch runs up to now
+		runs = {}
+		rows = []
+		for i, topicId in enumerate(ids):
+			if topicId in runs:				#  Listed twice: only its best rank counts
+				continue
+			run = self.runs.get(topicId)
+			if run is not None:
+				extended.append( (topicId, run[1]) )
+			if run is not None and run[0] == i + 1:
+				runs[topicId] = run
+			else:							#  New to the top ten, or moved: a new stretch starts here
+				rows.append( (topicId, i + 1, when, when) )
+				runs[topicId] = (i + 1, when)
+		self.extendRuns(cursor, extended, when)
+		if len(rows) > 0:
+			cursor.executemany('INSERT INTO freeweibo_topic_rank(topic_id, n, date_from, date_to) VALUES (%s, %s, %s, %s)', rows)
+
+		self.ranking = ids
+		self.lastSeen = when
+		self.runs = runs
+		return
+
+	#  A poll saw the latest ranking again at time 'when' (FreeWeiboFetcher calls this when the page is unchanged)
+	def touch(self, cursor, when):
+		if self.rankingKey is None:
+			return
+		cursor.execute('UPDATE freeweibo_ranking SET date_to = %s, samples = samples + 1 WHERE kp = %s;', \
+		               (when, self.rankingKey))
+		self.extendRuns(cursor, [(x, run[1]) for x, run in self.runs.items()], when)
+		self.lastSeen = when
+		return
+
+	#  Move the end of the given stretches (topic_id, date_from) to 'when'
+	def extendRuns(self, cursor, runs, when):
+		if len(runs) == 0:
+			return
+		query  = 'UPDATE freeweibo_topic_rank SET date_to = %s'
+		query += ' WHERE ' + ' OR '.join(['(topic_id = %s AND date_from = %s)'] * len(runs)) + ';'
+		args = [when]
+		for topicId, start in runs:
+			args += [topicId, start]
+		cursor.execute(query, args)
+		return
+
+	#  The ids of the given (topic text (unicode), link) pairs, in the same order, adding topics met for the first time
+	def lookupTopics(self, cursor, topics):
+		missing = list(set([x[1] for x in topics if x[1] not in self.topicIds]))
+		if len(missing) > 0:
+			self.loadTopicIds(cursor, missing)
+			texts = {}
+			for text, link in topics:
+				if link not in self.topicIds:
+					texts[link] = text
+			if len(texts) > 0:
+				rows = [(link, storedtext.legacyValue(text)) for link, text in texts.items()]
+				cursor.executemany('INSERT IGNORE INTO freeweibo_topic(link, topic) VALUES (%s, %s)', rows)
+				self.loadTopicIds(cursor, list(texts.keys()))
+		return [self.topicIds[x[1]] for x in topics]
+
+	#  Learn the ids of the given topic links, where they have one
+	def loadTopicIds(self, cursor, links):
+		query = 'SELECT topic_id, link FROM freeweibo_topic WHERE link IN (' + ', '.join(['%s'] * len(links)) + ');'
+		cursor.execute(query, links)
+		for row in cursor.fetchall():
+			self.topicIds[row['link']] = int(row['topic_id'])
+		return
+
+	#  The id of the topic with link 'link', or None if it has never been in the top ten
+	def topicId(self, cursor, link):
+		if link not in self.topicIds:
+			self.loadTopicIds(cursor, [link])
+		return self.topicIds.get(link)
+
+	#################################### Q u e r i e s ####################################
+
+	#  Every stretch the topic with link 'link' spent at one rank, overlapping the window [since, until] if one is
+	#  given, oldest first: a list of (rank, from, to). Read by primary key; the window is applied to that topic's rows.
+	def rankHistory(self, cursor, link, since=None, until=None):
+		topicId = self.topicId(cursor, link)
+		if topicId is None:
+			return []
+		query = 'SELECT n, date_from, date_to FROM freeweibo_topic_rank WHERE topic_id = %s'
+		args = [topicId]
+		if since is not None:
+			query += ' AND date_to >= %s'
+			args.append(since)
+		if until is not None:
+			query += ' AND date_from <= %s'
+			args.append(until)
+		cursor.execute(query + ' ORDER BY date_from;', args)
+		return [(int(x['n']), x['date_from'], x['date_to']) for x in cursor.fetchall()]
+
+	#  Seconds the topic with link 'link' spent in the top ten (at rank 'best' or better, if given), within the
+	#  window [since, until] if one is given
+	def dwellTime(self, cursor, link, since=None, until=None, best=None):
+		seconds = 0
+		for n, start, end in self.rankHistory(cursor, link, since, until):
+			if best is not None and n > best:
+				continue
+			seconds += spanSeconds(start, end, since, until)
+		return seconds
+
+	#  The ranking a poll saw at time 'when' (the latest one to start at or before it), best first:
+	#  a list of (topic text, link). Empty if there was none yet.
+	def rankingAt(self, cursor, when):
+		query = 'SELECT topic_ids FROM freeweibo_ranking WHERE date_from <= %s ORDER BY date_from DESC LIMIT 1;'
+		cursor.execute(query, (when, ))
+		result = cursor.fetchall()
+		if len(result) == 0:
+			return []
+		ids = unpackIds(result[0]['topic_ids'])
+		topics = self.topicsById(cursor, ids)
+		return [topics[x] for x in ids if x in topics]
+
+	#  The 'limit' topics that spent longest in the top ten during the window [since, until] (until: now), longest
+	#  first: a list of (topic text, link, seconds). Only stretches ending after 'since' are read (by date_to).
+	def longestDwelling(self, cursor, since, until=None, limit=10):
+		if until is None:
+			until = datetime.now()
+		query  = 'SELECT topic_id, date_from, date_to FROM freeweibo_topic_rank'
+		query += ' WHERE date_to >= %s AND date_from <= %s;'
+		cursor.execute(query, (since, until))
+		seconds = {}
+		for row in cursor.fetchall():
+			topicId = int(row['topic_id'])
+			seconds[topicId] = seconds.get(topicId, 0) + spanSeconds(row['date_from'], row['date_to'], since, until)
+		ranked = sorted(seconds.items(), key=lambda x: x[1], reverse=True)[:limit]
+		topics = self.topicsById(cursor, [x[0] for x in ranked])
+		return [topics[x] + (s, ) for x, s in ranked if x in topics]
+
+	#  [topic_id] ==> (topic text, link), for the given ids
+	def topicsById(self, cursor, ids):
+		topics = {}
+		if len(ids) == 0:
+			return topics
+		query = 'SELECT topic_id, topic, link FROM freeweibo_topic WHERE topic_id IN (' + ', '.join([str(x) for x in ids]) + ');'
+		cursor.execute(query)
+		for row in cursor.fetchall():
+			topics[int(row['topic_id'])] = (storedtext.readText(row['topic'], False), row['link'])
+		return topics
+
+#  The link FreeWeibo gives a topic (as stored in freeweibo_topic.link): topicLink(u'...') ==> 'weibo/%E8%96%84...'
+def topicLink(text):
+	if isinstance(text, unicode):
+		text = text.encode('utf-8')
+	return 'weibo/' + urllib.quote(text)
+
+#  Topic ids as stored in freeweibo_ranking.topic_ids: 4 bytes each, big-endian, best first
+def packIds(ids):
+	return struct.pack('>' + str(len(ids)) + 'I', *ids)
+
+def unpackIds(data):
+	data = bytes(data)
+	return list(struct.unpack('>' + str(len(data) / 4) + 'I', data))
+
+#  Seconds of the stretch [start, end] that fall inside the window [since, until] (either may be None: no limit)
+def spanSeconds(start, end, since=None, until=None):
+	if since is not None and start < since:
+		start = since
+	if until is not None and end > until:
+		end = until
+	if end <= start:
+		return 0
+	delta = end - start
+	return delta.days * 86400 + delta.seconds
@@ -0,0 +1,277 @@
+import sys									#  Used for on-screen notices
+import hmac									#  Check the signature on each pushed body
+import hashlib
+import threading							#  The callback server runs beside the saving loop
+import Queue								#  Hands pushed bodies from the callback server to the saving loop
+import urlparse								#  Read the hub's verification query
+import BaseHTTPServer						#  The callback endpoint
+import SocketServer
+import MySQLdb								#  Used for DB operations
+import httpclient							#  Subscription requests to the hubs
+from datetime import datetime				#  Subscription expiry, as stored in rss.push_until
+import time									#  Lease book-keeping
+
+#  WebSub (formerly PubSubHubbub) push ingestion for the RSS collector: https://www.w3.org/TR/websub/
+#
+#  Feeds that advertise a hub (FeedFetcher.noteHub() records it in rss.hub while polling) can have their new
+#  entries pushed to us the moment they are published, instead of waiting for the next poll. A WebSubReceiver
+#  subscribes to each such feed's hub, runs a small HTTP server at the callback URL the hubs call, and passes
+#  every pushed body through the same FeedFetcher.fetchFeedArticles() and writeBatch() a poll would.
+#
+#  While a feed's subscription holds, rss.push_until says until when, and FeedFetcher.getFeeds() and
+#  rssscheduler.py leave it off the polling list (see FeedFetcher.skipPushed). Subscriptions are renewed
+#  before they run out; when the receiver stops, it unsubscribes and clears push_until, so polling resumes
+#  at once.
+#
+#  Each subscription gets its own callback URL, ending in a token derived from the topic, and a shared
+#  secret: a hub signs every body it pushes with it (X-Hub-Signature), and anything unsigned or mis-signed
+#  is acknowledged but dropped, as the specification asks.
+#
+#  The hub is whatever the feed names, so a stand-in hub on localhost is enough to try this out.
+#
+#  receiver = WebSubReceiver(fetcher, 'http://collector.example.org:8080/websub', 8080, 'a shared secret')
+#  receiver.serve()							#  Runs until interrupted
+class WebSubReceiver:
+	def __init__(self, fetcher, callback, port=8080, secret=None):
+		self.fetcher = fetcher				#  FeedFetcher with an open database link, after getFeeds()
+		self.callback = callback.rstrip('/')	#  Public URL at which hubs reach this receiver
+		self.port = port					#  Local port to listen on
+		self.secret = secret				#  Key each hub signs pushed bodies with (None: accept unsigned bodies)
+		self.leaseSeconds = 86400			#  Subscription lifetime to ask hubs for
+		self.renewMargin = 3600				#  Renew a subscription this many seconds before it runs out (or halfway, if sooner)
+		self.stopGrace = 5					#  Seconds to keep answering hubs after unsubscribing, so they can check back
+		self.verifyWait = 600				#  Seconds to wait for a hub to check back on a request before asking again
+		self.retryBackoff = 300				#  Seconds before re-sending a refused request, doubling with each refusal ...
+		self.maxRetryBackoff = 21600		#  ... up to this
+		self.queueSize = 64					#  Pushed bodies allowed to wait for the database
+		self.topics = {}					#  [callback token] ==> (feed, hub, topic)
+		self.requested = {}					#  [callback token] ==> (mode we asked its hub for, time asked), until the hub checks back
+		self.refusals = {}					#  [callback token] ==> (refusals in a row, time to ask again)
+		self.leases = {}					#  [callback token] ==> time its subscription is due for renewal (seconds)
+		self.work = None					#  Queue of ('push', feed, body, headers) and ('lease', feed, until)
+		self.server = None					#  The callback HTTP server
+		self.verbose = False				#  Whether to print progress to screen
+		return
+
+	#  Subscribe to every hub our feeds advertise, then save whatever the hubs push until interrupted.
+	#  All database work happens on this thread; the callback server only queues it.
+	def serve(self):
+		self.start()
+		try:
+			while True:
+				self.step(60)
+		except KeyboardInterrupt:
+			pass
+		self.stop()
+		return
+
+	#  Start the callback server, then subscribe to every hub our feeds advertise
+	def start(self):
+		self.work = Queue.Queue(self.queueSize)
+		self.server = CallbackServer(('', self.port), CallbackHandler)
+		self.server.receiver = self
+		t = threading.Thread(target=self.server.serve_forever)
+		t.daemon = True
+		t.start()
+		if self.verbose:
+			print('Listening for WebSub pushes on port ' + str(self.port))
+
+		self.subscribeAll()
+		return
+
+	#  Handle the next thing the hubs sent, waiting up to 'wait' seconds for it, then renew the leases that
+	#  are due. Returns True if there was something to handle.
+	def step(self, wait):
+		try:
+			item = self.work.get(True, wait)
+		except Queue.Empty:
+			item = None
+		if item is not None:
+			self.handle(item)
+		self.renewLeases()
+		return item is not None
+
+	#  Unsubscribe everything and hand the feeds back to polling
+	def stop(self):
+		tokens = list(self.leases.keys())
+		self.leases = {}
+		for token in tokens:
+			self.subscribe(token, 'unsubscribe')
+		feeds = [self.topics[x][0] for x in tokens]
+		if len(feeds) > 0:
+			cursor = self.fetcher.link.cursor(MySQLdb.cursors.DictCursor)
+			for feed in feeds:
+				cursor.execute('UPDATE rss SET push_until = NULL WHERE feed = %s;', (feed, ))
+			self.fetcher.link.commit()
+			cursor.close()
+			time.sleep(self.stopGrace)
+		if self.server is not None:
+			self.server.shutdown()
+			self.server = None
+		return
+
+	#  Ask the hub of every feed that advertises one for a subscription
+	def subscribeAll(self):
+		for feed, (hub, topic) in self.fetcher.hubs.items():
+			token = self.token(topic)
+			self.topics[token] = (feed, hub, topic)
+			self.subscribe(token)
+		return
+
+	#  Send a (un)subscription request for the topic behind 'token'. The hub then checks with us (see
+	#  verify()) before it takes effect. Returns True if the hub accepted the request.
+	def subscribe(self, token, mode='subscribe'):
+		feed, hub, topic = self.topics[token]
+		form = {'hub.callback': self.callback + '/' + token, \
+		        'hub.mode': mode, \
+		        'hub.topic': topic, \
+		        'hub.lease_seconds': str(self.leaseSeconds)}
+		if self.secret is not None:
+			form['hub.secret'] = self.secret
+		self.requested[token] = (mode, time.time())	#  Before sending: the hub may check back before it answers
+		try:
+			response = httpclient.session().post(hub, data=form, timeout=(10, 30))
+			status = response.status_code
+		except Exception as e:
+			status = str(e)
+		if status in (202, 204):
+			self.refusals.pop(token, None)
+			return True
+		self.requested.pop(token, None)		#  The hub may have checked back (see verify()) before refusing
+		refusals = self.refusals.get(token, (0, None))[0] + 1
+		pause = min(self.retryBackoff * (2 ** min(refusals - 1, 30)), self.maxRetryBackoff)
+		self.refusals[token] = (refusals, time.time() + pause)
+		if self.verbose:
+			print('Hub ' + hub + ' refused to ' + mode + ' ' + topic + ': ' + str(status))
+		return False
+
+	#  Renew subscriptions about to run out. A request the hub accepted but never checked back on is
+	#  forgotten after self.verifyWait seconds, so that it is sent again; one the hub refused is sent again
+	#  once its back-off (see subscribe()) has passed.
+	def renewLeases(self):
+		now = time.time()
+		for token, (mode, asked) in list(self.requested.items()):
+			if asked + self.verifyWait <= now:
+				if self.verbose:
+					print('No word from the hub on ' + self.topics[token][2] + ': asking again')
+				self.requested.pop(token, None)
+		for token, renewAt in list(self.leases.items()):
+			retryAt = self.refusals.get(token, (0, 0))[1]
+			if renewAt <= now and token not in self.requested and retryAt <= now:
+				self.subscribe(token)
+		return
+
+	#  The callback token for a topic
+	def token(self, topic):
+		return '%016x' % self.fetcher.fingerprint(topic)
+
+	#  A hub checking a (un)subscription request (a GET with hub.mode, hub.topic, hub.challenge and, for
+	#  subscriptions, hub.lease_seconds). Confirm it by echoing the challenge only if we asked for exactly
+	#  that. Returns (HTTP status, response body). Called on a callback server thread.
+	def verify(self, token, query):
+		mode = query.get('hub.mode', [None])[0]
+		topic = query.get('hub.topic', [None])[0]
+		if token not in self.topics or topic != self.topics[token][2]:
+			return 404, ''
+		feed = self.topics[token][0]
+
+		if mode == 'denied':				#  The hub turned us down: keep polling this feed
+			self.requested.pop(token, None)
+			if self.verbose:
+				print('Subscription to ' + topic + ' denied: ' + query.get('hub.reason', [''])[0])
+			return 200, ''
+
+		if self.requested.get(token, (None, None))[0] != mode:
+			return 404, ''
+		del self.requested[token]
+
+		if mode == 'subscribe':
+			lease = int(query.get('hub.lease_seconds', [self.leaseSeconds])[0])
+			now = time.time()
+			self.leases[token] = now + max(lease - self.renewMargin, lease / 2)
+			self.work.put( ('lease', feed, datetime.fromtimestamp(int(now + lease))) )
+		else:
+			self.leases.pop(token, None)
+			self.work.put( ('lease', feed, None) )
+		if self.verbose:
+			print('Hub confirmed: ' + mode + ' ' + topic)
+		return 200, query.get('hub.challenge', [''])[0]
+
+	#  A hub pushing new content for a topic. Queue it for the saving loop and return the HTTP status.
+	#  Called on a callback server thread.
+	def deliver(self, token, body, headers):
+		if token not in self.topics:
+			return 404
+		if self.secret is not None and not self.signatureValid(body, headers.get('x-hub-signature', '')):
+			if self.verbose:
+				print('Dropped a badly signed push for ' + self.topics[token][2])
+			return 202						#  Acknowledge, but ignore
+		self.work.put( ('push', self.topics[token][0], body, headers) )
+		return 202
+
+	#  Whether 'signature' ('sha256=...' and the like) is the HMAC of 'body' under our secret
+	def signatureValid(self, body, signature):
+		method, sep, digest = signature.partition('=')
+		if method not in ('sha1', 'sha256', 'sha384', 'sha512'):
+			return False
+		expected = hmac.new(self.secret, body, getattr(hashlib, method)).hexdigest()
+		return hmac.compare_digest(expected, digest.lower())
+
+	#  Do the database work for one queued item
+	def handle(self, item):
+		cursor = self.fetcher.link.cursor(MySQLdb.cursors.DictCursor)
+		if item[0] == 'lease':
+			cursor.execute('UPDATE rss SET push_until = %s WHERE feed = %s;', (item[2], item[1]))
+			self.fetcher.link.commit()
+		else:
+			feed, body, headers = item[1:]
+			try:
+				docs = self.fetcher.fetchFeedArticles(feed, body, headers)
+				added = self.fetcher.writeBatch(cursor, docs)
+				self.fetcher.saveFeedState(cursor, [feed])
+				if self.fetcher.seenIndex is not None:
+					self.fetcher.seenIndex.commit([feed])
+			except Exception as e:			#  One bad push must not stop the receiver
+				self.fetcher.link.rollback()
+				if self.verbose:
+					print('Could not save a push for ' + feed + ': ' + repr(e))
+			else:
+				if self.verbose:
+					print(str(added) + ' new articles pushed from ' + feed)
+		cursor.close()
+		return
+
+#  One thread per request, so a slow hub cannot hold up the others
+class CallbackServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+	receiver = None							#  The WebSubReceiver this serves
+
+#  Answers the hubs: GET to verify a (un)subscription, POST to deliver content
+class CallbackHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	def do_GET(self):
+		path, sep, query = self.path.partition('?')
+		status, body = self.server.receiver.verify(self.token(path), urlparse.parse_qs(query))
+		self.reply(status, body)
+
+	def do_POST(self):
+		body = self.rfile.read(int(self.headers.getheader('content-length') or 0))
+		headers = {}
+		for k, v in self.headers.items():
+			headers[k.lower()] = v
+		self.reply(self.server.receiver.deliver(self.token(self.path), body, headers), '')
+
+	#  The callback token: the last part of the path
+	def token(self, path):
+		return path.rstrip('/').split('/')[-1]
+
+	def reply(self, status, body):
+		self.send_response(status)
+		self.send_header('Content-Type', 'text/plain')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	#  Only log requests in verbose mode
+	def log_message(self, format, *args):
+		if self.server.receiver.verbose:
+			sys.stderr.write(self.address_string() + ' - ' + (format % args) + "\n")
@@ -13,8 +13,10 @@ from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.keys import Keys
 
-from guess_language import *				#  Pretty lame trigram detector... but it's free
+from cleaner import TextCleaner				#  Strips web-formatted characters in one pass
+from langid import LanguageIdentifier			#  Trigram language detection, all candidate languages scored at once
 import MySQLdb								#  Used for DB operations
+import database								#  Pooled connections and batched statements
 import datetime								#  Used for time stamping our retrievals
 from datetime import datetime				#  Used for time stamping our retrievals
 import time									#  Track how long things take
@@ -51,7 +53,8 @@ class WeiboFetcher:
 
 		self.removeLB = True				#  Whether we remove line breaks
 		self.replaceSpecial = True			#  Whether to use the replacement dictionary to swap out special chars
-		self.replaceDict = self.initReplace()
+		self.cleaner = TextCleaner()		#  Holds the replacement table of special characters
+		self.langid = LanguageIdentifier()	#  Loads the trigram models once
 		self.verbose = False				#  Whether to print progress to screen (sometimes spits up funky chars)
 		self.debugFile = False				#  Whether to output queries to a debug file
 
@@ -271,9 +274,9 @@ class WeiboFetcher:
 			ret['pub_date'] = aTags[0]['date']
 			#print aTags[0]['date']
 
-		#  Get a text-only version of the post
+		#  Get a text-only version of the post (Chinese: spaces carry no meaning)
 		data = post.find('div', attrs={'class':['WB_text', 'W_f14']})
-		ret['text_only_content'] = repr(data.get_text().replace(' ', '').replace('\n', ''))[2:-1]
+		ret['text_only_content'] = repr(self.cleanText(data.get_text()).replace(' ', '').replace('\n', ''))[2:-1]
 		#print repr(data.get_text().replace(' ', '').replace('\n', ''))[2:-1]
 
 		#  Stick the dictionary object into a list
@@ -322,13 +325,13 @@ class WeiboFetcher:
 		   self.dbUser is not None and \
 		   self.dbPword is not None and \
 		   self.dbTable is not None:
-			self.link = MySQLdb.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
+			self.link = database.connect(self.dbHost, self.dbUser, self.dbPword, self.dbTable)
 		elif self.verbose:
 			print('Unable to open a DB connection because credentials are missing.')
 
 	#  Close the connection to the database
 	def closeDB(self):
-		self.link.close()
+		database.release(self.link)			#  Back to the pool for the next user
 		return
 
 	def startTimer(self):
@@ -339,130 +342,13 @@ class WeiboFetcher:
 		self.stopTime = time.mktime(time.gmtime())
 		return
 
-	#  Build a lookup table of special character signifiers we'll want to replace before storage/parsing/etc.
-	def initReplace(self):
-		d = {}
-		d['&apos;'] = '\''					#  HTML apostrophe
-		d['&#39;'] = '\''					#  Decimal apostrophe
-		d['&amp;'] = '&'					#  HTML ampersand
-		d['&#38;'] = '&'					#  Decimal ampersand
-		d['&quot;'] = '"'					#  HTML double-quote
-		d['&#34;'] = '"'					#  Decimal double-quote
-		d['&lt;'] = '<'						#  HTML less-than
-		d['&#60;'] = '<'					#  Decimal less-than
-		d['&gt;'] = '>'						#  HTML greater-than
-		d['&#62;'] = '>'					#  Decimal greater-than
-		d['&mdash;'] = '--'					#  HTML em-dash
-		d['&#8212;'] = '--'					#  Decimal em-dash
-		d['&ndash;'] = '--'					#  HTML en-dash
-		d['&#8211;'] = '--'					#  Decimal en-dash
-		d['&#8210;'] = '--'					#  Decimal figure-dash
-		d['&#xa0;'] = ''					#  "Non-breakable Space" symbol is irrelevant to our collections
-		d['&#x00a0;'] = ''					#  Four-digit equivalent
-		return d
+	#  Clean up scraped text according to this fetcher's settings.
+	#  BeautifulSoup has already taken the markup out, so tags are not stripped again here.
+	def cleanText(self, text):
+		return self.cleaner.clean(text, False, self.removeLB, self.replaceSpecial)
 
 	#  Given a string of text, try determine its language.
-	#  (Hardly enough code to justify being its own function, but this used to
-	#   be larger. I tried using Google's language detection API, but it enforces
-	#   limits and asks for money. If we ever change our resources later, then this
-	#   routine would be best off as a sovereign function.)
+	#  Returns a tuple (language code, confidence in [0.0, 1.0]).
+	#  The trigram scoring lives in langid.py, shared with the other collectors.
 	def determineLanguage(self, text):
-
-		#return guessLanguage(text)
-		if not text:
-			return guess_language.UNKNOWN, 0.0
-
-		if isinstance(text, str):
-			text = unicode(text, 'utf-8')
-
-		text = guess_language.normalize(text)
-
-		return self.identifyWithConf(text, guess_language.find_runs(text))
-
-	#  A re-write of the _identify function in the guess_language package:
-	#  We want to preserve the confidence of the identification.
-	def identifyWithConf(self, sample, scripts):
-		if len(sample) < 3:
-			return guess_language.UNKNOWN, 0.0
-
-		if "Hangul Syllables" in scripts or "Hangul Jamo" in scripts \
-		   or "Hangul Compatibility Jamo" in scripts or "Hangul" in scripts:
-			return "ko", 1.0
-
-		if "Greek and Coptic" in scripts:
-			return "el", 1.0
-
-		if "Katakana" in scripts:
-			return "ja", 1.0
-
-		if "CJK Unified Ideographs" in scripts or "Bopomofo" in scripts \
-		   or "Bopomofo Extended" in scripts or "KangXi Radicals" in scripts:
-
-			# This is in both Ceglowski and Rideout
-			# I can't imagine why...
-			#            or "Arabic Presentation Forms-A" in scripts
-			return "zh", 1.0
-
-		if "Cyrillic" in scripts:
-			return self.checkWithConf( sample, guess_language.CYRILLIC )
-
-		if "Arabic" in scripts or "Arabic Presentation Forms-A" in scripts or "Arabic Presentation Forms-B" in scripts:
-			return self.checkWithConf( sample, guess_language.ARABIC )
-
-		if "Devanagari" in scripts:
-			return self.checkWithConf( sample, guess_language.DEVANAGARI )
-
-
-		# Try languages with unique scripts
-		for blockName, langName in guess_language.SINGLETONS:
-			if blockName in scripts:
-				return langName
-
-		if "Latin Extended Additional" in scripts:
-			return "vi"
-
-		if "Extended Latin" in scripts:
-			latinLang = self.checkWithConf( sample, guess_language.EXTENDED_LATIN )
-			if latinLang == "pt":
-				return self.checkWithConf(sample, guess_language.PT)
-			else:
-				return latinLang
-
-		if "Basic Latin" in scripts:
-			return self.checkWithConf( sample, guess_language.ALL_LATIN )
-
-		return guess_language.UNKNOWN, 0.0
-
-	#  A re-write of the check function in the guess_language package:
-	#  We want to preserve the confidence of the identification.
-	def checkWithConf(self, sample, langs):
-		if len(sample) < guess_language.MIN_LENGTH:
-			return guess_language.UNKNOWN, 0.0
-
-		scores = []
-		model = guess_language.createOrderedModel(sample)  # QMap<int,QString>
-
-		greatest = float('-inf')
-		least = float('inf')
-		for key in langs:
-			lkey = key.lower()
-
-			if lkey in guess_language.models:
-				d = guess_language.distance(model, guess_language.models[lkey])
-				if d > greatest:
-					greatest = d
-				if d < least:
-					least = d
-				scores.append( [d, key] )
-
-		#  Normalize scores
-		for score in scores:
-			#score[0] = float(score[0] - least) / float(greatest - least)
-			score[0] = float(score[0]) / float(greatest)
-
-		if not scores:
-			return guess_language.UNKNOWN, 0.0
-
-		# we want the lowest score, less distance = greater chance of match
-		#    pprint(sorted(scores))
-		return min(scores)[1], 1.0 - min(scores)[0]
+		return self.langid.identify(text)
@@ -0,0 +1,148 @@
+-- Changes to the "corpora" database used by the code in the apollo directory.
+-- Apply these in order to an existing installation; each block notes the feature that needs it.
+
+-- Conditional GET (FeedFetcher.downloadFeed): validators from the last poll of each feed
+ALTER TABLE `rss`
+ ADD COLUMN `etag` varchar(255) DEFAULT NULL,
+ ADD COLUMN `last_modified` varchar(64) DEFAULT NULL,
+ ADD COLUMN `body_hash` char(40) DEFAULT NULL;
+
+-- Per-feed language prior (FeedFetcher.detectFeedLanguage): weighted language verdicts, e.g. 'en:41.27 fr:0.52'
+ALTER TABLE `rss`
+ ADD COLUMN `lang_stats` varchar(1024) DEFAULT NULL;
+
+-- Circuit breaker (FeedFetcher.feedFailed): consecutive failed polls, and when to try a failing feed again
+ALTER TABLE `rss`
+ ADD COLUMN `failures` int(11) NOT NULL DEFAULT 0,
+ ADD COLUMN `retry_after` datetime DEFAULT NULL;
+
+-- Adaptive polling (rssscheduler.py): estimated new entries per hour, and when each feed is next due
+ALTER TABLE `rss`
+ ADD COLUMN `entry_rate` double DEFAULT NULL,
+ ADD COLUMN `next_poll` datetime DEFAULT NULL;
+
+-- Native text storage (storedtext.py): how each row's text columns are rendered, FALSE = legacy \u escapes.
+-- Converting to utf8mb4 rebuilds each table; on a large installation run the same ALTERs through an online
+-- schema-change tool (pt-online-schema-change, gh-ost). Legacy rows are pure ASCII, so the conversion leaves
+-- them byte-for-byte unchanged. Then convert the old rows at leisure with textmigrate.py. (weibo gets the column
+-- too, but weibo.py does not write it yet, so textmigrate.py leaves that table alone.)
+ALTER TABLE `articles`
+ ADD COLUMN `native_text` tinyint(1) NOT NULL DEFAULT 0,
+ CONVERT TO CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+ALTER TABLE `weibo`
+ ADD COLUMN `native_text` tinyint(1) NOT NULL DEFAULT 0,
+ CONVERT TO CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+ALTER TABLE `freeweibo`
+ ADD COLUMN `native_text` tinyint(1) NOT NULL DEFAULT 0,
+ CONVERT TO CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+
+-- Article body store (bodystore.py): each distinct article text once, compressed, keyed by its content fingerprint.
+-- Articles using it leave 'content' NULL and point at their text with 'body_ref'. codec: 0 = zlib, 1 = zstd;
+-- dict_id is the zstd dictionary used (0: none). Move existing text across with bodymigrate.py.
+CREATE TABLE `article_body` (
+ `hash_content` bigint(20) unsigned NOT NULL,
+ `codec` tinyint(4) NOT NULL,
+ `dict_id` int(11) NOT NULL DEFAULT 0,
+ `body` mediumblob NOT NULL,
+ PRIMARY KEY (`hash_content`)
+) ENGINE=InnoDB;
+
+CREATE TABLE `body_dictionary` (
+ `kp` int(11) NOT NULL AUTO_INCREMENT,
+ `dict` mediumblob NOT NULL,
+ `trained` datetime NOT NULL,
+ PRIMARY KEY (`kp`)
+) ENGINE=InnoDB;
+
+ALTER TABLE `articles`
+ ADD COLUMN `body_ref` bigint(20) unsigned DEFAULT NULL;
+
+-- Near-duplicate collapsing (FeedFetcher.nearDuplicates, minhash.py): the MinHash signature of each recent article,
+-- and its 16 band hashes indexed for look-up. FeedFetcher.pruneMinHashes() drops articles older than nearDays.
+CREATE TABLE `article_minhash` (
+ `article_id` int(11) NOT NULL,
+ `signature` varbinary(256) NOT NULL,
+ `added` datetime NOT NULL,
+ PRIMARY KEY (`article_id`),
+ KEY `added` (`added`)
+) ENGINE=InnoDB;
+
+CREATE TABLE `minhash_band` (
+ `band` tinyint(3) unsigned NOT NULL,
+ `value` bigint(20) unsigned NOT NULL,
+ `article_id` int(11) NOT NULL,
+ PRIMARY KEY (`band`, `value`, `article_id`),
+ KEY `article_id` (`article_id`)
+) ENGINE=InnoDB;
+
+-- Per-feed high-water mark (FeedFetcher.belowHighWater): fingerprint and publication time (UTC) of the newest entry
+-- read from each feed. Reading a newest-first feed stops when it gets back down to this entry.
+ALTER TABLE `rss`
+ ADD COLUMN `hwm_id` bigint(20) unsigned DEFAULT NULL,
+ ADD COLUMN `hwm_published` datetime DEFAULT NULL;
+
+-- WebSub push ingestion (websub.py): the hub each feed advertises and the topic URL to subscribe to there,
+-- and until when a live subscription pushes the feed to us (polling leaves it alone until then).
+ALTER TABLE `rss`
+ ADD COLUMN `hub` varchar(255) DEFAULT NULL,
+ ADD COLUMN `hub_topic` varchar(255) DEFAULT NULL,
+ ADD COLUMN `push_until` datetime DEFAULT NULL;
+
+-- News sitemaps (sitemap.py): the sitemaps and sitemap indexes to read, and for every sitemap read so far the
+-- lastmod its index declared ('declared') and the newest URL lastmod stored from it, in UTC ('newest').
+CREATE TABLE `sitemap` (
+ `kp` int(11) NOT NULL AUTO_INCREMENT,
+ `url` varchar(255) NOT NULL,
+ `enabled` tinyint(1) NOT NULL DEFAULT 1,
+ PRIMARY KEY (`kp`),
+ UNIQUE KEY `url` (`url`)
+) ENGINE=InnoDB;
+
+CREATE TABLE `sitemap_state` (
+ `url` varchar(255) NOT NULL,
+ `declared` varchar(64) DEFAULT NULL,
+ `newest` datetime DEFAULT NULL,
+ PRIMARY KEY (`url`)
+) ENGINE=InnoDB;
+
+-- FreeWeibo bulk save (FreeWeiboFetcher.saveBulk): FreeWeibo's post identifier is unique, and post fingerprints are
+-- looked up by index. Remove any posts stored twice before adding the unique key.
+DELETE f1 FROM `freeweibo` f1 JOIN `freeweibo` f2 ON f1.data_id = f2.data_id AND f1.kp > f2.kp;
+ALTER TABLE `freeweibo`
+ ADD UNIQUE KEY `data_id` (`data_id`),
+ ADD KEY `hash` (`hash`);
+
+-- FreeWeibo hot-topic time series (topicseries.py, replacing freeweibo_topics; see topicmigrate.py): each topic once,
+-- one row per distinct ranking (topic ids packed 4 bytes each, best first, and the first and last poll that saw it),
+-- and one row per stretch a topic held one rank, which rank-history and dwell-time queries read by key.
+CREATE TABLE `freeweibo_topic` (
+ `topic_id` int(10) unsigned NOT NULL AUTO_INCREMENT,
+ `link` varchar(255) NOT NULL,
+ `topic` varchar(255) NOT NULL,
+ PRIMARY KEY (`topic_id`),
+ UNIQUE KEY `link` (`link`)
+) ENGINE=InnoDB;
+
+CREATE TABLE `freeweibo_ranking` (
+ `kp` int(10) unsigned NOT NULL AUTO_INCREMENT,
+ `date_from` datetime NOT NULL,
+ `date_to` datetime NOT NULL,
+ `samples` int(10) unsigned NOT NULL DEFAULT 1,
+ `topic_ids` varbinary(64) NOT NULL,
+ PRIMARY KEY (`kp`),
+ KEY `date_from` (`date_from`)
+) ENGINE=InnoDB;
+
+CREATE TABLE `freeweibo_topic_rank` (
+ `topic_id` int(10) unsigned NOT NULL,
+ `n` tinyint(3) unsigned NOT NULL,
+ `date_from` datetime NOT NULL,
+ `date_to` datetime NOT NULL,
+ PRIMARY KEY (`topic_id`, `date_from`, `n`),
+ KEY `date_to` (`date_to`)
+) ENGINE=InnoDB;
+
+-- Set-based bulk save (FeedFetcher.writeBatch): each batch looks its articles up by URL fingerprint and checks the
+-- content fingerprint, so the pair is indexed together. The index covers that look-up (InnoDB adds kp to it).
+ALTER TABLE `articles`
+ ADD KEY `hash_url_content` (`hash_url`, `hash_content`);
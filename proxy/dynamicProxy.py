@@ -1,8 +1,9 @@
+import os
+import sys
 import json
-import urllib2
 from selenium import webdriver
-from socket import error as SocketError
-import socket
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'apollo'))
+import httpclient  # The collectors' shared HTTP session (apollo/httpclient.py)
 # from pyvirtualdisplay import Display
 
 
@@ -10,23 +11,23 @@ import socket
 #site = 'http://www.google.com'
 site = 'http://www.bing.com'
 
+# Every check goes through the collectors' shared session: compressed pages, the
+# connection to each proxy kept alive, and cached look-ups of the proxy hosts.
+# Only the User-agent is our own, sent with each request.
+#userAgent = 'Mozilla/5.0'
+userAgent = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_2) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/55.0.2883.95 Safari/537.36'
+
 def is_bad_proxy(pip):
     
     try:
-        proxy_handler = urllib2.ProxyHandler({'http': pip})
-        opener = urllib2.build_opener(proxy_handler)
-#        opener.addheaders = [('User-agent', 'Mozilla/5.0')]
-        opener.addheaders = [('User-agent', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_12_2) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/55.0.2883.95 Safari/537.36')]
-        urllib2.install_opener(opener)
-        req = urllib2.Request(site)  # change the URL to test here
-        sock = urllib2.urlopen(req)
-        print sock.geturl()
-        print sock.getcode()
-        #print "Server:", sock.info()
+        sock = httpclient.session().get(site, proxies={'http': pip}, headers={'User-agent': userAgent}, timeout=30)  # change the URL to test here
+        print sock.url
+        print sock.status_code
+        #print "Server:", sock.headers
+        if sock.status_code >= 400:
+            print 'Error code: ', sock.status_code
+            return sock.status_code
         
-    except urllib2.HTTPError, e:
-        print 'Error code: ', e.code
-        return e.code
     except Exception, detail:
         print "ERROR:", detail
         return True
@@ -67,8 +68,6 @@ def proxy_extractor():
 
 def main(mylist):
 
-    socket.setdefaulttimeout(30)
-    
     goodProx = []    
     
     for currentProxy in mylist: